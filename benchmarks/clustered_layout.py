@@ -0,0 +1,94 @@
+"""
+Benchmark the per user load time of the default SQLite layout against the clustered WITHOUT ROWID layout. The emails
+of all simulated users are stored interleaved, like the periodic updates of the daemon, so in the default layout the
+rows of one user are scattered across the database file. Afterwards the emails of every user are loaded with
+get_all_emails() from a new database connection.
+
+    python benchmarks/clustered_layout.py
+"""
+
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import pandas
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from gmailsorter.base.database import get_email_database
+
+N_ROUNDS = 20
+N_EMAILS_PER_ROUND = 10
+
+
+def _get_df(user_id, round_id):
+    return pandas.DataFrame(
+        [
+            {
+                "content": "Lorem ipsum dolor sit amet. " * 20,
+                "date": datetime(2022, 2, 11),
+                "from": "sender" + str(i) + "@server.net",
+                "id": f"{user_id}-{round_id}-{i}",
+                "cc": [],
+                "labels": ["INBOX", "Label_" + str(i % 5)],
+                "subject": "Test Email Subject",
+                "threads": "thread" + str(i),
+                "to": ["user" + str(user_id) + "@mail.com"],
+            }
+            for i in range(N_EMAILS_PER_ROUND)
+        ]
+    )
+
+
+def _create_database(file_name, n_users, clustered_layout):
+    engine = create_engine("sqlite:///" + file_name)
+    database = get_email_database(
+        engine=engine,
+        session_factory=sessionmaker(bind=engine),
+        clustered_layout=clustered_layout,
+    )
+    for round_id in range(N_ROUNDS):
+        for user_id in range(1, n_users + 1):
+            database.store_dataframe(
+                df=_get_df(user_id=user_id, round_id=round_id), user_id=user_id
+            )
+    engine.dispose()
+
+
+def _load_all_users(file_name, n_users):
+    engine = create_engine("sqlite:///" + file_name)
+    database = get_email_database(
+        engine=engine, session_factory=sessionmaker(bind=engine)
+    )
+    start = time.perf_counter()
+    for user_id in range(1, n_users + 1):
+        database.get_all_emails(user_id=user_id)
+    duration = (time.perf_counter() - start) / n_users * 1e3
+    engine.dispose()
+    return duration
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        for n_users in [10, 100]:
+            result_dict = {}
+            for clustered_layout in [False, True]:
+                file_name = os.path.join(directory, f"{n_users}_{clustered_layout}.db")
+                _create_database(
+                    file_name=file_name,
+                    n_users=n_users,
+                    clustered_layout=clustered_layout,
+                )
+                result_dict[clustered_layout] = _load_all_users(
+                    file_name=file_name, n_users=n_users
+                )
+            print(
+                f"{n_users:>4} users: default layout {result_dict[False]:7.1f} ms/user, "
+                f"clustered layout {result_dict[True]:7.1f} ms/user, "
+                f"speedup {result_dict[False] / result_dict[True]:4.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
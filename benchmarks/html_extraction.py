@@ -0,0 +1,64 @@
+"""
+Benchmark the HTML to text extraction of Message._strip_tags() on synthetic marketing emails of several hundred KB,
+with an embedded style sheet, tracking scripts and deeply nested layout tables. As reference the previous extraction
+with a new HTMLParser based MLStripper for every email is timed on the same corpus.
+
+    python benchmarks/html_extraction.py
+"""
+
+import time
+
+from gmailsorter.google.message import Message, MLStripper
+
+N_EMAILS = 50
+N_PRODUCTS = 600
+
+
+def _get_html(i):
+    style = "".join(
+        f".c{j} {{ color: #{j:06x}; padding: {j % 10}px; }}\n" for j in range(2000)
+    )
+    product = (
+        '<tr><td class="c{j}" style="padding:0;margin:0"><table width="100%"><tr>'
+        '<td><a href="https://shop.example.com/p/{j}?utm_source=newsletter&amp;id={i}">'
+        '<img src="https://cdn.example.com/{j}.png" alt="Product {j}" width="120"></a></td>'
+        "<td><b>Product {j}</b> &ndash; now only &euro;{j}.99 &nbsp;</td></tr></table></td></tr>\n"
+    )
+    return (
+        "<html><head><style>"
+        + style
+        + '</style><script>var tracking = {"id": '
+        + str(i)
+        + ', "html": "<b>x</b>"};</script></head><body><table>'
+        + "".join(product.format(i=i, j=j) for j in range(N_PRODUCTS))
+        + "</table><!-- footer --><p>Unsubscribe</p></body></html>"
+    )
+
+
+def _ml_stripper(html):
+    s = MLStripper()
+    s.feed(html)
+    return s.get_data()
+
+
+def _time(function, html_lst):
+    start = time.perf_counter()
+    for html in html_lst:
+        function(html)
+    return (time.perf_counter() - start) / len(html_lst) * 1e3
+
+
+def main():
+    html_lst = [_get_html(i=i) for i in range(N_EMAILS)]
+    size = sum(len(html) for html in html_lst) / len(html_lst) / 1e3
+    stripper_time = _time(function=_ml_stripper, html_lst=html_lst)
+    regex_time = _time(function=Message._strip_tags, html_lst=html_lst)
+    print(
+        f"{N_EMAILS} emails of {size:5.0f} KB: MLStripper {stripper_time:7.2f} ms/email, "
+        f"html_to_text {regex_time:7.2f} ms/email, "
+        f"speedup {stripper_time / regex_time:4.2f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark the parsing of Gmail API message dictionaries with Message.to_dict() on a synthetic corpus of metadata
+messages, each with a realistic number of headers. As reference the header lookup by scanning the list of headers for
+every field is timed on the same corpus.
+
+    python benchmarks/message_parsing.py
+"""
+
+import random
+import time
+
+from gmailsorter.google.message import Message
+
+N_MESSAGES = 100000
+N_EXTRA_HEADERS = 30
+
+
+class LinearScanMessage(Message):
+    __slots__ = ()
+
+    def get_header_field_from_message(self, field):
+        lst = [
+            entry["value"]
+            for entry in self._message_dict["payload"]["headers"]
+            if entry["name"] == field
+        ]
+        if len(lst) > 0:
+            return lst[0]
+        else:
+            return None
+
+
+def _get_message_dict(i, rng):
+    header_lst = [
+        {"name": "X-Header-" + str(j), "value": "value" + str(j)}
+        for j in range(N_EXTRA_HEADERS)
+    ] + [
+        {"name": "From", "value": "Sender " + str(i % 500) + " <s@server.net>"},
+        {"name": "To", "value": "me@mail.com, friend@provider.org"},
+        {"name": "Cc", "value": "other@provider.org"},
+        {"name": "Subject", "value": "Subject " + str(i)},
+        {"name": "Date", "value": "Fri, 11 Feb 2022 18:08:46 +0100"},
+    ]
+    rng.shuffle(header_lst)
+    return {
+        "id": "id" + str(i),
+        "threadId": "thread" + str(i // 3),
+        "labelIds": ["INBOX", "Label_" + str(i % 7)],
+        "payload": {"headers": header_lst},
+    }
+
+
+def _time(message_class, message_lst):
+    start = time.perf_counter()
+    for message_dict in message_lst:
+        message = message_class(message_dict=message_dict)
+        message.get_from()
+        message.get_to()
+        message.get_cc()
+        message.get_subject()
+        message.get_date()
+    return time.perf_counter() - start
+
+
+def main():
+    rng = random.Random(42)
+    message_lst = [_get_message_dict(i=i, rng=rng) for i in range(N_MESSAGES)]
+    linear_time = _time(message_class=LinearScanMessage, message_lst=message_lst)
+    indexed_time = _time(message_class=Message, message_lst=message_lst)
+    print(
+        f"{N_MESSAGES} messages: linear header scan {linear_time:6.2f} s, "
+        f"header index {indexed_time:6.2f} s, "
+        f"speedup {linear_time / indexed_time:4.2f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
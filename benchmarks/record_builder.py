@@ -0,0 +1,69 @@
+"""
+Benchmark the assembly of the pandas.DataFrame for a batch of parsed messages. Creating one dictionary per message like
+Message.to_dict() followed by pandas.DataFrame() is compared to the columnar EmailRecordBuilder. The messages are parsed
+once before the timing, so only the record assembly is measured.
+
+    python benchmarks/record_builder.py
+"""
+
+import time
+
+import pandas
+
+from gmailsorter.base.message import EMAIL_COLUMN_LST, EmailRecordBuilder
+from gmailsorter.google.message import Message
+
+N_MESSAGES = 100000
+
+
+def _get_message_dict(i):
+    return {
+        "id": "id" + str(i),
+        "threadId": "thread" + str(i // 3),
+        "labelIds": ["INBOX", "Label_" + str(i % 7)],
+        "payload": {
+            "headers": [
+                {"name": "From", "value": "sender" + str(i % 500) + "@server.net"},
+                {"name": "To", "value": "me@mail.com, friend@provider.org"},
+                {"name": "Subject", "value": "Subject " + str(i)},
+                {"name": "Date", "value": "Fri, 11 Feb 2022 18:08:46 +0100"},
+            ]
+        },
+    }
+
+
+def _list_of_dicts(values_lst):
+    return pandas.DataFrame(
+        [dict(zip(EMAIL_COLUMN_LST, values, strict=True)) for values in values_lst]
+    )
+
+
+def _record_builder(values_lst):
+    records = EmailRecordBuilder()
+    for values in values_lst:
+        records.append(values=values)
+    return records.to_dataframe()
+
+
+def _time(function, values_lst):
+    start = time.perf_counter()
+    function(values_lst)
+    return time.perf_counter() - start
+
+
+def main():
+    values_lst = [
+        Message(message_dict=_get_message_dict(i=i)).to_values(profile="metadata")
+        for i in range(N_MESSAGES)
+    ]
+    dict_time = _time(function=_list_of_dicts, values_lst=values_lst)
+    builder_time = _time(function=_record_builder, values_lst=values_lst)
+    print(
+        f"{N_MESSAGES} messages: list of dicts {dict_time:6.2f} s, "
+        f"EmailRecordBuilder {builder_time:6.2f} s, "
+        f"speedup {dict_time / builder_time:4.2f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Microbenchmark for the pre-built statements of the hot per-message queries. Each query is executed repeatedly with
+changing parameters, once built as a new ORM query for every call and once as the pre-built statement used in
+gmailsorter, both on an in-memory SQLite database so the timing is dominated by the query construction and compilation
+overhead.
+
+    python benchmarks/statement_cache.py
+"""
+
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from gmailsorter.base.database import Base as EmailBase
+from gmailsorter.base.database import Labels, _get_relation_values
+from gmailsorter.daemon.shared import Base as DaemonBase
+from gmailsorter.daemon.shared import Task, get_task
+
+N_USERS = 100
+N_REPEAT = 20000
+
+
+def _orm_task_lookup(session, user_id, task_name):
+    return (
+        session.query(Task)
+        .filter(Task.user_id == user_id)
+        .filter(Task.task_name == task_name)
+        .first()
+    )
+
+
+def _cached_task_lookup(session, user_id, task_name):
+    return get_task(session=session, user_id=user_id, task_name=task_name)
+
+
+def _orm_label_lookup(session, user_id, email_id):
+    return [
+        m
+        for (m,) in session.query(Labels.label_id)
+        .filter(Labels.user_id == user_id)
+        .filter(Labels.email_id == email_id)
+        .all()
+    ]
+
+
+def _cached_label_lookup(session, user_id, email_id):
+    return _get_relation_values(
+        session=session, column=Labels.label_id, user_id=user_id, email_id=email_id
+    )
+
+
+def _time(function, session, argument_lst):
+    start = time.perf_counter()
+    for i in range(N_REPEAT):
+        function(session, *argument_lst[i % len(argument_lst)])
+    return (time.perf_counter() - start) / N_REPEAT * 1e6
+
+
+def main():
+    engine = create_engine("sqlite://")
+    EmailBase.metadata.create_all(engine)
+    DaemonBase.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all(
+        [
+            Task(task_name=task_name, status="success", user_id=user_id)
+            for user_id in range(N_USERS)
+            for task_name in ["update", "fetch"]
+        ]
+        + [
+            Labels(email_id="email" + str(user_id), label_id="INBOX", user_id=user_id)
+            for user_id in range(N_USERS)
+        ]
+    )
+    session.commit()
+    task_argument_lst = [
+        (user_id, task_name)
+        for user_id in range(N_USERS)
+        for task_name in ["update", "fetch"]
+    ]
+    label_argument_lst = [
+        (user_id, "email" + str(user_id)) for user_id in range(N_USERS)
+    ]
+    for name, orm_function, cached_function, argument_lst in [
+        ("task lookup", _orm_task_lookup, _cached_task_lookup, task_argument_lst),
+        ("label lookup", _orm_label_lookup, _cached_label_lookup, label_argument_lst),
+    ]:
+        orm_time = _time(orm_function, session, argument_lst)
+        cached_time = _time(cached_function, session, argument_lst)
+        print(
+            f"{name:>12}: ORM query {orm_time:7.1f} us/call, "
+            f"pre-built statement {cached_time:7.1f} us/call, "
+            f"speedup {orm_time / cached_time:4.2f}x"
+        )
+    session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,12 @@
 import argparse
 import os
 
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
 from gmailsorter import Gmail, load_client_secrets_file
+from gmailsorter.base import get_email_database
+from gmailsorter.importer import import_archive
 
 
 def command_line_parser() -> None:
@@ -46,9 +51,49 @@ def command_line_parser() -> None:
         "--tasks",
         help="Number of parallel tasks to use.",
     )
+    subparsers = parser.add_subparsers(dest="command")
+    parser_import = subparsers.add_parser(
+        "import",
+        help="Import an mbox file or Maildir directory e.g. a Google Takeout export.",
+    )
+    parser_import.add_argument(
+        "archive",
+        help="Path to the mbox file or Maildir directory.",
+    )
+    # The options are suppressed by default, so the options given before the import command are not overwritten.
+    parser_import.add_argument(
+        "-d",
+        "--database",
+        default=argparse.SUPPRESS,
+        help="Connection string to connect to database e.g. sqlite:///email.db .",
+    )
+    parser_import.add_argument(
+        "-i",
+        "--identification",
+        default=argparse.SUPPRESS,
+        help="User ID of the database user e.g. 1 .",
+    )
+    parser_import.add_argument(
+        "-t",
+        "--tasks",
+        default=argparse.SUPPRESS,
+        help="Number of parallel tasks to use.",
+    )
     args = parser.parse_args()
     port = args.port or 8080
     db_user_id = int(args.identification) if args.identification else 1
+    if args.command == "import":
+        engine = create_engine(args.database or "sqlite:///email.db")
+        number_of_emails = import_archive(
+            path=args.archive,
+            database=get_email_database(
+                engine=engine, session_factory=sessionmaker(bind=engine)
+            ),
+            user_id=db_user_id,
+            max_workers=int(args.tasks) if args.tasks else None,
+        )
+        print(f"Imported {number_of_emails} emails from {args.archive}")
+        return
     if args.credentials:
         credentials = args.credentials
     elif "credentials.json" in os.listdir("."):
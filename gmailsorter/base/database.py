@@ -1,12 +1,77 @@
+import hashlib
+import os
+import weakref
+import zlib
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from functools import partial
 from typing import Any
 
 import pandas
-from sqlalchemy import Boolean, Column, DateTime, Engine, ForeignKey, Integer, String
-from sqlalchemy.orm import Session, declarative_base
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Connection,
+    DateTime,
+    Engine,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    Table,
+    and_,
+    bindparam,
+    event,
+    func,
+    inspect,
+    literal,
+    select,
+    text,
+)
+from sqlalchemy.orm import (
+    InstrumentedAttribute,
+    Session,
+    UOWTransaction,
+    declarative_base,
+    sessionmaker,
+)
 from tqdm import tqdm
 
+from gmailsorter.base.message import EmailRecordBuilder
+
 Base = declarative_base()
 
+# Column order of the pandas.DataFrames loaded from the database
+_DATAFRAME_COLUMN_LST = [
+    "id",
+    "from",
+    "to",
+    "cc",
+    "date",
+    "threads",
+    "labels",
+    "subject",
+    "content",
+]
+
+# Maximum number of body hashes per IN clause, to stay below the SQLite limit for bound parameters
+_BODY_HASH_CHUNK_SIZE = 500
+
+# The ids of the clustered WITHOUT ROWID tables are reserved from a sequence table, the clustered tables are cached
+# for each engine, so the tables are only looked up once when the database is opened.
+_ID_SEQUENCE_TABLE = "email_id_sequence"
+_CLUSTERED_TABLE_DICT: "weakref.WeakKeyDictionary[Engine, frozenset[str]]" = (
+    weakref.WeakKeyDictionary()
+)
+_UPDATE_ID_SEQUENCE = text(
+    f"UPDATE {_ID_SEQUENCE_TABLE} SET next_id = next_id + :count "
+    "WHERE table_name = :table_name"
+)
+_SELECT_ID_SEQUENCE = text(
+    f"SELECT next_id FROM {_ID_SEQUENCE_TABLE} WHERE table_name = :table_name"
+)
+
 
 class EmailContent(Base):
     __tablename__ = "email_content"
@@ -14,11 +79,24 @@ class EmailContent(Base):
     email_id = Column(String)
     email_subject = Column(String)
     email_content = Column(String)
+    email_body_hash = Column(String)
     email_deleted = Column(Boolean)
     email_date = Column(DateTime)
     user_id = Column(Integer)
 
 
+class EmailBody(Base):
+    # Content-addressed store for the email bodies, identical bodies of one user are stored and compressed only once.
+    __tablename__ = "email_body"
+    __table_args__ = (
+        Index("ix_email_body_user_id_body_hash", "user_id", "body_hash", unique=True),
+    )
+    id = Column(Integer, primary_key=True)
+    body_hash = Column(String)
+    body_data = Column(LargeBinary)
+    user_id = Column(Integer)
+
+
 class Threads(Base):
     __tablename__ = "email_threads"
     id = Column(Integer, primary_key=True)
@@ -27,6 +105,14 @@ class Threads(Base):
     user_id = Column(Integer)
 
 
+class EmailHistory(Base):
+    # Gmail history ID of the last synchronisation, the starting point of the next incremental update
+    __tablename__ = "email_history"
+    id = Column(Integer, primary_key=True)
+    history_id = Column(String)
+    user_id = Column(Integer)
+
+
 class Labels(Base):
     __tablename__ = "email_labels"
     id = Column(Integer, primary_key=True)
@@ -59,46 +145,273 @@ class EmailFrom(Base):
     user_id = Column(Integer)
 
 
+@contextmanager
+def session_scope(
+    session_factory: sessionmaker, commit: bool = True
+) -> Iterator[Session]:
+    """
+    Provide a transactional scope around a unit of work. The session is committed when the block completes, rolled back
+    when it raises and closed in any case.
+
+    Args:
+        session_factory (sqlalchemy.orm.sessionmaker): factory to create the session
+        commit (bool): commit the session when the block completes, otherwise the changes are discarded on close
+
+    Returns:
+        sqlalchemy.orm.Session: short-lived session for the unit of work
+    """
+    session = session_factory()
+    try:
+        yield session
+        if commit:
+            session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+# Pre-built statements for the hot per email queries. The compiled statements are cached by the engine, so executing
+# them only binds the parameters rather than building and compiling a new query for every email.
+_SELECT_EMAIL_IDS = (
+    select(EmailContent.email_id)
+    .where(EmailContent.user_id == bindparam("user_id"))
+    .order_by(EmailContent.id)
+)
+_SELECT_RELATION_VALUES = {
+    column: select(column)
+    .where(column.class_.user_id == bindparam("user_id"))
+    .where(column.class_.email_id == bindparam("email_id"))
+    for column in [
+        EmailFrom.email_from,
+        EmailTo.email_to,
+        EmailCc.email_cc,
+        Labels.label_id,
+        Threads.thread_id,
+    ]
+}
+_JOIN_EMAIL_BODY = and_(
+    EmailBody.user_id == EmailContent.user_id,
+    EmailBody.body_hash == EmailContent.email_body_hash,
+)
+
+
+def _get_relation_values(
+    session: Session, column: InstrumentedAttribute, user_id: int, email_id: str
+) -> list[str]:
+    return list(
+        session.scalars(
+            _SELECT_RELATION_VALUES[column], {"user_id": user_id, "email_id": email_id}
+        )
+    )
+
+
+class ReadReplica:
+    def __init__(
+        self,
+        engine: Engine,
+        max_staleness: float | None = None,
+        replication_lag: Callable[[], float] | None = None,
+    ) -> None:
+        """
+        Secondary database, like a replica or a snapshot copy of the primary database, to serve the heavy read-only
+        queries. The replica is only used as long as the replication lag does not exceed the staleness bound, otherwise
+        the queries fall back to the primary database.
+
+        Args:
+            engine: SQLalchemy database engine of the replica
+            max_staleness (float): maximum replication lag in seconds - default None accepts any lag
+            replication_lag (callable): function returning the current replication lag in seconds
+        """
+        self._session_factory = sessionmaker(bind=engine, expire_on_commit=False)
+        self._max_staleness = max_staleness
+        self._replication_lag = replication_lag
+
+    @property
+    def session_factory(self) -> sessionmaker:
+        return self._session_factory
+
+    def is_fresh(self) -> bool:
+        if self._max_staleness is None or self._replication_lag is None:
+            return True
+        try:
+            return self._replication_lag() <= self._max_staleness
+        except OSError:
+            return False
+
+
+def get_read_replica(
+    engine: Engine, replica_engine: Engine, max_staleness: float | None = None
+) -> ReadReplica:
+    """
+    Create a read replica for the primary database. For two SQLite database files the replication lag is measured by
+    the difference of their modification times, for other databases the replica is used without staleness check.
+
+    Args:
+        engine: SQLalchemy database engine of the primary database
+        replica_engine: SQLalchemy database engine of the replica
+        max_staleness (float): maximum replication lag in seconds
+
+    Returns:
+        ReadReplica: read replica for the database interfaces
+    """
+    primary_file = _get_sqlite_file(engine=engine)
+    replica_file = _get_sqlite_file(engine=replica_engine)
+    if primary_file is not None and replica_file is not None:
+        return ReadReplica(
+            engine=replica_engine,
+            max_staleness=max_staleness,
+            replication_lag=partial(
+                _get_file_lag, primary_file=primary_file, replica_file=replica_file
+            ),
+        )
+    else:
+        return ReadReplica(engine=replica_engine, max_staleness=max_staleness)
+
+
+def _get_sqlite_file(engine: Engine) -> str | None:
+    database = engine.url.database
+    if engine.url.get_backend_name() == "sqlite" and database not in (
+        None,
+        "",
+        ":memory:",
+    ):
+        return database
+    else:
+        return None
+
+
+def _get_file_lag(primary_file: str, replica_file: str) -> float:
+    primary_mtime = max(
+        os.path.getmtime(file_name)
+        for file_name in [primary_file, primary_file + "-wal"]
+        if os.path.exists(file_name)
+    )
+    return max(0.0, primary_mtime - os.path.getmtime(replica_file))
+
+
 class DatabaseTemplate:
-    def __init__(self, session: Session) -> None:
+    def __init__(
+        self,
+        session: Session | None = None,
+        session_factory: sessionmaker | None = None,
+        read_replica: ReadReplica | None = None,
+    ) -> None:
+        """
+        Base class for the database interfaces. With a session factory every operation runs in its own short-lived
+        session and transaction, so the interface can be shared between threads. With a single session all operations
+        share it and the caller controls the transaction with the commit flags.
+
+        Args:
+            session (sqlalchemy.orm.Session): shared session
+            session_factory (sqlalchemy.orm.sessionmaker): factory to create one session per operation
+            read_replica (ReadReplica): optional secondary database for the heavy read-only queries
+        """
+        if session is None and session_factory is None:
+            raise ValueError("Either a session or a session_factory is required.")
         self._session = session
+        self._session_factory = session_factory
+        self._read_replica = read_replica
+
+    @property
+    def session(self) -> Session:
+        if self._session is None:
+            self._session = self._session_factory()
+        return self._session
 
     def close(self) -> None:
-        self._session.close()
+        if self._session is not None:
+            self._session.close()
+
+    @contextmanager
+    def _session_scope(self, commit: bool = True) -> Iterator[Session]:
+        if self._session_factory is None:
+            yield self._session
+            if commit:
+                self._session.commit()
+        else:
+            with session_scope(
+                session_factory=self._session_factory, commit=commit
+            ) as session:
+                yield session
+
+    @contextmanager
+    def _read_session_scope(self) -> Iterator[Session]:
+        if self._read_replica is not None and self._read_replica.is_fresh():
+            with session_scope(
+                session_factory=self._read_replica.session_factory, commit=False
+            ) as session:
+                yield session
+        else:
+            with self._session_scope(commit=False) as session:
+                yield session
 
 
 class DatabaseInterface(DatabaseTemplate):
-    @property
-    def session(self) -> Session:
-        return self._session
+    def store_dataframe(
+        self, df: pandas.DataFrame, user_id: int = 1, commit: bool = True
+    ) -> None:
+        with self._session_scope(commit=commit) as session:
+            self._commit_content_table(session=session, df=df, user_id=user_id)
+            self._commit_email_from_table(session=session, df=df, user_id=user_id)
+            self._commit_email_to_table(session=session, df=df, user_id=user_id)
+            self._commit_email_cc_table(session=session, df=df, user_id=user_id)
+            self._commit_label_table(session=session, df=df, user_id=user_id)
+            self._commit_thread_table(session=session, df=df, user_id=user_id)
+
+    def get_history_id(self, user_id: int = 1) -> str | None:
+        """
+        Get the Gmail history ID of the last synchronisation.
+
+        Args:
+            user_id (int): database user id
+
+        Returns:
+            str: history ID or None if the database was never synchronised
+        """
+        with self._session_scope(commit=False) as session:
+            return session.scalars(
+                select(EmailHistory.history_id).where(EmailHistory.user_id == user_id)
+            ).first()
 
-    def store_dataframe(self, df: pandas.DataFrame, user_id: int = 1) -> None:
-        self._commit_content_table(df=df, user_id=user_id)
-        self._commit_email_from_table(df=df, user_id=user_id)
-        self._commit_email_to_table(df=df, user_id=user_id)
-        self._commit_email_cc_table(df=df, user_id=user_id)
-        self._commit_label_table(df=df, user_id=user_id)
-        self._commit_thread_table(df=df, user_id=user_id)
+    def update_history_id(
+        self, history_id: str, user_id: int = 1, commit: bool = True
+    ) -> None:
+        """
+        Store the Gmail history ID of the last synchronisation.
+
+        Args:
+            history_id (str): history ID
+            user_id (int): database user id
+            commit (bool): commit the session
+        """
+        with self._session_scope(commit=commit) as session:
+            history = (
+                session.query(EmailHistory)
+                .filter(EmailHistory.user_id == user_id)
+                .first()
+            )
+            if history is None:
+                session.add(EmailHistory(history_id=history_id, user_id=user_id))
+            else:
+                history.history_id = history_id
 
     def list_email_ids(self, user_id: int = 1) -> list[str]:
-        return [
-            instance.email_id
-            for instance in self._session.query(EmailContent)
-            .filter(EmailContent.user_id == user_id)
-            .order_by(EmailContent.id)
-        ]
+        with self._session_scope(commit=False) as session:
+            return list(session.scalars(_SELECT_EMAIL_IDS, {"user_id": user_id}))
 
     def mark_emails_as_deleted(
-        self, message_id_lst: list[str], user_id: int = 1
+        self, message_id_lst: list[str], user_id: int = 1, commit: bool = True
     ) -> None:
-        for instance in (
-            self._session.query(EmailContent)
-            .filter(EmailContent.user_id == user_id)
-            .filter(EmailContent.email_id.in_(message_id_lst))
-            .all()
-        ):
-            instance.email_deleted = True
-        self._session.commit()
+        with self._session_scope(commit=commit) as session:
+            for instance in (
+                session.query(EmailContent)
+                .filter(EmailContent.user_id == user_id)
+                .filter(EmailContent.email_id.in_(message_id_lst))
+                .all()
+            ):
+                instance.email_deleted = True
 
     def get_labels_to_update(
         self, message_id_lst: list[str], user_id: int = 1
@@ -114,97 +427,162 @@ class DatabaseInterface(DatabaseTemplate):
         message_id_lst: list[str],
         message_meta_lst: list[list[str]],
         user_id: int = 1,
+        commit: bool = True,
     ) -> None:
-        for message_id, message_labels in tqdm(
-            iterable=zip(message_id_lst, message_meta_lst, strict=False),
-            desc="Update labels",
-            total=len(message_id_lst),
-        ):
-            message_label_stored = [
-                m
-                for (m,) in self._session.query(Labels.label_id)
-                .filter(Labels.user_id == user_id)
-                .filter(Labels.email_id == message_id)
-                .all()
-            ]
-            if message_label_stored == message_labels:
-                continue
-            else:
-                message_label_stored_set = set(message_label_stored)
-                message_labels_set = set(message_labels)
-                labels_to_add = list(
-                    message_labels_set.difference(message_label_stored_set)
-                )
-                labels_to_remove = list(
-                    message_label_stored_set.difference(message_labels_set)
+        with self._session_scope(commit=commit) as session:
+            for message_id, message_labels in tqdm(
+                iterable=zip(message_id_lst, message_meta_lst, strict=False),
+                desc="Update labels",
+                total=len(message_id_lst),
+            ):
+                message_label_stored = _get_relation_values(
+                    session=session,
+                    column=Labels.label_id,
+                    user_id=user_id,
+                    email_id=message_id,
                 )
-                if len(labels_to_add) > 0:
-                    self._session.add_all(
-                        [
-                            Labels(
-                                email_id=message_id,
-                                label_id=label_id,
-                                user_id=user_id,
-                            )
-                            for label_id in labels_to_add
-                        ]
+                if message_label_stored == message_labels:
+                    continue
+                else:
+                    message_label_stored_set = set(message_label_stored)
+                    message_labels_set = set(message_labels)
+                    labels_to_add = list(
+                        message_labels_set.difference(message_label_stored_set)
                     )
-                if len(labels_to_remove) > 0:
-                    _ = [
-                        self._session.query(Labels)
-                        .filter(Labels.user_id == user_id)
-                        .filter(Labels.email_id == message_id)
-                        .filter(Labels.label_id == label_id)
-                        .delete()
-                        for label_id in labels_to_remove
-                    ]
-                self._session.commit()
+                    labels_to_remove = list(
+                        message_label_stored_set.difference(message_labels_set)
+                    )
+                    if len(labels_to_add) > 0:
+                        session.add_all(
+                            [
+                                Labels(
+                                    email_id=message_id,
+                                    label_id=label_id,
+                                    user_id=user_id,
+                                )
+                                for label_id in labels_to_add
+                            ]
+                        )
+                    if len(labels_to_remove) > 0:
+                        _ = [
+                            session.query(Labels)
+                            .filter(Labels.user_id == user_id)
+                            .filter(Labels.email_id == message_id)
+                            .filter(Labels.label_id == label_id)
+                            .delete()
+                            for label_id in labels_to_remove
+                        ]
 
     def get_all_emails(
         self, include_deleted: bool = False, user_id: int = 1
     ) -> pandas.DataFrame:
-        if include_deleted:
-            email_collect_lst = [
-                [
-                    email.email_id,
-                    email.email_subject,
-                    email.email_content,
-                    email.email_date,
-                ]
-                for email in self._session.query(EmailContent)
-                .filter(EmailContent.user_id == user_id)
-                .all()
-            ]
-        else:
-            email_collect_lst = [
-                [
-                    email.email_id,
-                    email.email_subject,
-                    email.email_content,
-                    email.email_date,
-                ]
-                for email in self._session.query(EmailContent)
-                .filter(EmailContent.user_id == user_id)
-                .filter(EmailContent.email_deleted.is_(False))
-                .all()
-            ]
-        return self._create_dataframe(
-            email_collect_lst=email_collect_lst,
-            user_id=user_id,
-            desc="Create dataframe from database",
-        )
+        return self.get_all_emails_for_users(
+            user_id_lst=[user_id], include_deleted=include_deleted
+        )[user_id]
+
+    def get_all_emails_for_users(
+        self, user_id_lst: list[int], include_deleted: bool = False
+    ) -> dict[int, pandas.DataFrame]:
+        """
+        Load the emails of multiple users with one set-based query per table rather than one query per email, so the
+        training data for many users can be loaded with a constant number of database round-trips.
+
+        Args:
+            user_id_lst (list): list of database user ids
+            include_deleted (bool): Flag to include deleted emails - default False
+
+        Returns:
+            dict: database user id as key and the pandas.DataFrame with all emails of this user as value
+        """
+        with self._read_session_scope() as session:
+            query = (
+                session.query(
+                    EmailContent.user_id,
+                    EmailContent.email_id,
+                    EmailContent.email_subject,
+                    EmailContent.email_content,
+                    EmailBody.body_data,
+                    EmailContent.email_date,
+                )
+                .outerjoin(EmailBody, _JOIN_EMAIL_BODY)
+                .filter(EmailContent.user_id.in_(user_id_lst))
+            )
+            if not include_deleted:
+                query = query.filter(EmailContent.email_deleted.is_(False))
+            email_collect_dict: dict[int, list[list[Any]]] = {
+                user_id: [] for user_id in user_id_lst
+            }
+            for (
+                user_id,
+                email_id,
+                email_subject,
+                email_content,
+                body_data,
+                email_date,
+            ) in query.order_by(EmailContent.id).all():
+                email_collect_dict[user_id].append(
+                    [
+                        email_id,
+                        email_subject,
+                        _get_body_text(
+                            email_content=email_content, body_data=body_data
+                        ),
+                        email_date,
+                    ]
+                )
+            email_from_dict = self._get_relation_dict(
+                session=session, column=EmailFrom.email_from, user_id_lst=user_id_lst
+            )
+            email_to_dict = self._get_relation_dict(
+                session=session, column=EmailTo.email_to, user_id_lst=user_id_lst
+            )
+            email_cc_dict = self._get_relation_dict(
+                session=session, column=EmailCc.email_cc, user_id_lst=user_id_lst
+            )
+            label_dict = self._get_relation_dict(
+                session=session, column=Labels.label_id, user_id_lst=user_id_lst
+            )
+            thread_dict = self._get_relation_dict(
+                session=session, column=Threads.thread_id, user_id_lst=user_id_lst
+            )
+        df_dict = {}
+        for user_id, email_collect_lst in email_collect_dict.items():
+            records = EmailRecordBuilder()
+            for email_id, email_subject, email_content, email_date in tqdm(
+                iterable=email_collect_lst, desc="Create dataframe from database"
+            ):
+                key = (user_id, email_id)
+                email_from = email_from_dict.get(key, [])
+                thread_lst = thread_dict.get(key, [])
+                records.append(
+                    values=(
+                        email_id,
+                        thread_lst[0] if len(thread_lst) > 0 else None,
+                        label_dict.get(key, []),
+                        email_to_dict.get(key, []),
+                        email_from[0] if len(email_from) > 0 else None,
+                        email_cc_dict.get(key, []),
+                        email_subject,
+                        email_content,
+                        email_date,
+                    )
+                )
+            df_dict[user_id] = records.to_dataframe(column_lst=_DATAFRAME_COLUMN_LST)
+        return df_dict
 
     def get_emails_by_label(
         self, label_id: str, include_deleted: bool = False, user_id: int = 1
     ) -> pandas.DataFrame:
-        return self.get_email_collection(
-            email_id_lst=[
+        with self._read_session_scope() as session:
+            email_id_lst = [
                 email_id
-                for (email_id,) in self._session.query(Labels.email_id)
+                for (email_id,) in session.query(Labels.email_id)
                 .filter(Labels.user_id == user_id)
                 .filter(Labels.label_id == label_id)
                 .all()
-            ],
+            ]
+        return self.get_email_collection(
+            email_id_lst=email_id_lst,
             include_deleted=include_deleted,
             user_id=user_id,
             desc="Create dataframe from emails by label",
@@ -213,14 +591,16 @@ class DatabaseInterface(DatabaseTemplate):
     def get_emails_by_from(
         self, email_from: str, include_deleted: bool = False, user_id: int = 1
     ) -> pandas.DataFrame:
-        return self.get_email_collection(
-            email_id_lst=[
+        with self._read_session_scope() as session:
+            email_id_lst = [
                 email_id
-                for (email_id,) in self._session.query(EmailFrom.email_id)
+                for (email_id,) in session.query(EmailFrom.email_id)
                 .filter(EmailFrom.user_id == user_id)
                 .filter(EmailFrom.email_from == email_from)
                 .all()
-            ],
+            ]
+        return self.get_email_collection(
+            email_id_lst=email_id_lst,
             include_deleted=include_deleted,
             user_id=user_id,
             desc="Create dataframe from emails by from",
@@ -229,14 +609,16 @@ class DatabaseInterface(DatabaseTemplate):
     def get_emails_by_to(
         self, email_to: str, include_deleted: bool = False, user_id: int = 1
     ) -> pandas.DataFrame:
-        return self.get_email_collection(
-            email_id_lst=[
+        with self._read_session_scope() as session:
+            email_id_lst = [
                 email_id
-                for (email_id,) in self._session.query(EmailTo.email_id)
+                for (email_id,) in session.query(EmailTo.email_id)
                 .filter(EmailTo.user_id == user_id)
                 .filter(EmailTo.email_to == email_to)
                 .all()
-            ],
+            ]
+        return self.get_email_collection(
+            email_id_lst=email_id_lst,
             include_deleted=include_deleted,
             user_id=user_id,
             desc="Create dataframe from emails by to",
@@ -245,14 +627,16 @@ class DatabaseInterface(DatabaseTemplate):
     def get_emails_by_cc(
         self, email_cc: str, include_deleted: bool = False, user_id: int = 1
     ) -> pandas.DataFrame:
-        return self.get_email_collection(
-            email_id_lst=[
+        with self._read_session_scope() as session:
+            email_id_lst = [
                 email_id
-                for (email_id,) in self._session.query(EmailTo.email_id)
+                for (email_id,) in session.query(EmailTo.email_id)
                 .filter(EmailCc.user_id == user_id)
                 .filter(EmailCc.email_cc == email_cc)
                 .all()
-            ],
+            ]
+        return self.get_email_collection(
+            email_id_lst=email_id_lst,
             include_deleted=include_deleted,
             user_id=user_id,
             desc="Create dataframe from emails by cc",
@@ -261,14 +645,16 @@ class DatabaseInterface(DatabaseTemplate):
     def get_emails_by_thread(
         self, thread_id: str, include_deleted: bool = False, user_id: int = 1
     ) -> pandas.DataFrame:
-        return self.get_email_collection(
-            email_id_lst=[
+        with self._read_session_scope() as session:
+            email_id_lst = [
                 email_id
-                for (email_id,) in self._session.query(Threads.email_id)
+                for (email_id,) in session.query(Threads.email_id)
                 .filter(Threads.user_id == user_id)
                 .filter(Threads.thread_id == thread_id)
                 .all()
-            ],
+            ]
+        return self.get_email_collection(
+            email_id_lst=email_id_lst,
             include_deleted=include_deleted,
             user_id=user_id,
             desc="Create dataframe from emails by thread",
@@ -281,185 +667,530 @@ class DatabaseInterface(DatabaseTemplate):
         user_id: int = 1,
         desc: str = "Create dataframe from email collection",
     ) -> pandas.DataFrame:
-        if include_deleted:
-            email_collect_lst = [
-                [
-                    email.email_id,
-                    email.email_subject,
-                    email.email_content,
-                    email.email_date,
-                ]
-                for email in self._session.query(EmailContent)
+        with self._read_session_scope() as session:
+            query = (
+                session.query(EmailContent, EmailBody.body_data)
+                .outerjoin(EmailBody, _JOIN_EMAIL_BODY)
                 .filter(EmailContent.user_id == user_id)
                 .filter(EmailContent.email_id.in_(email_id_lst))
-                .all()
-            ]
-        else:
+            )
+            if not include_deleted:
+                query = query.filter(EmailContent.email_deleted.is_(False))
             email_collect_lst = [
                 [
                     email.email_id,
                     email.email_subject,
-                    email.email_content,
+                    _get_body_text(
+                        email_content=email.email_content, body_data=body_data
+                    ),
                     email.email_date,
                 ]
-                for email in self._session.query(EmailContent)
-                .filter(EmailContent.user_id == user_id)
-                .filter(EmailContent.email_id.in_(email_id_lst))
-                .filter(EmailContent.email_deleted.is_(False))
-                .all()
+                for email, body_data in query.all()
             ]
-        return self._create_dataframe(
-            email_collect_lst=email_collect_lst, user_id=user_id, desc=desc
-        )
+            return self._create_dataframe(
+                session=session,
+                email_collect_lst=email_collect_lst,
+                user_id=user_id,
+                desc=desc,
+            )
+
+    def get_feature_vocabulary(
+        self, include_deleted: bool = False, user_id: int = 1
+    ) -> dict[str, dict[str, int]]:
+        """
+        Get the vocabulary for the one hot encoding with GROUP BY queries over the relation tables. For email addresses
+        the domains are counted as additional entries, matching the columns generated from a pandas.DataFrame.
+
+        Args:
+            include_deleted (bool): Flag to include deleted emails - default False
+            user_id (int): database user id
+
+        Returns:
+            dict: column name as key and a dictionary of the distinct values with their counts as value
+        """
+        with self._read_session_scope() as session:
+            return {
+                "labels": self._count_column_values(
+                    session=session,
+                    column=Labels.label_id,
+                    include_deleted=include_deleted,
+                    user_id=user_id,
+                    count_domains=True,
+                ),
+                "cc": self._count_column_values(
+                    session=session,
+                    column=EmailCc.email_cc,
+                    include_deleted=include_deleted,
+                    user_id=user_id,
+                    count_domains=True,
+                ),
+                "from": self._count_column_values(
+                    session=session,
+                    column=EmailFrom.email_from,
+                    include_deleted=include_deleted,
+                    user_id=user_id,
+                    count_domains=True,
+                ),
+                "threads": self._count_column_values(
+                    session=session,
+                    column=Threads.thread_id,
+                    include_deleted=include_deleted,
+                    user_id=user_id,
+                    count_domains=False,
+                ),
+                "to": self._count_column_values(
+                    session=session,
+                    column=EmailTo.email_to,
+                    include_deleted=include_deleted,
+                    user_id=user_id,
+                    count_domains=True,
+                ),
+            }
 
-    def _commit_thread_table(self, df: pandas.DataFrame, user_id: int = 1) -> None:
-        self._session.add_all(
+    @staticmethod
+    def _count_column_values(
+        session: Session,
+        column: InstrumentedAttribute,
+        include_deleted: bool = False,
+        user_id: int = 1,
+        count_domains: bool = False,
+    ) -> dict[str, int]:
+        table = column.class_
+        expression_lst = [column]
+        if count_domains:
+            expression_lst.append(
+                literal("@") + func.substr(column, func.instr(column, "@") + 1)
+            )
+        count_dict: dict[str, int] = {}
+        for expression in expression_lst:
+            query = (
+                session.query(expression, func.count())
+                .filter(table.user_id == user_id)
+                .filter(column.is_not(None))
+            )
+            if expression is not column:
+                query = query.filter(func.instr(column, "@") > 0)
+            if not include_deleted:
+                query = query.join(
+                    EmailContent,
+                    and_(
+                        EmailContent.email_id == table.email_id,
+                        EmailContent.user_id == table.user_id,
+                    ),
+                ).filter(EmailContent.email_deleted.is_(False))
+            for value, count in query.group_by(expression).all():
+                count_dict[value] = count_dict.get(value, 0) + count
+        return count_dict
+
+    @staticmethod
+    def _get_relation_dict(
+        session: Session, column: InstrumentedAttribute, user_id_lst: list[int]
+    ) -> dict[tuple[int, str], list[str]]:
+        table = column.class_
+        relation_dict: dict[tuple[int, str], list[str]] = {}
+        for user_id, email_id, value in (
+            session.query(table.user_id, table.email_id, column)
+            .filter(table.user_id.in_(user_id_lst))
+            .order_by(table.id)
+            .all()
+        ):
+            relation_dict.setdefault((user_id, email_id), []).append(value)
+        return relation_dict
+
+    @staticmethod
+    def _commit_thread_table(
+        session: Session, df: pandas.DataFrame, user_id: int = 1
+    ) -> None:
+        session.add_all(
             [
                 Threads(email_id=email_id, thread_id=thread_id, user_id=user_id)
                 for email_id, thread_id in zip(df["id"], df["threads"], strict=False)
             ]
         )
-        self._session.commit()
 
-    def _commit_email_from_table(self, df: pandas.DataFrame, user_id: int = 1) -> None:
-        self._session.add_all(
+    @staticmethod
+    def _commit_email_from_table(
+        session: Session, df: pandas.DataFrame, user_id: int = 1
+    ) -> None:
+        session.add_all(
             [
                 EmailFrom(email_id=email_id, email_from=email_from, user_id=user_id)
                 for email_id, email_from in zip(df["id"], df["from"], strict=False)
             ]
         )
-        self._session.commit()
 
-    def _commit_label_table(self, df: pandas.DataFrame, user_id: int = 1) -> None:
+    @staticmethod
+    def _commit_label_table(
+        session: Session, df: pandas.DataFrame, user_id: int = 1
+    ) -> None:
         label_lst = []
         for email_id, lid_lst in zip(df["id"], df["labels"], strict=False):
             for label_id in lid_lst:
                 label_lst.append(
                     Labels(email_id=email_id, label_id=label_id, user_id=user_id)
                 )
-        self._session.add_all(label_lst)
-        self._session.commit()
+        session.add_all(label_lst)
 
-    def _commit_email_to_table(self, df: pandas.DataFrame, user_id: int = 1) -> None:
+    @staticmethod
+    def _commit_email_to_table(
+        session: Session, df: pandas.DataFrame, user_id: int = 1
+    ) -> None:
         email_to_lst = []
         for email_id, email_lst in zip(df["id"], df["to"], strict=False):
             for email_to in email_lst:
                 email_to_lst.append(
                     EmailTo(email_id=email_id, email_to=email_to, user_id=user_id)
                 )
-        self._session.add_all(email_to_lst)
-        self._session.commit()
+        session.add_all(email_to_lst)
 
-    def _commit_email_cc_table(self, df: pandas.DataFrame, user_id: int = 1) -> None:
+    @staticmethod
+    def _commit_email_cc_table(
+        session: Session, df: pandas.DataFrame, user_id: int = 1
+    ) -> None:
         email_cc_lst = []
         for email_id, email_lst in zip(df["id"], df["cc"], strict=False):
             for email_cc in email_lst:
                 email_cc_lst.append(
                     EmailCc(email_id=email_id, email_cc=email_cc, user_id=user_id)
                 )
-        self._session.add_all(email_cc_lst)
-        self._session.commit()
+        session.add_all(email_cc_lst)
 
-    def _commit_content_table(self, df: pandas.DataFrame, user_id: int = 1) -> None:
-        self._session.add_all(
+    @staticmethod
+    def _commit_content_table(
+        session: Session, df: pandas.DataFrame, user_id: int = 1
+    ) -> None:
+        content_lst = df["content"].tolist()
+        session.add_all(
             [
                 EmailContent(
                     email_id=email_id,
                     email_subject=email_subject,
-                    email_content=email_content,
+                    email_body_hash=email_body_hash,
                     email_deleted=False,
                     email_date=email_date,
                     user_id=user_id,
                 )
-                for email_id, email_subject, email_content, email_date in zip(
-                    df["id"], df["subject"], df["content"], df["date"], strict=False
+                for email_id, email_subject, email_body_hash, email_date in zip(
+                    df["id"],
+                    df["subject"],
+                    _store_email_bodies(
+                        session=session,
+                        user_id_lst=[user_id] * len(content_lst),
+                        content_lst=content_lst,
+                    ),
+                    df["date"],
+                    strict=False,
                 )
             ]
         )
-        self._session.commit()
 
+    @staticmethod
     def _create_dataframe(
-        self,
+        session: Session,
         email_collect_lst: list[list[Any]],
         user_id: int = 1,
         desc: str = "Create dataframe from email list",
     ) -> pandas.DataFrame:
-        (
-            email_id_lst,
-            email_subject_lst,
-            email_content_lst,
-            email_from_lst,
-            email_to_lst,
-            email_cc_lst,
-            email_threads_lst,
-            email_labels_lst,
-            email_date_lst,
-        ) = ([], [], [], [], [], [], [], [], [])
+        records = EmailRecordBuilder()
         for email_id, email_subject, email_content, email_date in tqdm(
             iterable=email_collect_lst, desc=desc
         ):
-            email_from = [
-                email_from.email_from
-                for email_from in self._session.query(EmailFrom)
-                .filter(EmailFrom.user_id == user_id)
-                .filter(EmailFrom.email_id == email_id)
-                .all()
-            ]
-            email_to = [
-                email_to.email_to
-                for email_to in self._session.query(EmailTo)
-                .filter(EmailTo.user_id == user_id)
-                .filter(EmailTo.email_id == email_id)
-                .all()
-            ]
-            email_cc = [
-                email_cc.email_cc
-                for email_cc in self._session.query(EmailCc)
-                .filter(EmailCc.user_id == user_id)
-                .filter(EmailCc.email_id == email_id)
-                .all()
-            ]
-            label_lst = [
-                labels.label_id
-                for labels in self._session.query(Labels)
-                .filter(Labels.user_id == user_id)
-                .filter(Labels.email_id == email_id)
-                .all()
-            ]
-            thread_lst = [
-                threads.thread_id
-                for threads in self._session.query(Threads)
-                .filter(Threads.user_id == user_id)
-                .filter(Threads.email_id == email_id)
+            email_from = _get_relation_values(
+                session=session,
+                column=EmailFrom.email_from,
+                user_id=user_id,
+                email_id=email_id,
+            )
+            email_to = _get_relation_values(
+                session=session,
+                column=EmailTo.email_to,
+                user_id=user_id,
+                email_id=email_id,
+            )
+            email_cc = _get_relation_values(
+                session=session,
+                column=EmailCc.email_cc,
+                user_id=user_id,
+                email_id=email_id,
+            )
+            label_lst = _get_relation_values(
+                session=session,
+                column=Labels.label_id,
+                user_id=user_id,
+                email_id=email_id,
+            )
+            thread_lst = _get_relation_values(
+                session=session,
+                column=Threads.thread_id,
+                user_id=user_id,
+                email_id=email_id,
+            )
+            records.append(
+                values=(
+                    email_id,
+                    thread_lst[0],
+                    label_lst,
+                    email_to,
+                    email_from[0] if len(email_from) > 0 else None,
+                    email_cc,
+                    email_subject,
+                    email_content,
+                    email_date,
+                )
+            )
+        return records.to_dataframe(column_lst=_DATAFRAME_COLUMN_LST)
+
+
+def get_email_database(
+    engine: Engine,
+    session: Session | None = None,
+    session_factory: sessionmaker | None = None,
+    read_replica: ReadReplica | None = None,
+    clustered_layout: bool = False,
+) -> DatabaseInterface:
+    Base.metadata.create_all(engine)
+    _add_body_hash_column(engine=engine)
+    if clustered_layout:
+        migrate_to_clustered_layout(engine=engine)
+    elif engine.dialect.name == "sqlite":
+        # A database migrated before is still clustered, when it is opened without the clustered_layout flag.
+        _register_clustered_layout(engine=engine)
+    return DatabaseInterface(
+        session=session, session_factory=session_factory, read_replica=read_replica
+    )
+
+
+def migrate_to_clustered_layout(engine: Engine) -> None:
+    """
+    Rebuild the email tables of a SQLite database as WITHOUT ROWID tables with the primary key (user_id, email_id, id),
+    so the rows of one user are stored next to each other rather than in insertion order. The id column remains unique
+    and is assigned on insert, so the ORM models are used unchanged. Tables which are already clustered are skipped.
+
+    Args:
+        engine: SQLalchemy database engine of a SQLite database
+    """
+    if engine.dialect.name != "sqlite":
+        raise ValueError("The clustered layout is only available for SQLite databases.")
+    with engine.begin() as connection:
+        clustered_table_lst = _get_clustered_tables(connection=connection)
+        for table in Base.metadata.sorted_tables:
+            # Tables without email_id column, like the email body store and the sync history, are not clustered.
+            if table.name not in clustered_table_lst and "email_id" in table.columns:
+                _rebuild_clustered_table(connection=connection, table=table)
+    _register_clustered_layout(engine=engine)
+
+
+def migrate_to_body_store(engine: Engine, batch_size: int = 1000) -> int:
+    """
+    Move the email bodies stored in the email_content table to the content-addressed email_body table. The emails are
+    processed in batches of batch_size emails, each in its own transaction, so the migration can be interrupted and
+    continued later.
+
+    Args:
+        engine: SQLalchemy database engine
+        batch_size (int): number of emails per transaction
+
+    Returns:
+        int: number of migrated emails
+    """
+    Base.metadata.create_all(engine)
+    _add_body_hash_column(engine=engine)
+    session_factory = sessionmaker(bind=engine)
+    number_of_emails = 0
+    while True:
+        with session_scope(session_factory=session_factory) as session:
+            email_lst = (
+                session.query(EmailContent)
+                .filter(EmailContent.email_content.is_not(None))
+                .filter(EmailContent.email_body_hash.is_(None))
+                .order_by(EmailContent.id)
+                .limit(batch_size)
                 .all()
-            ]
-            if len(email_from) > 0:
-                email_from_lst.append(email_from[0])
-            else:
-                email_from_lst.append(None)
-            email_cc_lst.append(email_cc)
-            email_to_lst.append(email_to)
-            email_labels_lst.append(label_lst)
-            email_threads_lst.append(thread_lst[0])
-            email_id_lst.append(email_id)
-            email_subject_lst.append(email_subject)
-            email_content_lst.append(email_content)
-            email_date_lst.append(email_date)
-        return pandas.DataFrame(
-            {
-                "id": email_id_lst,
-                "from": email_from_lst,
-                "to": email_to_lst,
-                "cc": email_cc_lst,
-                "date": email_date_lst,
-                "threads": email_threads_lst,
-                "labels": email_labels_lst,
-                "subject": email_subject_lst,
-                "content": email_content_lst,
-            }
+            )
+            if len(email_lst) == 0:
+                return number_of_emails
+            for email, email_body_hash in zip(
+                email_lst,
+                _store_email_bodies(
+                    session=session,
+                    user_id_lst=[email.user_id for email in email_lst],
+                    content_lst=[email.email_content for email in email_lst],
+                ),
+                strict=True,
+            ):
+                email.email_body_hash = email_body_hash
+                email.email_content = None
+            number_of_emails += len(email_lst)
+
+
+def _add_body_hash_column(engine: Engine) -> None:
+    # Databases created before the email body store do not have the email_body_hash column yet.
+    if "email_body_hash" not in [
+        column["name"] for column in inspect(engine).get_columns("email_content")
+    ]:
+        with engine.begin() as connection:
+            connection.exec_driver_sql(
+                "ALTER TABLE email_content ADD COLUMN email_body_hash VARCHAR"
+            )
+
+
+def _get_body_hash(content: str) -> str:
+    # Bodies which only differ in whitespace are stored once.
+    return hashlib.sha256(" ".join(content.split()).encode("UTF-8")).hexdigest()
+
+
+def _get_body_text(email_content: str | None, body_data: bytes | None) -> str | None:
+    if body_data is None:
+        return email_content
+    else:
+        return zlib.decompress(body_data).decode("UTF-8")
+
+
+def _store_email_bodies(
+    session: Session, user_id_lst: list[int], content_lst: list[Any]
+) -> list[str | None]:
+    """
+    Add the bodies which are not yet stored to the email_body table.
+
+    Args:
+        session (sqlalchemy.orm.Session): database session
+        user_id_lst (list): database user id for every body
+        content_lst (list): text of every body, None if the body is not available
+
+    Returns:
+        list: body hash for every body, None if the body is not available
+    """
+    hash_lst = [
+        _get_body_hash(content=content) if isinstance(content, str) else None
+        for content in content_lst
+    ]
+    body_dict: dict[tuple[int, str], str] = {}
+    for user_id, body_hash, content in zip(
+        user_id_lst, hash_lst, content_lst, strict=True
+    ):
+        if body_hash is not None and (user_id, body_hash) not in body_dict:
+            body_dict[(user_id, body_hash)] = content
+    body_hash_lst = list({body_hash for _, body_hash in body_dict})
+    stored_body_set = set()
+    for i in range(0, len(body_hash_lst), _BODY_HASH_CHUNK_SIZE):
+        stored_body_set.update(
+            (user_id, body_hash)
+            for user_id, body_hash in session.execute(
+                select(EmailBody.user_id, EmailBody.body_hash).where(
+                    EmailBody.body_hash.in_(
+                        body_hash_lst[i : i + _BODY_HASH_CHUNK_SIZE]
+                    )
+                )
+            )
         )
+    session.add_all(
+        [
+            EmailBody(
+                body_hash=body_hash,
+                body_data=zlib.compress(content.encode("UTF-8")),
+                user_id=user_id,
+            )
+            for (user_id, body_hash), content in body_dict.items()
+            if (user_id, body_hash) not in stored_body_set
+        ]
+    )
+    return hash_lst
 
 
-def get_email_database(engine: Engine, session: Session) -> DatabaseInterface:
-    Base.metadata.create_all(engine)
-    return DatabaseInterface(session=session)
+def _get_clustered_tables(connection: Connection) -> list[str]:
+    return [
+        name
+        for name, sql in connection.exec_driver_sql(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'table'"
+        )
+        if sql is not None and "WITHOUT ROWID" in sql.upper()
+    ]
+
+
+def _rebuild_clustered_table(connection: Connection, table: Table) -> None:
+    key_lst = ["user_id", "email_id", "id"]
+    null_count = connection.exec_driver_sql(
+        f"SELECT count(*) FROM {table.name} WHERE "
+        + " OR ".join(key + " IS NULL" for key in key_lst)
+    ).scalar()
+    if null_count > 0:
+        raise ValueError(
+            f"The table {table.name} contains {null_count} rows without user_id or email_id."
+        )
+    column_lst = [column.name for column in table.columns]
+    column_definition_lst = [
+        column.name
+        + " "
+        + column.type.compile(dialect=connection.dialect)
+        + (" NOT NULL" if column.name in key_lst else "")
+        for column in table.columns
+    ]
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {table.name}_clustered")
+    connection.exec_driver_sql(
+        f"CREATE TABLE {table.name}_clustered ("
+        + ", ".join(column_definition_lst)
+        + f", PRIMARY KEY ({', '.join(key_lst)})) WITHOUT ROWID"
+    )
+    connection.exec_driver_sql(
+        f"INSERT INTO {table.name}_clustered ({', '.join(column_lst)}) "
+        f"SELECT {', '.join(column_lst)} FROM {table.name}"
+    )
+    connection.exec_driver_sql(f"DROP TABLE {table.name}")
+    connection.exec_driver_sql(
+        f"ALTER TABLE {table.name}_clustered RENAME TO {table.name}"
+    )
+    connection.exec_driver_sql(
+        f"CREATE UNIQUE INDEX ix_{table.name}_id ON {table.name} (id)"
+    )
+
+
+def _register_clustered_layout(engine: Engine) -> None:
+    with engine.begin() as connection:
+        clustered_table_lst = [
+            name
+            for name in _get_clustered_tables(connection=connection)
+            if name in Base.metadata.tables
+        ]
+        if len(clustered_table_lst) == 0:
+            return
+        connection.exec_driver_sql(
+            f"CREATE TABLE IF NOT EXISTS {_ID_SEQUENCE_TABLE} ("
+            "table_name VARCHAR NOT NULL PRIMARY KEY, next_id INTEGER NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        for name in clustered_table_lst:
+            connection.exec_driver_sql(
+                f"INSERT OR IGNORE INTO {_ID_SEQUENCE_TABLE} (table_name, next_id) "
+                f"SELECT '{name}', coalesce(max(id), 0) + 1 FROM {name}"
+            )
+    _CLUSTERED_TABLE_DICT[engine] = frozenset(clustered_table_lst)
+    # The listener is only registered once a clustered database is opened, other databases are not affected.
+    if not event.contains(Session, "before_flush", _assign_clustered_ids):
+        event.listen(Session, "before_flush", _assign_clustered_ids)
+
+
+def _assign_clustered_ids(
+    session: Session, flush_context: UOWTransaction, instances: Any
+) -> None:
+    # WITHOUT ROWID tables do not generate the integer id, so the ids are reserved from the id sequence of the table.
+    # The UPDATE of the sequence takes the write lock of the flush transaction, so concurrent writers get distinct ids.
+    clustered_table_set = _CLUSTERED_TABLE_DICT.get(session.get_bind().engine)
+    if clustered_table_set is None:
+        return
+    new_object_dict: dict[str, list[Any]] = {}
+    for obj in session.new:
+        if (
+            isinstance(obj, Base)
+            and obj.id is None
+            and obj.__tablename__ in clustered_table_set
+        ):
+            new_object_dict.setdefault(obj.__tablename__, []).append(obj)
+    if len(new_object_dict) == 0:
+        return
+    connection = session.connection()
+    for table_name, obj_lst in new_object_dict.items():
+        parameter_dict = {"table_name": table_name, "count": len(obj_lst)}
+        connection.execute(_UPDATE_ID_SEQUENCE, parameter_dict)
+        next_id = connection.execute(_SELECT_ID_SEQUENCE, parameter_dict).scalar_one()
+        for i, obj in enumerate(obj_lst, start=next_id - len(obj_lst)):
+            obj.id = i
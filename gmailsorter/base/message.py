@@ -1,14 +1,138 @@
+import string
 from abc import ABC, abstractmethod
+from collections.abc import Iterable, Sequence
 from datetime import datetime
+from email.utils import getaddresses, parsedate_to_datetime
+from functools import lru_cache
 from typing import Any
 
+import pandas
+
 _MAX_DATE_COMMAS = 2
 _DATE_HYPHEN_COUNT = 2
 
+# The shape of a date string replaces all digits by 9 and all letters by a, for example "Fri, 11 Feb 2022" becomes
+# "aaa, 99 aaa 9999". For every shape the cache stores None when the heuristics are required, otherwise whether the
+# fast path returns timezone aware dates.
+_DATE_SHAPE_TABLE = str.maketrans(
+    string.digits + string.ascii_letters, "9" * 10 + "a" * 52
+)
+_DATE_SHAPE_CACHE_SIZE = 1024
+_UNKNOWN_SHAPE = object()
+_date_shape_dict: dict[str, bool | None] = {}
+_EMAIL_ADDRESS_CACHE_SIZE = 4096
+
+# Parsing profiles for AbstractMessage.to_dict(), the metadata profile skips the decoding of the email body.
+PROFILE_FULL = "full"
+PROFILE_METADATA = "metadata"
+
+# Columns of the email records in the order of AbstractMessage.to_values()
+EMAIL_COLUMN_LST = [
+    "id",
+    "threads",
+    "labels",
+    "to",
+    "from",
+    "cc",
+    "subject",
+    "content",
+    "date",
+]
+
 
 def email_date_converter(email_date: Any) -> datetime | None:
+    """
+    Convert the date header of an email to a datetime object. RFC 2822 dates are parsed with
+    email.utils.parsedate_to_datetime(), other dates with a set of heuristics. Which of the two is used is decided once
+    for every shape of the date string, by comparing both results for the first date of this shape.
+
+    Args:
+        email_date (str): date header of the email
+
+    Returns:
+        datetime: date of the email or None if no date is available
+    """
     if not isinstance(email_date, str):
         return None
+    shape = email_date.translate(_DATE_SHAPE_TABLE)
+    timezone_aware = _date_shape_dict.get(shape, _UNKNOWN_SHAPE)
+    if timezone_aware is _UNKNOWN_SHAPE:
+        date = _convert_email_date_with_heuristics(email_date=email_date)
+        if len(_date_shape_dict) < _DATE_SHAPE_CACHE_SIZE:
+            _date_shape_dict[shape] = _get_fast_path_timezone_awareness(
+                email_date=email_date, date=date
+            )
+        return date
+    elif timezone_aware is None:
+        return _convert_email_date_with_heuristics(email_date=email_date)
+    try:
+        date = parsedate_to_datetime(email_date)
+    except ValueError:
+        return _convert_email_date_with_heuristics(email_date=email_date)
+    # parsedate_to_datetime() returns a naive datetime for the -0000 offset, unlike the heuristics.
+    if (date.tzinfo is not None) != timezone_aware:
+        return _convert_email_date_with_heuristics(email_date=email_date)
+    return date
+
+
+def email_date_converter_batch(email_date_lst: Iterable[Any]) -> list[datetime | None]:
+    """
+    Convert a column of email date headers to datetime objects, every distinct date is only converted once. Dates
+    which cannot be converted are returned as None.
+
+    Args:
+        email_date_lst (list): date headers of the emails
+
+    Returns:
+        list: dates of the emails
+    """
+    date_dict: dict[Any, datetime | None] = {}
+    date_lst = []
+    for email_date in email_date_lst:
+        try:
+            date = date_dict[email_date]
+        except KeyError:
+            try:
+                date = email_date_converter(email_date=email_date)
+            except ValueError:
+                date = None
+            date_dict[email_date] = date
+        date_lst.append(date)
+    return date_lst
+
+
+@lru_cache(maxsize=_EMAIL_ADDRESS_CACHE_SIZE)
+def split_email_addresses(header_value: str | None) -> tuple[str, ...]:
+    """
+    Extract the email addresses from an address header like From, To or Cc following RFC 2822, so quoted display
+    names containing commas are handled correctly. The addresses are normalized to lower case. As the same senders and
+    recipients occur in many emails, the results are cached.
+
+    Args:
+        header_value (str): value of the address header
+
+    Returns:
+        tuple: lower case email addresses
+    """
+    if header_value is None:
+        return ()
+    return tuple(
+        address.lower() for _, address in getaddresses([header_value]) if "@" in address
+    )
+
+
+def _get_fast_path_timezone_awareness(email_date: str, date: datetime) -> bool | None:
+    try:
+        date_fast = parsedate_to_datetime(email_date)
+    except ValueError:
+        return None
+    if date_fast != date or date_fast.utcoffset() != date.utcoffset():
+        return None
+    else:
+        return date.tzinfo is not None
+
+
+def _convert_email_date_with_heuristics(email_date: str) -> datetime:
     if email_date[:1] == "\xa0":
         email_date = email_date.replace("\xa0", "")
     if email_date.count(",") >= _MAX_DATE_COMMAS:
@@ -36,6 +160,8 @@ def email_date_converter(email_date: Any) -> datetime | None:
 
 
 class AbstractMessage(ABC):
+    __slots__ = ("_message_dict",)
+
     def __init__(self, message_dict: dict[str, Any]) -> None:
         self._message_dict = message_dict
 
@@ -75,15 +201,110 @@ class AbstractMessage(ABC):
     def get_email_id(self) -> str:
         pass
 
-    def to_dict(self) -> dict[str, Any]:
-        return {
-            "id": self.get_email_id(),
-            "threads": self.get_thread_id(),
-            "labels": self.get_label_ids(),
-            "to": self.get_to(),
-            "from": self.get_from(),
-            "cc": self.get_cc(),
-            "subject": self.get_subject(),
-            "content": self.get_content(),
-            "date": self.get_date(),
-        }
+    def to_dict(self, profile: str = PROFILE_FULL) -> dict[str, Any]:
+        """
+        Convert the message to a dictionary. The metadata profile only extracts the header fields and sets the content
+        to None, so the email body is never decoded.
+
+        Args:
+            profile (str): parsing profile [full, metadata]
+
+        Returns:
+            dict: message as python dictionary
+        """
+        return dict(zip(EMAIL_COLUMN_LST, self.to_values(profile=profile), strict=True))
+
+    def to_values(self, profile: str = PROFILE_FULL) -> tuple[Any, ...]:
+        """
+        Convert the message to a tuple of field values in the order of EMAIL_COLUMN_LST, see to_dict().
+
+        Args:
+            profile (str): parsing profile [full, metadata]
+
+        Returns:
+            tuple: field values of the message
+        """
+        if profile == PROFILE_FULL:
+            content = self.get_content()
+        elif profile == PROFILE_METADATA:
+            content = None
+        else:
+            raise ValueError("Unknown parsing profile: " + str(profile))
+        return (
+            self.get_email_id(),
+            self.get_thread_id(),
+            self.get_label_ids(),
+            self.get_to(),
+            self.get_from(),
+            self.get_cc(),
+            self.get_subject(),
+            content,
+            self.get_date(),
+        )
+
+
+class EmailRecordBuilder:
+    __slots__ = ("_column_lst",)
+
+    def __init__(self) -> None:
+        """
+        Columnar accumulator for email records, the fields of every record are appended directly to one list per
+        column of EMAIL_COLUMN_LST, so no dictionary per email is required to create the pandas.DataFrame.
+        """
+        self._column_lst: list[list[Any]] = [[] for _ in EMAIL_COLUMN_LST]
+
+    def __len__(self) -> int:
+        return len(self._column_lst[0])
+
+    def append(self, values: Sequence[Any]) -> None:
+        """
+        Append a single email record.
+
+        Args:
+            values (tuple): field values in the order of EMAIL_COLUMN_LST
+        """
+        if len(values) != len(self._column_lst):
+            raise ValueError(
+                "Expected "
+                + str(len(self._column_lst))
+                + " values, got "
+                + str(len(values))
+            )
+        for column, value in zip(self._column_lst, values, strict=True):
+            column.append(value)
+
+    def extend(self, other: "EmailRecordBuilder") -> None:
+        """
+        Append all email records of another EmailRecordBuilder, for example one chunk parsed in a worker process.
+
+        Args:
+            other (EmailRecordBuilder): email records to append
+        """
+        for column, other_column in zip(
+            self._column_lst, other._column_lst, strict=True
+        ):
+            column.extend(other_column)
+
+    def to_dict(self) -> dict[str, list[Any]]:
+        """
+        Get the email records as record batch without creating a pandas.DataFrame.
+
+        Returns:
+            dict: column name as key and the list of values as value
+        """
+        return dict(zip(EMAIL_COLUMN_LST, self._column_lst, strict=True))
+
+    def to_dataframe(self, column_lst: list[str] | None = None) -> pandas.DataFrame:
+        """
+        Create a pandas.DataFrame from the email records.
+
+        Args:
+            column_lst (list/None): order of the columns - by default EMAIL_COLUMN_LST
+
+        Returns:
+            pandas.DataFrame: one row per email record
+        """
+        column_dict = self.to_dict()
+        if column_lst is None:
+            column_lst = EMAIL_COLUMN_LST
+        return pandas.DataFrame({column: column_dict[column] for column in column_lst})
@@ -0,0 +1,200 @@
+import atexit
+import queue
+import threading
+from collections.abc import Callable
+from typing import Any
+
+import pandas
+from sqlalchemy import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from gmailsorter.base.database import DatabaseInterface
+
+
+def put_write_operation(
+    write_queue: Any, function: Callable[..., None], **kwargs: Any
+) -> None:
+    """
+    Queue a database write. The function is called with an open session as keyword argument session and the remaining
+    keyword arguments, it must not commit the session. To queue writes from worker processes, the function has to be
+    defined on module level and the write_queue has to be a multiprocessing.Queue shared with the BufferedWriter.
+
+    Args:
+        write_queue (queue.Queue/ multiprocessing.Queue): queue the BufferedWriter is reading from
+        function (callable): function to apply the write to the session
+        **kwargs: keyword arguments for the function
+    """
+    write_queue.put((function, kwargs))
+
+
+def _store_dataframe(session: Session, df: pandas.DataFrame, user_id: int) -> None:
+    DatabaseInterface(session=session).store_dataframe(
+        df=df, user_id=user_id, commit=False
+    )
+
+
+def _update_labels(
+    session: Session,
+    message_id_lst: list[str],
+    message_meta_lst: list[list[str]],
+    user_id: int,
+) -> None:
+    DatabaseInterface(session=session).update_labels(
+        message_id_lst=message_id_lst,
+        message_meta_lst=message_meta_lst,
+        user_id=user_id,
+        commit=False,
+    )
+
+
+def _mark_emails_as_deleted(
+    session: Session, message_id_lst: list[str], user_id: int
+) -> None:
+    DatabaseInterface(session=session).mark_emails_as_deleted(
+        message_id_lst=message_id_lst, user_id=user_id, commit=False
+    )
+
+
+class BufferedWriter:
+    def __init__(
+        self,
+        engine: Engine,
+        max_batch_size: int = 100,
+        flush_interval: float = 5.0,
+        write_queue: Any = None,
+    ) -> None:
+        """
+        Write-behind buffer for database writes. Writes are queued by the worker threads or processes and applied by a
+        background thread in batched transactions, either when max_batch_size writes are queued or every
+        flush_interval seconds. All queued writes are flushed on close() and at interpreter shutdown.
+
+        Args:
+            engine: SQLalchemy database engine
+            max_batch_size (int): maximum number of writes per transaction
+            flush_interval (float): maximum number of seconds a write is buffered
+            write_queue (queue.Queue/ multiprocessing.Queue): optional queue to collect writes from worker processes
+        """
+        self._session_factory = sessionmaker(bind=engine)
+        self._max_batch_size = max_batch_size
+        self._flush_interval = flush_interval
+        self._queue = write_queue if write_queue is not None else queue.Queue()
+        self._lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._error_lst: list[Exception] = []
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def queue(self) -> Any:
+        return self._queue
+
+    def put(self, function: Callable[..., None], **kwargs: Any) -> None:
+        """
+        Queue a database write, see put_write_operation() for details.
+
+        Args:
+            function (callable): function to apply the write to the session
+            **kwargs: keyword arguments for the function
+        """
+        if self._stop_event.is_set():
+            raise ValueError("The BufferedWriter is already closed.")
+        put_write_operation(self._queue, function, **kwargs)
+        try:
+            if self._queue.qsize() >= self._max_batch_size:
+                self._flush_event.set()
+        except NotImplementedError:  # multiprocessing.Queue on macOS
+            pass
+
+    def store_dataframe(self, df: pandas.DataFrame, user_id: int = 1) -> None:
+        self.put(_store_dataframe, df=df, user_id=user_id)
+
+    def update_labels(
+        self,
+        message_id_lst: list[str],
+        message_meta_lst: list[list[str]],
+        user_id: int = 1,
+    ) -> None:
+        self.put(
+            _update_labels,
+            message_id_lst=message_id_lst,
+            message_meta_lst=message_meta_lst,
+            user_id=user_id,
+        )
+
+    def mark_emails_as_deleted(
+        self, message_id_lst: list[str], user_id: int = 1
+    ) -> None:
+        self.put(
+            _mark_emails_as_deleted, message_id_lst=message_id_lst, user_id=user_id
+        )
+
+    def flush(self) -> None:
+        """
+        Write all queued writes to the database and raise the first error of the previous flushes.
+        """
+        self._write_queued()
+        self._raise_errors()
+
+    def close(self) -> None:
+        """
+        Stop the background thread and write all remaining writes to the database.
+        """
+        atexit.unregister(self.close)
+        if not self._stop_event.is_set():
+            self._stop_event.set()
+            self._flush_event.set()
+            self._thread.join()
+        self.flush()
+
+    def __enter__(self) -> "BufferedWriter":
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        self.close()
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            self._flush_event.wait(timeout=self._flush_interval)
+            self._flush_event.clear()
+            self._write_queued()
+
+    def _write_queued(self) -> None:
+        with self._lock:
+            operation_lst = []
+            while True:
+                try:
+                    operation_lst.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for i in range(0, len(operation_lst), self._max_batch_size):
+                self._write_batch(
+                    operation_lst=operation_lst[i : i + self._max_batch_size]
+                )
+
+    def _write_batch(
+        self, operation_lst: list[tuple[Callable[..., None], dict[str, Any]]]
+    ) -> None:
+        session = self._session_factory()
+        try:
+            for function, kwargs in operation_lst:
+                function(session=session, **kwargs)
+            session.commit()
+        except Exception:
+            session.rollback()
+            # Isolate the failing write, so the remaining writes of the batch are not lost.
+            for function, kwargs in operation_lst:
+                try:
+                    function(session=session, **kwargs)
+                    session.commit()
+                except Exception as e:
+                    session.rollback()
+                    self._error_lst.append(e)
+        finally:
+            session.close()
+
+    def _raise_errors(self) -> None:
+        if len(self._error_lst) > 0:
+            error_lst, self._error_lst = self._error_lst, []
+            raise error_lst[0]
@@ -1,6 +1,8 @@
 import argparse
 import os
 
+from sqlalchemy import create_engine
+
 from gmailsorter.daemon.daemon import update
 from gmailsorter.daemon.shared import get_database_engine, load_config_file
 
@@ -33,6 +35,11 @@ def command_line_parser() -> None:
         "--database",
         help="Connection string to connect to database e.g. sqlite:///email.db .",
     )
+    parser.add_argument(
+        "-r",
+        "--replica",
+        help="Connection string to connect to a read replica of the database e.g. sqlite:///replica.db .",
+    )
     parser.add_argument(
         "-f",
         "--filter",
@@ -56,6 +63,12 @@ def command_line_parser() -> None:
         "--tasks",
         help="Number of parallel tasks to use.",
     )
+    parser.add_argument(
+        "-q",
+        "--quota",
+        help="Quota units per second of the Google Cloud project, shared by all daemon processes using the "
+        "database. By default the project quota is not tracked.",
+    )
     args = parser.parse_args()
     if args.credentials:
         client_secrets_config = load_config_file(file_name=args.credentials)
@@ -86,6 +99,8 @@ def command_line_parser() -> None:
             include_deleted=False,
             recommendation_ratio=0.9,
             max_workers=int(args.tasks) if args.tasks else None,
+            replica_engine=create_engine(args.replica) if args.replica else None,
+            project_quota_units_per_second=float(args.quota) if args.quota else None,
         )
     else:
         parser.print_help()
@@ -5,6 +5,7 @@ from googleapiclient.errors import HttpError
 from sqlalchemy import Engine
 from sqlalchemy.orm import Session, sessionmaker
 
+from gmailsorter.base.writer import BufferedWriter
 from gmailsorter.daemon.shared import (
     JOB_STATUS_FAIL,
     JOB_STATUS_INIT,
@@ -13,13 +14,17 @@ from gmailsorter.daemon.shared import (
     MAILSORT_LABEL,
     SCOPES,
     GoogleMail,
-    GoogleToken,
     get_task_status_for_user,
+    get_token,
 )
 from gmailsorter.daemon.tasks import (
     get_all_tasks_to_execute,
     update_task_status,
 )
+from gmailsorter.google.quota import (
+    QuotaExecutor,
+    SharedTokenBucket,
+)
 
 
 def load_user_data_from_database(
@@ -30,8 +35,7 @@ def load_user_data_from_database(
     for lst in job_dict.values():
         user_id_lst += lst
     token_dict = {
-        user_id: session.query(GoogleToken).filter_by(user_id=user_id).first()
-        for user_id in user_id_lst
+        user_id: get_token(session=session, user_id=user_id) for user_id in user_id_lst
     }
     token_detail_dict = {
         key: {
@@ -61,6 +65,10 @@ def iterate_over_users(
     include_deleted: bool = False,
     recommendation_ratio: float = 0.9,
     max_workers: int | None = None,
+    writer: BufferedWriter | None = None,
+    replica_engine: Engine | None = None,
+    max_replica_staleness: float | None = None,
+    project_bucket: SharedTokenBucket | None = None,
 ) -> None:
     for user_database_id in user_id_lst:
         token_user_dict = token_detail_dict[user_database_id]
@@ -79,11 +87,16 @@ def iterate_over_users(
                 email_download_format="metadata",
                 serviceName="gmail",
                 version="v1",
+                database_writer=writer,
+                replica_engine=replica_engine,
+                max_replica_staleness=max_replica_staleness,
+                quota_executor=QuotaExecutor(project_bucket=project_bucket),
             )
         except (RefreshError, HttpError):
             _ = [
-                update_task_status(
+                _update_task_status(
                     session=session,
+                    writer=writer,
                     user_id=user_database_id,
                     task_name=task_name,
                     status=JOB_STATUS_FAIL,
@@ -95,8 +108,9 @@ def iterate_over_users(
                 status_start = get_task_status_for_user(
                     session=session, user_id=user_database_id, task_name="update"
                 )
-                update_task_status(
+                _update_task_status(
                     session=session,
+                    writer=writer,
                     user_id=user_database_id,
                     task_name="update",
                     status=JOB_STATUS_PROGRESS,
@@ -111,21 +125,24 @@ def iterate_over_users(
                     max_workers=max_workers,
                 )
                 if status_start == JOB_STATUS_INIT:
-                    update_task_status(
+                    _update_task_status(
                         session=session,
+                        writer=writer,
                         user_id=user_database_id,
                         task_name="fetch",
                         status=JOB_STATUS_INIT,
                     )
-                update_task_status(
+                _update_task_status(
                     session=session,
+                    writer=writer,
                     user_id=user_database_id,
                     task_name="update",
                     status=JOB_STATUS_SUCCESS,
                 )
             elif filter_messages:
-                update_task_status(
+                _update_task_status(
                     session=session,
+                    writer=writer,
                     user_id=user_database_id,
                     task_name="fetch",
                     status=JOB_STATUS_PROGRESS,
@@ -136,15 +153,17 @@ def iterate_over_users(
                         recommendation_ratio=recommendation_ratio,
                     )
                 except HttpError:
-                    update_task_status(
+                    _update_task_status(
                         session=session,
+                        writer=writer,
                         user_id=user_database_id,
                         task_name="fetch",
                         status=JOB_STATUS_FAIL,
                     )
                 else:
-                    update_task_status(
+                    _update_task_status(
                         session=session,
+                        writer=writer,
                         user_id=user_database_id,
                         task_name="fetch",
                         status=JOB_STATUS_SUCCESS,
@@ -155,6 +174,27 @@ def iterate_over_users(
                 )
 
 
+def _update_task_status(
+    session: Session,
+    writer: BufferedWriter | None,
+    user_id: int,
+    task_name: str,
+    status: str,
+) -> None:
+    if writer is not None:
+        writer.put(
+            update_task_status,
+            user_id=user_id,
+            task_name=task_name,
+            status=status,
+            commit=False,
+        )
+    else:
+        update_task_status(
+            session=session, user_id=user_id, task_name=task_name, status=status
+        )
+
+
 def update(
     engine: Engine,
     client_secrets_config: dict[str, Any],
@@ -166,11 +206,23 @@ def update(
     include_deleted: bool = False,
     recommendation_ratio: float = 0.9,
     max_workers: int | None = None,
+    buffered_writes: bool = False,
+    replica_engine: Engine | None = None,
+    max_replica_staleness: float | None = None,
+    project_quota_units_per_second: float | None = None,
 ) -> None:
     session = sessionmaker(bind=engine)()
     job_dict, token_detail_dict = load_user_data_from_database(
         session=session, mode=mode
     )
+    writer = BufferedWriter(engine=engine) if buffered_writes else None
+    # The quota of the Google Cloud project is shared by all users and all daemon processes using this database.
+    if project_quota_units_per_second is not None:
+        project_bucket = SharedTokenBucket(
+            engine=engine, rate=project_quota_units_per_second
+        )
+    else:
+        project_bucket = None
     for k, lst in job_dict.items():
         if k == "fetch":
             filter_messages = True
@@ -194,4 +246,13 @@ def update(
             include_deleted=include_deleted,
             recommendation_ratio=recommendation_ratio,
             max_workers=max_workers,
+            writer=writer,
+            replica_engine=replica_engine,
+            max_replica_staleness=max_replica_staleness,
+            project_bucket=project_bucket,
         )
+        if writer is not None:
+            writer.flush()
+    if writer is not None:
+        writer.close()
+    session.close()
@@ -1,17 +1,30 @@
 import json
+from contextlib import AbstractContextManager
 from datetime import datetime
 from typing import Any
 
 import google.oauth2.credentials
 import googleapiclient.discovery
-from sqlalchemy import Column, DateTime, Engine, Integer, String, create_engine
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Engine,
+    Integer,
+    String,
+    bindparam,
+    create_engine,
+    select,
+)
 from sqlalchemy.orm import Session, declarative_base, sessionmaker
 
 from gmailsorter.base import get_email_database
 from gmailsorter.base.database import DatabaseInterface as EmailDatabaseInterface
+from gmailsorter.base.database import get_read_replica, session_scope
+from gmailsorter.base.writer import BufferedWriter
 from gmailsorter.google import GoogleMailBase
 from gmailsorter.google.database import DatabaseInterface as TokenDatabaseInterface
 from gmailsorter.google.database import get_token_database
+from gmailsorter.google.quota import QuotaExecutor
 from gmailsorter.ml import get_machine_learning_database
 from gmailsorter.ml.database import MachineLearningDatabase
 
@@ -72,6 +85,18 @@ class Task(Base):
     user_id = Column(Integer)
 
 
+# Pre-built statements for the task and token lookups, the compiled statements are cached by the engine.
+_SELECT_TASK = (
+    select(Task)
+    .where(Task.user_id == bindparam("user_id"))
+    .where(Task.task_name == bindparam("task_name"))
+    .limit(1)
+)
+_SELECT_TOKEN = (
+    select(GoogleToken).where(GoogleToken.user_id == bindparam("user_id")).limit(1)
+)
+
+
 class GoogleMail(GoogleMailBase):
     def __init__(
         self,
@@ -88,6 +113,10 @@ class GoogleMail(GoogleMailBase):
         email_download_format: str = "metadata",
         serviceName: str = "gmail",
         version: str = "v1",
+        database_writer: BufferedWriter | None = None,
+        replica_engine: Engine | None = None,
+        max_replica_staleness: float | None = None,
+        quota_executor: QuotaExecutor | None = None,
     ) -> None:
         """
         Gmail class to manage Emails via the Gmail API directly from Python
@@ -98,13 +127,20 @@ class GoogleMail(GoogleMailBase):
             db_user_id (int): Default 1 - set a user id when sharing a database with multiple users
             port (int): system communication port to start authentication webserver
             email_download_format (str): API response format [full, metadata]
+            database_writer (gmailsorter.base.writer.BufferedWriter): optional write-behind buffer for the email
+                                                                       database writes
+            replica_engine: optional SQLalchemy database engine of a read replica for the training queries
+            max_replica_staleness (float): maximum replication lag in seconds before falling back to the primary
+            quota_executor (gmailsorter.google.quota.QuotaExecutor): optional executor for the Gmail API requests
         """
         # Create config directory
         self._database_engine = database_engine
 
         # Initialize database
         database_email, database_ml, database_token = self._create_databases(
-            engine=database_engine
+            engine=database_engine,
+            replica_engine=replica_engine,
+            max_replica_staleness=max_replica_staleness,
         )
 
         # Initialise service
@@ -135,14 +171,29 @@ class GoogleMail(GoogleMailBase):
             user_id=user_id,
             db_user_id=db_user_id,
             email_download_format=email_download_format,
+            database_writer=database_writer,
+            quota_executor=quota_executor,
         )
 
     @property
     def session(self) -> Session:
+        if self._session is None:
+            self._session = self._session_factory()
         return self._session
 
+    def session_scope(self) -> AbstractContextManager[Session]:
+        """
+        Short-lived session for a unit of work, which is committed on success and rolled back on errors.
+
+        Returns:
+            sqlalchemy.orm.Session: session for the unit of work
+        """
+        return session_scope(session_factory=self._session_factory)
+
     def close_database_connection(self) -> None:
-        self._session.close()
+        if self._session is not None:
+            self._session.close()
+            self._session = None
 
     def create_filter_moving_all_labels(self, label_name: str) -> str:
         """
@@ -186,12 +237,11 @@ class GoogleMail(GoogleMailBase):
                     "removeLabelIds": ["INBOX", "SPAM"],
                 },
             }
-            result = (
-                self._service.users()
+            result = self._quota.execute(
+                request=self._service.users()
                 .settings()
                 .filters()
                 .create(userId="me", body=filter_content)
-                .execute()
             )
             return result["id"]
 
@@ -222,27 +272,29 @@ class GoogleMail(GoogleMailBase):
                 "messageListVisibility": message_list_visibility,
                 "name": label_name,
             }
-            result = (
-                self._service.users()
+            result = self._quota.execute(
+                request=self._service.users()
                 .labels()
                 .create(userId="me", body=label_request)
-                .execute()
             )
             self._label_dict = self._get_label_translate_dict()
             self._label_dict_inverse = {v: k for k, v in self._label_dict.items()}
             return result["id"]
 
     def get_filter_list(self) -> list[dict[str, Any]]:
-        results = self._service.users().settings().filters().list(userId="me").execute()
+        results = self._quota.execute(
+            request=self._service.users().settings().filters().list(userId="me")
+        )
         if "filter" in results:
             return results["filter"]
         else:
             return []
 
     def get_status_dict(self, label_name: str) -> dict[str, str | None]:
-        status_dict = get_tasks_status_for_user(
-            session=self._session, user_id=self._db_user_id
-        )
+        with self.session_scope() as session:
+            status_dict = get_tasks_status_for_user(
+                session=session, user_id=self._db_user_id
+            )
         label_id = self.create_label(
             label_name=label_name,
             label_list_visibility="labelHide",
@@ -263,12 +315,34 @@ class GoogleMail(GoogleMailBase):
         return status_dict
 
     def _create_databases(
-        self, engine: Engine
+        self,
+        engine: Engine,
+        replica_engine: Engine | None = None,
+        max_replica_staleness: float | None = None,
     ) -> tuple[EmailDatabaseInterface, MachineLearningDatabase, TokenDatabaseInterface]:
-        self._session = sessionmaker(bind=engine)()
-        db_email = get_email_database(engine=engine, session=self._session)
-        db_ml = get_machine_learning_database(engine=engine, session=self._session)
-        db_token = get_token_database(engine=engine, session=self._session)
+        self._session = None
+        self._session_factory = sessionmaker(bind=engine, expire_on_commit=False)
+        if replica_engine is not None:
+            read_replica = get_read_replica(
+                engine=engine,
+                replica_engine=replica_engine,
+                max_staleness=max_replica_staleness,
+            )
+        else:
+            read_replica = None
+        db_email = get_email_database(
+            engine=engine,
+            session_factory=self._session_factory,
+            read_replica=read_replica,
+        )
+        db_ml = get_machine_learning_database(
+            engine=engine,
+            session_factory=self._session_factory,
+            read_replica=read_replica,
+        )
+        db_token = get_token_database(
+            engine=engine, session_factory=self._session_factory
+        )
         return db_email, db_ml, db_token
 
 
@@ -278,15 +352,16 @@ def get_database_engine(connection_str: str) -> Engine:
     return engine
 
 
+def get_task(session: Session, user_id: int, task_name: str) -> Task | None:
+    return session.scalars(
+        _SELECT_TASK, {"user_id": user_id, "task_name": task_name}
+    ).first()
+
+
 def get_task_status_for_user(
     session: Session, user_id: int, task_name: str
 ) -> str | None:
-    status_obj = (
-        session.query(Task)
-        .filter(Task.user_id == user_id)
-        .filter(Task.task_name == task_name)
-        .first()
-    )
+    status_obj = get_task(session=session, user_id=user_id, task_name=task_name)
     if status_obj is not None:
         return status_obj.status
     else:
@@ -303,7 +378,7 @@ def get_tasks_status_for_user(session: Session, user_id: int) -> dict[str, str |
 
 
 def get_token(session: Session, user_id: int) -> GoogleToken | None:
-    return session.query(GoogleToken).filter_by(user_id=user_id).first()
+    return session.scalars(_SELECT_TOKEN, {"user_id": user_id}).first()
 
 
 def load_config_file(file_name: str) -> dict[str, Any]:
@@ -1,5 +1,6 @@
 from datetime import datetime
 
+from sqlalchemy import bindparam, select
 from sqlalchemy.orm import Session
 
 from gmailsorter.daemon.shared import (
@@ -7,16 +8,16 @@ from gmailsorter.daemon.shared import (
     JOB_STATUS_SUCCESS,
     JOB_STATUS_WAIT,
     Task,
+    get_task,
 )
 
+_SELECT_TASKS_BY_NAME = select(Task).where(Task.task_name == bindparam("task_name"))
+
 
 def create_tasks_for_new_users(session: Session, user_id: int) -> None:
     task_lst = []
-    task_update_from_database = (
-        session.query(Task)
-        .filter(Task.user_id == user_id)
-        .filter(Task.task_name == "update")
-        .first()
+    task_update_from_database = get_task(
+        session=session, user_id=user_id, task_name="update"
     )
     if task_update_from_database is None:
         task_lst.append(
@@ -27,11 +28,8 @@ def create_tasks_for_new_users(session: Session, user_id: int) -> None:
                 user_id=user_id,
             )
         )
-    task_fetch_from_database = (
-        session.query(Task)
-        .filter(Task.user_id == user_id)
-        .filter(Task.task_name == "fetch")
-        .first()
+    task_fetch_from_database = get_task(
+        session=session, user_id=user_id, task_name="fetch"
     )
     if task_fetch_from_database is None:
         task_lst.append(
@@ -48,17 +46,13 @@ def create_tasks_for_new_users(session: Session, user_id: int) -> None:
 
 
 def update_task_status(
-    session: Session, user_id: int, task_name: str, status: str
+    session: Session, user_id: int, task_name: str, status: str, commit: bool = True
 ) -> None:
-    task = (
-        session.query(Task)
-        .filter(Task.user_id == user_id)
-        .filter(Task.task_name == task_name)
-        .first()
-    )
+    task = get_task(session=session, user_id=user_id, task_name=task_name)
     task.status = status
     task.date = datetime.now()
-    session.commit()
+    if commit:
+        session.commit()
 
 
 def get_all_tasks_to_execute(
@@ -73,7 +67,7 @@ def get_all_tasks_to_execute(
         task_dict = {
             task_name: [
                 task.user_id
-                for task in session.query(Task).filter_by(task_name=task_name).all()
+                for task in _get_tasks_by_name(session=session, task_name=task_name)
                 if task.status in tasks_to_execute
             ]
         }
@@ -81,12 +75,12 @@ def get_all_tasks_to_execute(
         task_dict = {
             "update": [
                 task.user_id
-                for task in session.query(Task).filter_by(task_name="update").all()
+                for task in _get_tasks_by_name(session=session, task_name="update")
                 if task.status in tasks_to_execute
             ],
             "fetch": [
                 task.user_id
-                for task in session.query(Task).filter_by(task_name="fetch").all()
+                for task in _get_tasks_by_name(session=session, task_name="fetch")
                 if task.status in tasks_to_execute
             ],
         }
@@ -94,15 +88,19 @@ def get_all_tasks_to_execute(
         task_dict = {
             "update": [
                 task.user_id
-                for task in session.query(Task).filter_by(task_name="update").all()
+                for task in _get_tasks_by_name(session=session, task_name="update")
                 if task.status == JOB_STATUS_INIT
             ],
             "fetch": [
                 task.user_id
-                for task in session.query(Task).filter_by(task_name="fetch").all()
+                for task in _get_tasks_by_name(session=session, task_name="fetch")
                 if task.status in tasks_to_execute
             ],
         }
     else:
         task_dict = {}
     return {k: v for k, v in task_dict.items() if len(v) > 0}
+
+
+def _get_tasks_by_name(session: Session, task_name: str) -> list[Task]:
+    return list(session.scalars(_SELECT_TASKS_BY_NAME, {"task_name": task_name}))
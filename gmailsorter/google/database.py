@@ -1,8 +1,17 @@
 from typing import Any
 
 from google.oauth2.credentials import Credentials
-from sqlalchemy import Column, DateTime, Engine, Integer, String
-from sqlalchemy.orm import Session, declarative_base
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Engine,
+    Float,
+    Integer,
+    String,
+    bindparam,
+    select,
+)
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
 
 from gmailsorter.base.database import DatabaseTemplate
 
@@ -22,11 +31,20 @@ class GoogleToken(Base):
     user_id = Column(Integer)
 
 
-class DatabaseInterface(DatabaseTemplate):
-    @property
-    def session(self) -> Session:
-        return self._session
+class GoogleQuota(Base):
+    __tablename__ = "google_quota"
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True)
+    tokens = Column(Float)
+    updated = Column(Float)
+
 
+_SELECT_TOKEN = (
+    select(GoogleToken).where(GoogleToken.user_id == bindparam("user_id")).limit(1)
+)
+
+
+class DatabaseInterface(DatabaseTemplate):
     def update_token_with_dict(
         self, token: GoogleToken, credentials: Credentials, commit: bool = True
     ) -> None:
@@ -36,13 +54,15 @@ class DatabaseInterface(DatabaseTemplate):
         token.client_id = credentials.client_id
         token.client_secret = credentials.client_secret
         token.expiry = credentials.expiry
-        if token.id is None:
-            self._session.add(token)
-        if commit:
-            self._session.commit()
+        with self._session_scope(commit=commit) as session:
+            if token.id is None:
+                session.add(token)
+            elif token not in session:
+                session.merge(token)
 
     def get_token(self, user_id: int) -> GoogleToken:
-        token = self._session.query(GoogleToken).filter_by(user_id=user_id).first()
+        with self._session_scope(commit=False) as session:
+            token = session.scalars(_SELECT_TOKEN, {"user_id": user_id}).first()
         if token is None:
             return GoogleToken(user_id=user_id)
         else:
@@ -61,6 +81,10 @@ class DatabaseInterface(DatabaseTemplate):
         }
 
 
-def get_token_database(engine: Engine, session: Session) -> DatabaseInterface:
+def get_token_database(
+    engine: Engine,
+    session: Session | None = None,
+    session_factory: sessionmaker | None = None,
+) -> DatabaseInterface:
     Base.metadata.create_all(engine)
-    return DatabaseInterface(session=session)
+    return DatabaseInterface(session=session, session_factory=session_factory)
@@ -1,16 +1,28 @@
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from http import HTTPStatus
+from itertools import islice, pairwise
 from typing import Any
 
 import pandas
 from googleapiclient.discovery import Resource
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from tqdm import tqdm
 
 from gmailsorter.base import get_email_database
 from gmailsorter.base.database import DatabaseInterface as EmailDatabaseInterface
+from gmailsorter.base.database import get_read_replica
+from gmailsorter.base.message import PROFILE_FULL, PROFILE_METADATA, EmailRecordBuilder
+from gmailsorter.base.writer import BufferedWriter
 from gmailsorter.google.database import DatabaseInterface as TokenDatabaseInterface
 from gmailsorter.google.database import get_token_database
-from gmailsorter.google.message import get_email_dict
+from gmailsorter.google.message import get_email_records, get_email_values
+from gmailsorter.google.quota import QuotaExecutor
 from gmailsorter.ml import (
     encode_df_for_machine_learning,
     fit_machine_learning_models,
@@ -22,9 +34,41 @@ from gmailsorter.ml.database import MachineLearningDatabase
 _DatabaseTriple = tuple[
     EmailDatabaseInterface, MachineLearningDatabase, TokenDatabaseInterface
 ]
+# Number of downloaded messages sent to the process pool at once, when parse_workers is set.
+_PARSE_CHUNK_SIZE = 100
+# Maximum number of requests in one HTTP batch request of the Gmail API
+_MAX_BATCH_SIZE = 100
+# Maximum number of email IDs in one users.messages.batchModify request
+_MAX_BATCH_MODIFY_SIZE = 1000
+# Response field mask for the label refresh of known emails
+_LABEL_FIELDS = "id,labelIds"
+_HISTORY_TYPES = ["messageAdded", "messageDeleted", "labelAdded", "labelRemoved"]
+# Response field mask for users.messages.list, only the email IDs and thread IDs are used
+_LIST_FIELDS = "messages(id,threadId),nextPageToken"
+# Maximum number of email IDs in one page of users.messages.list
+_MAX_LIST_RESULTS = 500
+_LIST_PARTITION_LST = ["label", "date"]
+# The date partitions of the mailbox listing cover one year each, starting with the launch of Gmail.
+_LIST_PARTITION_FIRST_YEAR = 2004
 
 
 class GoogleMailBase:
+    # Named fetch profiles for users.messages.get, one for each API response format. A profile defines the requested
+    # headers of the metadata format and the response field mask, so only the fields used to build the email records
+    # are transferred. The responses are gzip-encoded by the googleapiclient request model.
+    fetch_profile_dict: dict[str, dict[str, Any]] = {
+        "metadata": {
+            "metadata_headers": ["From", "To", "Cc", "Subject", "Date"],
+            "fields": "id,threadId,labelIds,payload/headers",
+        },
+        "full": {
+            "metadata_headers": [],
+            "fields": "id,threadId,labelIds,payload(mimeType,headers,body/data,parts)",
+        },
+        "raw": {"metadata_headers": [], "fields": "id,threadId,labelIds,raw"},
+        "minimal": {"metadata_headers": [], "fields": _LABEL_FIELDS},
+    }
+
     def __init__(
         self,
         google_mail_service: Resource,
@@ -34,6 +78,11 @@ class GoogleMailBase:
         user_id: str = "me",
         db_user_id: int = 1,
         email_download_format: str = "metadata",
+        database_writer: BufferedWriter | None = None,
+        parse_workers: int | None = None,
+        download_batch_size: int = 50,
+        list_partition: str | None = None,
+        quota_executor: QuotaExecutor | None = None,
     ) -> None:
         """
         Gmail class to manage Emails via the Gmail API directly from Python
@@ -45,15 +94,43 @@ class GoogleMailBase:
             database_token (gmailsorter.google.database.DatabaseInterface): SQLalchemy interface for google database
             user_id (str): in most cases this should be simply "me"
             db_user_id (int): Default 1 - set a user id when sharing a database with multiple users
-            email_download_format (str): API response format [full, metadata]
+            email_download_format (str): API response format [full, metadata, raw]
+            database_writer (gmailsorter.base.writer.BufferedWriter): optional write-behind buffer for the email
+                                                                       database writes
+            parse_workers (int/None): number of processes to parse the downloaded messages - by default the messages
+                                      are parsed on the download thread
+            download_batch_size (int): number of messages downloaded per HTTP batch request, at most 100 - set to 1
+                                       to download the messages one by one
+            list_partition (str/None): partition the listing of the mailbox [label, date] - the partitions are listed
+                                       concurrently in HTTP batch requests, by default the listing is sequential
+            quota_executor (gmailsorter.google.quota.QuotaExecutor/None): executor for the Gmail API requests, which
+                                                                          limits the requests to the per user quota
         """
+        if not 1 <= download_batch_size <= _MAX_BATCH_SIZE:
+            raise ValueError(
+                "The download_batch_size has to be between 1 and "
+                + str(_MAX_BATCH_SIZE)
+                + "."
+            )
+        if list_partition is not None and list_partition not in _LIST_PARTITION_LST:
+            raise ValueError(
+                "The list_partition has to be one of "
+                + ", ".join(_LIST_PARTITION_LST)
+                + "."
+            )
         self._service = google_mail_service
         self._db_email = database_email
+        self._db_writer = database_writer
         self._db_ml = database_ml
         self._db_token = database_token
         self._db_user_id = db_user_id
         self._userid = user_id
         self._email_download_format = email_download_format
+        self._parse_workers = parse_workers
+        self._download_batch_size = download_batch_size
+        self._list_partition = list_partition
+        self._quota = quota_executor if quota_executor is not None else QuotaExecutor()
+        self._fetch_statistics_dict: dict[str, list[int]] = {}
         self._label_dict = self._get_label_translate_dict()
         self._label_dict_inverse = {v: k for k, v in self._label_dict.items()}
 
@@ -61,6 +138,27 @@ class GoogleMailBase:
     def labels(self) -> list[str]:
         return list(self._label_dict.keys())
 
+    def get_fetch_statistics(self) -> dict[str, dict[str, float]]:
+        """
+        Get the number of downloaded messages and the size of the decoded API responses for each fetch profile. The
+        responses are gzip compressed on the wire, so the transferred bytes are smaller than the decoded payload size.
+
+        Returns:
+            dict: dictionary with the number of messages, the decoded payload bytes and the decoded payload bytes per
+                  message for each fetch profile
+        """
+        return {
+            profile: {
+                "messages": number_of_messages,
+                "decoded_bytes": number_of_bytes,
+                "decoded_bytes_per_message": number_of_bytes / number_of_messages,
+            }
+            for profile, (
+                number_of_messages,
+                number_of_bytes,
+            ) in self._fetch_statistics_dict.items()
+        }
+
     def download_emails_for_label(self, label: str) -> pandas.DataFrame:
         """
         Download emails for a specific label
@@ -134,7 +232,13 @@ class GoogleMailBase:
         """
         df_all = self.get_all_emails_in_database(include_deleted=include_deleted)
         df_all_features, df_all_labels = encode_df_for_machine_learning(
-            df=df_all, feature_lst=[], label_lst=[], return_labels=True
+            df=df_all,
+            feature_lst=[],
+            label_lst=[],
+            return_labels=True,
+            vocabulary=self._db_email.get_feature_vocabulary(
+                include_deleted=include_deleted, user_id=self._db_user_id
+            ),
         )
         df_all_features = df_all_features.loc[
             :, ~df_all_features.columns.duplicated()
@@ -181,40 +285,192 @@ class GoogleMailBase:
         email_format: str | None = None,
     ) -> None:
         """
-        Update local email database
+        Update local email database. After the first synchronisation of the whole mailbox, only the changes since the
+        last update are requested from the Gmail history, unless the history ID has expired.
 
         Args:
-            quick (boolean): Only add new emails, do not update existing labels - by default: False
-            label_lst (list): list of labels to be searched
+            quick (boolean): Only add new emails, do not update existing labels - by default: False. The incremental
+                             update always applies the label changes and deletions of the Gmail history, as they
+                             are part of the history and the history ID is advanced past them.
+            label_lst (list): list of labels to be searched, the update is always a full synchronisation when labels
+                              are selected
             email_format (str/None): Email format to download
         """
         if label_lst is None:
             label_lst = []
         if self._db_email is not None:
-            message_id_lst = self._search_email_on_server(
-                label_lst=label_lst, only_message_ids=True
+            history_id = None
+            if len(label_lst) == 0:
+                start_history_id = self._db_email.get_history_id(
+                    user_id=self._db_user_id
+                )
+                if start_history_id is not None:
+                    history_id = self._update_database_from_history(
+                        start_history_id=start_history_id,
+                        email_format=email_format,
+                    )
+                if history_id is None:
+                    # Changes during the full synchronisation are replayed by the next incremental update.
+                    history_id = self._get_history_id()
+                    self._update_database_from_mailbox(
+                        quick=quick, label_lst=label_lst, email_format=email_format
+                    )
+            else:
+                self._update_database_from_mailbox(
+                    quick=quick, label_lst=label_lst, email_format=email_format
+                )
+            if self._db_writer is not None:
+                # The training reads the database afterwards, so the buffered writes have to be visible.
+                self._db_writer.flush()
+            if history_id is not None:
+                self._db_email.update_history_id(
+                    history_id=history_id, user_id=self._db_user_id
+                )
+
+    def _update_database_from_mailbox(
+        self,
+        quick: bool = False,
+        label_lst: list[str] | None = None,
+        email_format: str | None = None,
+    ) -> None:
+        message_id_lst = self._search_email_on_server(
+            label_lst=label_lst, only_message_ids=True
+        )
+        (
+            new_messages_lst,
+            message_label_updates_lst,
+            deleted_messages_lst,
+        ) = self._db_email.get_labels_to_update(
+            message_id_lst=message_id_lst, user_id=self._db_user_id
+        )
+        database_write = (
+            self._db_writer if self._db_writer is not None else self._db_email
+        )
+        if not quick:
+            database_write.mark_emails_as_deleted(
+                message_id_lst=deleted_messages_lst, user_id=self._db_user_id
             )
-            (
-                new_messages_lst,
-                message_label_updates_lst,
-                deleted_messages_lst,
-            ) = self._db_email.get_labels_to_update(
-                message_id_lst=message_id_lst, user_id=self._db_user_id
+            database_write.update_labels(
+                message_id_lst=message_label_updates_lst,
+                message_meta_lst=self._get_labels_for_emails(
+                    message_id_lst=message_label_updates_lst
+                ),
+                user_id=self._db_user_id,
             )
-            if not quick:
-                self._db_email.mark_emails_as_deleted(
-                    message_id_lst=deleted_messages_lst, user_id=self._db_user_id
-                )
-                self._db_email.update_labels(
-                    message_id_lst=message_label_updates_lst,
-                    message_meta_lst=self._get_labels_for_emails(
-                        message_id_lst=message_label_updates_lst
-                    ),
-                    user_id=self._db_user_id,
+        self._store_emails_in_database(
+            message_id_lst=new_messages_lst, email_format=email_format
+        )
+
+    def _update_database_from_history(
+        self,
+        start_history_id: str,
+        email_format: str | None = None,
+    ) -> str | None:
+        """
+        Apply the changes recorded in the Gmail history since start_history_id to the local database. Emails in the
+        trash or the spam folder are treated as deleted, like in the full synchronisation which does not list them.
+        The label changes and deletions are always applied, otherwise they would be lost once the history ID of the
+        database is advanced.
+
+        Args:
+            start_history_id (str): history ID of the last synchronisation
+            email_format (str/None): Email format to download
+
+        Returns:
+            str: history ID of the mailbox after the update or None if the start_history_id has expired
+        """
+        try:
+            history_lst, history_id = self._get_history(
+                start_history_id=start_history_id
+            )
+        except HttpError as e:
+            if e.resp.status == HTTPStatus.NOT_FOUND:
+                return None
+            raise
+        label_update_dict: dict[str, list[str]] = {}
+        added_message_lst: list[str] = []
+        deleted_message_set = set()
+        for history in history_lst:
+            for message_added in history.get("messagesAdded", []):
+                message = message_added["message"]
+                added_message_lst.append(message["id"])
+                label_update_dict[message["id"]] = message.get("labelIds", [])
+            for message_deleted in history.get("messagesDeleted", []):
+                deleted_message_set.add(message_deleted["message"]["id"])
+            for key in ["labelsAdded", "labelsRemoved"]:
+                for label_change in history.get(key, []):
+                    message = label_change["message"]
+                    label_update_dict[message["id"]] = message.get("labelIds", [])
+        for message_id, label_id_lst in label_update_dict.items():
+            if "TRASH" in label_id_lst or "SPAM" in label_id_lst:
+                deleted_message_set.add(message_id)
+        email_in_db_id = set(self._db_email.list_email_ids(user_id=self._db_user_id))
+        new_messages_lst = list(
+            dict.fromkeys(
+                message_id
+                for message_id in added_message_lst
+                if message_id not in email_in_db_id
+                and message_id not in deleted_message_set
+            )
+        )
+        database_write = (
+            self._db_writer if self._db_writer is not None else self._db_email
+        )
+        database_write.mark_emails_as_deleted(
+            message_id_lst=[m for m in deleted_message_set if m in email_in_db_id],
+            user_id=self._db_user_id,
+        )
+        message_label_updates_lst = [
+            message_id
+            for message_id in label_update_dict
+            if message_id in email_in_db_id and message_id not in deleted_message_set
+        ]
+        database_write.update_labels(
+            message_id_lst=message_label_updates_lst,
+            message_meta_lst=[
+                label_update_dict[message_id]
+                for message_id in message_label_updates_lst
+            ],
+            user_id=self._db_user_id,
+        )
+        self._store_emails_in_database(
+            message_id_lst=new_messages_lst, email_format=email_format
+        )
+        return history_id
+
+    def _get_history(self, start_history_id: str) -> tuple[list[dict[str, Any]], str]:
+        """
+        Get all history records since start_history_id with users.history.list
+
+        Args:
+            start_history_id (str): history ID to start from
+
+        Returns:
+            list, str: list of history records and the current history ID of the mailbox
+        """
+        history_lst: list[dict[str, Any]] = []
+        next_page_token = None
+        while True:
+            response = self._quota.execute(
+                request=self._service.users()
+                .history()
+                .list(
+                    userId=self._userid,
+                    startHistoryId=start_history_id,
+                    historyTypes=_HISTORY_TYPES,
+                    maxResults=500,
+                    pageToken=next_page_token,
                 )
-            self._store_emails_in_database(
-                message_id_lst=new_messages_lst, email_format=email_format
             )
+            history_lst.extend(response.get("history", []))
+            next_page_token = response.get("nextPageToken")
+            if not next_page_token:
+                return history_lst, response.get("historyId", start_history_id)
+
+    def _get_history_id(self) -> str:
+        return self._quota.execute(
+            request=self._service.users().getProfile(userId=self._userid)
+        )["historyId"]
 
     def _download_messages_to_dataframe(
         self, message_id_lst: list[str], email_format: str | None = None
@@ -229,24 +485,60 @@ class GoogleMailBase:
         Returns:
             pandas.DataFrame: pandas.DataFrame which contains the rendered emails
         """
-        return pandas.DataFrame(
-            [
-                message
-                for message in [
-                    get_email_dict(
-                        message=self._get_message_detail(
-                            message_id=message_id,
-                            email_format=email_format,
-                            metadata_headers=[],
-                        )
-                    )
-                    for message_id in tqdm(
-                        iterable=message_id_lst, desc="Download messages to DataFrame"
-                    )
-                ]
-                if message is not None
-            ]
+        if email_format is None:
+            email_format = self._email_download_format
+        # Without the email body in the API response there is nothing to decode, so only the headers are parsed.
+        profile = PROFILE_METADATA if email_format == "metadata" else PROFILE_FULL
+        message_iterator = iter(
+            tqdm(
+                iterable=self._get_message_details(
+                    message_id_lst=message_id_lst,
+                    email_format=email_format,
+                ),
+                total=len(message_id_lst),
+                desc="Download messages to DataFrame",
+            )
         )
+        if self._parse_workers is None:
+            records = EmailRecordBuilder()
+            for message in message_iterator:
+                values = get_email_values(message=message, profile=profile)
+                if values is not None:
+                    records.append(values=values)
+        else:
+            records = self._parse_messages_in_process_pool(
+                message_iterator=message_iterator, profile=profile
+            )
+        return records.to_dataframe()
+
+    def _parse_messages_in_process_pool(
+        self, message_iterator: Iterator[dict[str, Any]], profile: str
+    ) -> EmailRecordBuilder:
+        """
+        Parse the downloaded messages in a process pool, the messages are sent in chunks while the download continues.
+
+        Args:
+            message_iterator (iterator): iterator over the Gmail API messages
+            profile (str): parsing profile [full, metadata]
+
+        Returns:
+            EmailRecordBuilder: email records in the order of the messages
+        """
+        records = EmailRecordBuilder()
+        with ProcessPoolExecutor(max_workers=self._parse_workers) as exe:
+            future_lst = []
+            while True:
+                message_lst = list(islice(message_iterator, _PARSE_CHUNK_SIZE))
+                if len(message_lst) == 0:
+                    break
+                future_lst.append(
+                    exe.submit(
+                        get_email_records, message_lst=message_lst, profile=profile
+                    )
+                )
+            for future in future_lst:
+                records.extend(other=future.result())
+        return records
 
     def _get_labels_for_email(self, message_id: str) -> list[str]:
         """
@@ -260,8 +552,8 @@ class GoogleMailBase:
         """
         message_dict = self._get_message_detail(
             message_id=message_id,
-            email_format="metadata",
-            metadata_headers=["labelIds"],
+            email_format="minimal",
+            fields=_LABEL_FIELDS,
         )
         if "labelIds" in message_dict:
             return message_dict["labelIds"]
@@ -270,7 +562,8 @@ class GoogleMailBase:
 
     def _get_labels_for_emails(self, message_id_lst: list[str]) -> list[list[str]]:
         """
-        Get labels for a list of emails
+        Get labels for a list of emails, the labels are requested in the minimal format with a response field mask in
+        HTTP batch requests.
 
         Args:
             message_id_lst (list): list of emails IDs
@@ -279,14 +572,22 @@ class GoogleMailBase:
             list: Nested list of email labels for each email
         """
         return [
-            self._get_labels_for_email(message_id=message_id)
-            for message_id in tqdm(
-                iterable=message_id_lst, desc="Get labels for emails"
+            message_dict.get("labelIds", [])
+            for message_dict in tqdm(
+                iterable=self._get_message_details(
+                    message_id_lst=message_id_lst,
+                    email_format="minimal",
+                    fields=_LABEL_FIELDS,
+                ),
+                total=len(message_id_lst),
+                desc="Get labels for emails",
             )
         ]
 
     def _get_label_translate_dict(self) -> dict[str, str]:
-        results = self._service.users().labels().list(userId=self._userid).execute()
+        results = self._quota.execute(
+            request=self._service.users().labels().list(userId=self._userid)
+        )
         labels = results.get("labels", [])
         return {label["name"]: label["id"] for label in labels}
 
@@ -295,6 +596,7 @@ class GoogleMailBase:
         message_id: str,
         email_format: str | None = None,
         metadata_headers: list[str] | None = None,
+        fields: str | None = None,
     ) -> dict[str, Any]:
         """
         Get details of a specific email message based on its email ID
@@ -302,16 +604,112 @@ class GoogleMailBase:
         Args:
             message_id (str): email IDs used by Google Mail to uniquely identify emails
             email_format (str/None): API response format [raw, minimal, full, metadata]
-            metadata_headers (list): list of meta data headers
+            metadata_headers (list/None): list of meta data headers - by default defined by the fetch profile
+            fields (str/None): response field mask e.g. "id,labelIds" - by default defined by the fetch profile
 
         Returns:
             dict: details of the email as python dictionary
         """
+        return self._quota.execute(
+            request=self._get_message_request(
+                message_id=message_id,
+                email_format=email_format,
+                metadata_headers=metadata_headers,
+                fields=fields,
+            )
+        )
+
+    def _get_message_details(
+        self,
+        message_id_lst: list[str],
+        email_format: str | None = None,
+        metadata_headers: list[str] | None = None,
+        fields: str | None = None,
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Get the details of a list of email messages, the messages are downloaded in HTTP batch requests of
+        download_batch_size messages. The batch size is reduced while the requests are throttled. Messages which fail
+        in the batch request are downloaded again individually.
+
+        Args:
+            message_id_lst (list): list of email IDs
+            email_format (str/None): API response format [raw, minimal, full, metadata]
+            metadata_headers (list/None): list of meta data headers - by default defined by the fetch profile
+            fields (str/None): response field mask e.g. "id,labelIds" - by default defined by the fetch profile
+
+        Returns:
+            iterator: details of the emails as python dictionaries in the order of the email IDs
+        """
+        if self._download_batch_size == 1:
+            for message_id in message_id_lst:
+                yield self._get_message_detail(
+                    message_id=message_id,
+                    email_format=email_format,
+                    metadata_headers=metadata_headers,
+                    fields=fields,
+                )
+            return
+        i = 0
+        while i < len(message_id_lst):
+            batch_size = self._quota.get_batch_size(
+                max_batch_size=self._download_batch_size
+            )
+            message_id_batch_lst = message_id_lst[i : i + batch_size]
+            i += batch_size
+            response_dict: dict[str, dict[str, Any]] = {}
+
+            def callback(
+                request_id: str,
+                response: dict[str, Any],
+                exception: Exception | None,
+                response_dict: dict[str, dict[str, Any]] = response_dict,
+            ) -> None:
+                self._quota.record_result(exception=exception)
+                if exception is None:
+                    response_dict[request_id] = response
+
+            batch = self._service.new_batch_http_request(callback=callback)
+            request_lst = [
+                self._get_message_request(
+                    message_id=message_id,
+                    email_format=email_format,
+                    metadata_headers=metadata_headers,
+                    fields=fields,
+                )
+                for message_id in message_id_batch_lst
+            ]
+            for j, request in enumerate(request_lst):
+                batch.add(request, request_id=str(j))
+            self._quota.execute_batch(batch=batch, request_lst=request_lst)
+            for j, message_id in enumerate(message_id_batch_lst):
+                if str(j) in response_dict:
+                    yield response_dict[str(j)]
+                else:
+                    yield self._get_message_detail(
+                        message_id=message_id,
+                        email_format=email_format,
+                        metadata_headers=metadata_headers,
+                        fields=fields,
+                    )
+
+    def _get_message_request(
+        self,
+        message_id: str,
+        email_format: str | None = None,
+        metadata_headers: list[str] | None = None,
+        fields: str | None = None,
+    ) -> HttpRequest:
         if email_format is None:
             email_format = self._email_download_format
+        fetch_profile = self.fetch_profile_dict.get(email_format, {})
         if metadata_headers is None:
-            metadata_headers = []
-        return (
+            metadata_headers = fetch_profile.get("metadata_headers", [])
+        if fields is None:
+            fields = fetch_profile.get("fields")
+        parameter_dict: dict[str, Any] = {}
+        if fields is not None:
+            parameter_dict["fields"] = fields
+        request = (
             self._service.users()
             .messages()
             .get(
@@ -319,17 +717,32 @@ class GoogleMailBase:
                 id=message_id,
                 format=email_format,
                 metadataHeaders=metadata_headers,
+                **parameter_dict,
             )
-            .execute()
         )
+        request.postproc = partial(
+            self._count_decoded_payload_bytes,
+            profile=email_format,
+            postproc=request.postproc,
+        )
+        return request
 
-    def _get_messages_page(
+    def _count_decoded_payload_bytes(
+        self, resp: Any, content: bytes, profile: str, postproc: Any
+    ) -> Any:
+        # The content is already decoded, so the gzip compression is not included in the byte count.
+        statistics = self._fetch_statistics_dict.setdefault(profile, [0, 0])
+        statistics[0] += 1
+        statistics[1] += len(content)
+        return postproc(resp, content)
+
+    def _get_messages_request(
         self,
         label_ids: list[str],
         query_string: str,
         next_page_token: str | None = None,
-    ) -> list[Any]:
-        message_list_response = (
+    ) -> HttpRequest:
+        return (
             self._service.users()
             .messages()
             .list(
@@ -337,8 +750,23 @@ class GoogleMailBase:
                 labelIds=label_ids,
                 q=query_string,
                 pageToken=next_page_token,
+                maxResults=_MAX_LIST_RESULTS,
+                fields=_LIST_FIELDS,
+            )
+        )
+
+    def _get_messages_page(
+        self,
+        label_ids: list[str],
+        query_string: str,
+        next_page_token: str | None = None,
+    ) -> list[Any]:
+        message_list_response = self._quota.execute(
+            request=self._get_messages_request(
+                label_ids=label_ids,
+                query_string=query_string,
+                next_page_token=next_page_token,
             )
-            .execute()
         )
 
         return [
@@ -365,6 +793,121 @@ class GoogleMailBase:
 
         return message_items_lst
 
+    def _get_messages_partitioned(
+        self, partition_lst: list[tuple[list[str], str]]
+    ) -> list[dict[str, Any]]:
+        """
+        List the messages of multiple partitions of the mailbox. In every round the next page of all unfinished
+        partitions is requested in HTTP batch requests, so the number of round-trips is given by the largest partition
+        rather than the size of the mailbox. Pages which fail in the batch request are requested again individually.
+
+        Args:
+            partition_lst (list): list of tuples of label IDs and query string, one for each partition
+
+        Returns:
+            list: messages of all partitions, messages listed in multiple partitions are only included once
+        """
+        message_items_lst: list[list[dict[str, Any]]] = [[] for _ in partition_lst]
+        next_page_token_dict: dict[int, str | None] = dict.fromkeys(
+            range(len(partition_lst))
+        )
+        while len(next_page_token_dict) > 0:
+            pending_lst = list(next_page_token_dict.items())
+            batch_size = self._quota.get_batch_size(max_batch_size=_MAX_BATCH_SIZE)
+            for i in range(0, len(pending_lst), batch_size):
+                pending_batch_lst = pending_lst[i : i + batch_size]
+                response_dict: dict[str, dict[str, Any]] = {}
+
+                def callback(
+                    request_id: str,
+                    response: dict[str, Any],
+                    exception: Exception | None,
+                    response_dict: dict[str, dict[str, Any]] = response_dict,
+                ) -> None:
+                    self._quota.record_result(exception=exception)
+                    if exception is None:
+                        response_dict[request_id] = response
+
+                batch = self._service.new_batch_http_request(callback=callback)
+                request_lst = []
+                for partition_id, next_page_token in pending_batch_lst:
+                    label_ids, query_string = partition_lst[partition_id]
+                    request_lst.append(
+                        self._get_messages_request(
+                            label_ids=label_ids,
+                            query_string=query_string,
+                            next_page_token=next_page_token,
+                        )
+                    )
+                    batch.add(request_lst[-1], request_id=str(partition_id))
+                self._quota.execute_batch(batch=batch, request_lst=request_lst)
+                for partition_id, next_page_token in pending_batch_lst:
+                    if str(partition_id) in response_dict:
+                        response = response_dict[str(partition_id)]
+                        message_items = response.get("messages", [])
+                        next_page_token_new = response.get("nextPageToken")
+                    else:
+                        label_ids, query_string = partition_lst[partition_id]
+                        message_items, next_page_token_new = self._get_messages_page(
+                            label_ids=label_ids,
+                            query_string=query_string,
+                            next_page_token=next_page_token,
+                        )
+                    message_items_lst[partition_id].extend(message_items)
+                    if next_page_token_new:
+                        next_page_token_dict[partition_id] = next_page_token_new
+                    else:
+                        del next_page_token_dict[partition_id]
+        return list(
+            {
+                message["id"]: message
+                for message_items in message_items_lst
+                for message in message_items
+            }.values()
+        )
+
+    def _get_list_partitions(
+        self, label_ids: list[str], query_string: str
+    ) -> list[tuple[list[str], str]]:
+        """
+        Split the listing of the mailbox into partitions which together cover all messages of the listing. The label
+        partitions contain one partition for each label and one for the messages without user labels. When the listing
+        is already limited to labels, the date partitions are used, one partition for each year.
+
+        Args:
+            label_ids (list): list of label IDs the listing is limited to
+            query_string (str): query string of the listing
+
+        Returns:
+            list: list of tuples of label IDs and query string, one for each partition
+        """
+        if self._list_partition == "label" and len(label_ids) == 0:
+            # Like the listing without partitions, the listing by label does not include the spam and the trash.
+            return [
+                ([label_id], query_string)
+                for label_id in self._label_dict.values()
+                if label_id not in ["SPAM", "TRASH"]
+            ] + [([], _join_query(query_string, "has:nouserlabels"))]
+        year_boundary_lst = [
+            int(datetime(year, 1, 1, tzinfo=timezone.utc).timestamp())
+            for year in range(
+                _LIST_PARTITION_FIRST_YEAR, datetime.now(timezone.utc).year + 1
+            )
+        ]
+        # The date partitions overlap by one second, so no message is lost at the boundaries.
+        date_query_lst = (
+            ["before:" + str(year_boundary_lst[0])]
+            + [
+                "after:" + str(start - 1) + " before:" + str(end)
+                for start, end in pairwise(year_boundary_lst)
+            ]
+            + ["after:" + str(year_boundary_lst[-1] - 1)]
+        )
+        return [
+            (label_ids, _join_query(query_string, date_query))
+            for date_query in date_query_lst
+        ]
+
     def _modify_message_labels(
         self,
         message_id: str,
@@ -381,23 +924,109 @@ class GoogleMailBase:
         if len(label_id_add_lst) > 0:
             body_dict["addLabelIds"] = label_id_add_lst
         if len(body_dict) > 0:
-            self._service.users().messages().modify(
-                userId=self._userid, id=message_id, body=body_dict
-            ).execute()
+            self._quota.execute(
+                request=self._service.users()
+                .messages()
+                .modify(userId=self._userid, id=message_id, body=body_dict)
+            )
+
+    def _modify_messages_labels(
+        self,
+        message_id_lst: list[str],
+        label_id_remove_lst: list[str] | None = None,
+        label_id_add_lst: list[str] | None = None,
+    ) -> list[str]:
+        """
+        Modify the labels of multiple emails with users.messages.batchModify in chunks of up to 1000 emails. When a
+        chunk fails, the emails of this chunk are modified one by one.
+
+        Args:
+            message_id_lst (list): list of email IDs
+            label_id_remove_lst (list): list of label IDs to remove
+            label_id_add_lst (list): list of label IDs to add
+
+        Returns:
+            list: email IDs which could not be modified
+        """
+        if label_id_remove_lst is None:
+            label_id_remove_lst = []
+        if label_id_add_lst is None:
+            label_id_add_lst = []
+        body_dict: dict[str, list[str]] = {}
+        if len(label_id_remove_lst) > 0:
+            body_dict["removeLabelIds"] = label_id_remove_lst
+        if len(label_id_add_lst) > 0:
+            body_dict["addLabelIds"] = label_id_add_lst
+        failed_message_id_lst: list[str] = []
+        if len(body_dict) == 0:
+            return failed_message_id_lst
+        for i in range(0, len(message_id_lst), _MAX_BATCH_MODIFY_SIZE):
+            message_id_chunk_lst = message_id_lst[i : i + _MAX_BATCH_MODIFY_SIZE]
+            try:
+                self._quota.execute(
+                    request=self._service.users()
+                    .messages()
+                    .batchModify(
+                        userId=self._userid,
+                        body={"ids": message_id_chunk_lst, **body_dict},
+                    )
+                )
+            except HttpError as e:
+                print(
+                    "batchModify failed for "
+                    + str(len(message_id_chunk_lst))
+                    + " emails, modify them one by one:",
+                    str(e),
+                )
+                for message_id in message_id_chunk_lst:
+                    try:
+                        self._modify_message_labels(
+                            message_id=message_id,
+                            label_id_remove_lst=label_id_remove_lst,
+                            label_id_add_lst=label_id_add_lst,
+                        )
+                    except HttpError as e:
+                        print("modify failed for email " + message_id + ":", str(e))
+                        failed_message_id_lst.append(message_id)
+        return failed_message_id_lst
 
     def _move_emails(
         self, move_email_dict: dict[str, str | None], label_to_ignore: str
-    ) -> None:
+    ) -> dict[str, str]:
+        """
+        Move emails from the label label_to_ignore to the recommended labels.
+
+        Args:
+            move_email_dict (dict): recommended label ID for each email ID, None to keep the email
+            label_to_ignore (str): label the emails are currently assigned to
+
+        Returns:
+            dict: label ID for each email ID which was moved successfully
+        """
         label_existing = self._label_dict[label_to_ignore]
-        for message_id, label_add in tqdm(
-            iterable=move_email_dict.items(), desc="Move emails"
-        ):
+        move_label_dict: dict[str, list[str]] = {}
+        for message_id, label_add in move_email_dict.items():
             if label_add is not None and label_add != label_existing:
-                self._modify_message_labels(
-                    message_id=message_id,
+                move_label_dict.setdefault(label_add, []).append(message_id)
+        moved_email_dict: dict[str, str] = {}
+        for label_add, message_id_lst in tqdm(
+            iterable=move_label_dict.items(), desc="Move emails"
+        ):
+            failed_message_id_set = set(
+                self._modify_messages_labels(
+                    message_id_lst=message_id_lst,
                     label_id_remove_lst=[label_existing],
                     label_id_add_lst=[label_add],
                 )
+            )
+            moved_email_dict.update(
+                {
+                    message_id: label_add
+                    for message_id in message_id_lst
+                    if message_id not in failed_message_id_set
+                }
+            )
+        return moved_email_dict
 
     def _search_email_on_server(
         self,
@@ -419,9 +1048,16 @@ class GoogleMailBase:
         if label_lst is None:
             label_lst = []
         label_ids = [self._label_dict[label] for label in label_lst]
-        message_id_lst = self._get_messages(
-            query_string=query_string, label_ids=label_ids
-        )
+        if self._list_partition is None:
+            message_id_lst = self._get_messages(
+                query_string=query_string, label_ids=label_ids
+            )
+        else:
+            message_id_lst = self._get_messages_partitioned(
+                partition_lst=self._get_list_partitions(
+                    label_ids=label_ids, query_string=query_string
+                )
+            )
         if not only_message_ids:
             return message_id_lst
         else:
@@ -433,18 +1069,43 @@ class GoogleMailBase:
         df = self._download_messages_to_dataframe(
             message_id_lst=message_id_lst, email_format=email_format
         )
-        if len(df) > 0:
+        if len(df) > 0 and self._db_writer is not None:
+            self._db_writer.store_dataframe(df=df, user_id=self._db_user_id)
+        elif len(df) > 0:
             self._db_email.store_dataframe(df=df, user_id=self._db_user_id)
 
     @staticmethod
-    def _create_databases(connection_str: str) -> _DatabaseTriple:
+    def _create_databases(
+        connection_str: str,
+        replica_connection_str: str | None = None,
+        max_replica_staleness: float | None = None,
+    ) -> _DatabaseTriple:
         engine = create_engine(connection_str)
-        session = sessionmaker(bind=engine)()
-        db_email = get_email_database(engine=engine, session=session)
-        db_ml = get_machine_learning_database(engine=engine, session=session)
-        db_token = get_token_database(engine=engine, session=session)
+        session_factory = sessionmaker(bind=engine, expire_on_commit=False)
+        if replica_connection_str is not None:
+            read_replica = get_read_replica(
+                engine=engine,
+                replica_engine=create_engine(replica_connection_str),
+                max_staleness=max_replica_staleness,
+            )
+        else:
+            read_replica = None
+        db_email = get_email_database(
+            engine=engine, session_factory=session_factory, read_replica=read_replica
+        )
+        db_ml = get_machine_learning_database(
+            engine=engine, session_factory=session_factory, read_replica=read_replica
+        )
+        db_token = get_token_database(engine=engine, session_factory=session_factory)
         return db_email, db_ml, db_token
 
     @staticmethod
     def _get_message_ids(message_lst: list[dict[str, Any]]) -> list[str]:
         return [d["id"] for d in message_lst]
+
+
+def _join_query(query_string: str, partition_query: str) -> str:
+    if len(query_string) > 0:
+        return query_string + " " + partition_query
+    else:
+        return partition_query
@@ -1,10 +1,61 @@
 import base64
+import html as html_lib
+import re
+from abc import abstractmethod
+from collections.abc import Callable
 from datetime import datetime
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesParser
+from functools import wraps
 from html.parser import HTMLParser
 from io import StringIO
 from typing import Any
 
-from gmailsorter.base.message import AbstractMessage, email_date_converter
+from gmailsorter.base.message import (
+    EMAIL_COLUMN_LST,
+    PROFILE_FULL,
+    AbstractMessage,
+    EmailRecordBuilder,
+    email_date_converter,
+    email_date_converter_batch,
+    split_email_addresses,
+)
+
+MAX_HTML_LENGTH = 1000000
+MAX_TEXT_LENGTH = 100000
+
+# Matches comments, script and style elements including their content and all other tags. Like HTMLParser a "<" which
+# is not followed by a letter, "/", "!" or "?" is text. Unclosed comments, scripts and styles extend to the end.
+_HTML_MARKUP_RE = re.compile(
+    r"<!--.*?(?:-->|$)|<(script|style)\b.*?(?:</\1\s*>|$)|<[a-zA-Z/!?][^>]*>",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def html_to_text(
+    html: str,
+    max_html_length: int = MAX_HTML_LENGTH,
+    max_text_length: int = MAX_TEXT_LENGTH,
+) -> str:
+    """
+    Extract the text of an HTML document. Comments as well as the content of script and style elements are skipped.
+
+    Args:
+        html (str): HTML document
+        max_html_length (int): only the first max_html_length characters of the document are processed
+        max_text_length (int): maximum length of the returned text
+
+    Returns:
+        str: text of the HTML document
+    """
+    if len(html) > max_html_length:
+        html = html[:max_html_length]
+        # Drop a tag which was cut in half, otherwise its attributes would end up in the text.
+        tag_start = html.rfind("<")
+        if tag_start > html.rfind(">"):
+            html = html[:tag_start]
+    return html_lib.unescape(_HTML_MARKUP_RE.sub("", html))[:max_text_length]
 
 
 # https://stackoverflow.com/questions/753052/strip-html-from-strings-in-python
@@ -23,35 +74,144 @@ class MLStripper(HTMLParser):
         return self.text.getvalue()
 
 
-def get_email_dict(message: dict[str, Any]) -> dict[str, Any] | None:
+def get_email_dict(
+    message: dict[str, Any], profile: str = PROFILE_FULL
+) -> dict[str, Any] | None:
+    values = get_email_values(message=message, profile=profile)
+    if values is None:
+        return None
+    else:
+        return dict(zip(EMAIL_COLUMN_LST, values, strict=True))
+
+
+def get_email_values(
+    message: dict[str, Any], profile: str = PROFILE_FULL
+) -> tuple[Any, ...] | None:
+    """
+    Parse a Gmail API message to a tuple of field values in the order of EMAIL_COLUMN_LST.
+
+    Args:
+        message (dict): Gmail API message in the full, metadata or raw format
+        profile (str): parsing profile [full, metadata]
+
+    Returns:
+        tuple: field values of the message or None if the message could not be parsed
+    """
+    return _get_message_values(
+        message=message, message_obj=_get_message_obj(message=message), profile=profile
+    )
+
+
+def get_email_records(
+    message_lst: list[dict[str, Any]], profile: str = PROFILE_FULL
+) -> EmailRecordBuilder:
+    """
+    Parse a chunk of Gmail API messages to columnar email records, used to parse the messages in a process pool. The
+    dates of the chunk are converted at once with email_date_converter_batch(), so every distinct date is converted
+    only once.
+
+    Args:
+        message_lst (list): list of Gmail API messages
+        profile (str): parsing profile [full, metadata]
+
+    Returns:
+        EmailRecordBuilder: email records of the messages which could be parsed
+    """
+    message_obj_lst = [_get_message_obj(message=message) for message in message_lst]
+    date_lst = email_date_converter_batch(
+        email_date_lst=[_get_date_header(message_obj=m) for m in message_obj_lst]
+    )
+    records = EmailRecordBuilder()
+    for message, message_obj, date in zip(
+        message_lst, message_obj_lst, date_lst, strict=True
+    ):
+        # Dates which could not be converted are left to get_date(), so these messages are skipped like before.
+        if date is not None:
+            message_obj.set_date(date=date)
+        values = _get_message_values(
+            message=message, message_obj=message_obj, profile=profile
+        )
+        if values is not None:
+            records.append(values=values)
+    return records
+
+
+def _get_message_obj(message: dict[str, Any]) -> "GmailMessageBase":
+    message_class = RawMessage if "raw" in message else Message
+    return message_class(message_dict=message)
+
+
+def _get_message_values(
+    message: dict[str, Any], message_obj: "GmailMessageBase", profile: str
+) -> tuple[Any, ...] | None:
     try:
-        return Message(message_dict=message).to_dict()
+        return message_obj.to_values(profile=profile)
     except ValueError as e:
         print(message, str(e))
         return None
 
 
-class Message(AbstractMessage):
+def _get_date_header(message_obj: "GmailMessageBase") -> str | None:
+    try:
+        return message_obj.get_header_field_from_message(field="Date")
+    except ValueError:
+        # The message cannot be parsed, this is reported when the values of the message are extracted.
+        return None
+
+
+def _cached_field(function: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    # Compute each field of a message only once, even when it is requested multiple times.
+    @wraps(function)
+    def wrapper(self: "GmailMessageBase") -> Any:
+        try:
+            return self._field_dict[function.__name__]
+        except KeyError:
+            value = function(self)
+            self._field_dict[function.__name__] = value
+            return value
+
+    return wrapper
+
+
+class GmailMessageBase(AbstractMessage):
+    __slots__ = ("_field_dict",)
+    max_html_length = MAX_HTML_LENGTH
+    max_text_length = MAX_TEXT_LENGTH
+
     def __init__(self, message_dict: dict[str, Any]) -> None:
-        self._message_dict = message_dict
+        """
+        Common getters of the Gmail API messages, the subclasses only define the header lookup and the content.
+
+        Args:
+            message_dict (dict): Gmail API message
+        """
+        super().__init__(message_dict=message_dict)
+        self._field_dict: dict[str, Any] = {}
 
+    @_cached_field
     def get_from(self) -> str | None:
-        email_lst = self._split_emails(
-            email_lst=self.get_header_field_from_message(field="From")
+        email_lst = split_email_addresses(
+            header_value=self.get_header_field_from_message(field="From")
         )
         if len(email_lst) == 1:
             return email_lst[0]
         else:
             return None
 
+    @_cached_field
     def get_to(self) -> list[str]:
-        return self._split_emails(
-            email_lst=self.get_header_field_from_message(field="To")
+        return list(
+            split_email_addresses(
+                header_value=self.get_header_field_from_message(field="To")
+            )
         )
 
+    @_cached_field
     def get_cc(self) -> list[str]:
-        return self._split_emails(
-            email_lst=self.get_header_field_from_message(field="Cc")
+        return list(
+            split_email_addresses(
+                header_value=self.get_header_field_from_message(field="Cc")
+            )
         )
 
     def get_label_ids(self) -> list[str]:
@@ -60,14 +220,44 @@ class Message(AbstractMessage):
         else:
             return []
 
+    @_cached_field
     def get_subject(self) -> str | None:
         return self.get_header_field_from_message(field="Subject")
 
+    @_cached_field
     def get_date(self) -> datetime | None:
         return email_date_converter(
             email_date=self.get_header_field_from_message(field="Date")
         )
 
+    def set_date(self, date: datetime) -> None:
+        """
+        Set the date of the message, when the dates of multiple messages are converted at once.
+
+        Args:
+            date (datetime): converted date header of the message
+        """
+        self._field_dict["get_date"] = date
+
+    def get_thread_id(self) -> str:
+        return self._message_dict["threadId"]
+
+    def get_email_id(self) -> str:
+        return self._message_dict["id"]
+
+    @abstractmethod
+    def get_header_field_from_message(self, field: str) -> str | None:
+        pass
+
+
+class Message(GmailMessageBase):
+    __slots__ = ("_header_dict",)
+
+    def __init__(self, message_dict: dict[str, Any]) -> None:
+        super().__init__(message_dict=message_dict)
+        self._header_dict: dict[str, str] | None = None
+
+    @_cached_field
     def get_content(self) -> str | None:
         if "parts" in self._message_dict["payload"]:
             return self._get_parts_content(
@@ -78,22 +268,23 @@ class Message(AbstractMessage):
                 message_parts=[self._message_dict["payload"]]
             )
 
-    def get_thread_id(self) -> str:
-        return self._message_dict["threadId"]
+    def get_header_field_from_message(self, field: str) -> str | None:
+        """
+        Get the value of a header field, the header names are matched case-insensitive. The index of the headers is
+        built on the first call, so the following lookups do not scan the list of headers again.
 
-    def get_email_id(self) -> str:
-        return self._message_dict["id"]
+        Args:
+            field (str): name of the header field
 
-    def get_header_field_from_message(self, field: str) -> str | None:
-        lst = [
-            entry["value"]
-            for entry in self._message_dict["payload"]["headers"]
-            if entry["name"] == field
-        ]
-        if len(lst) > 0:
-            return lst[0]
-        else:
-            return None
+        Returns:
+            str: value of the first header with this name or None
+        """
+        if self._header_dict is None:
+            self._header_dict = {}
+            # Iterate in reverse so the first header with a given name is kept.
+            for entry in reversed(self._message_dict["payload"].get("headers", [])):
+                self._header_dict[entry["name"].lower()] = entry["value"]
+        return self._header_dict.get(field.lower())
 
     def _get_parts_content(self, message_parts: list[dict[str, Any]]) -> str | None:
         content_types = [p["mimeType"] for p in message_parts if "mimeType" in p]
@@ -120,17 +311,6 @@ class Message(AbstractMessage):
         else:
             return None
 
-    def _split_emails(self, email_lst: str | None) -> list[str]:
-        if email_lst is not None:
-            email_split_lst = email_lst.split(", ")
-            return [
-                self._get_email_address(email=email)
-                for email in email_split_lst
-                if "@" in email
-            ]
-        else:
-            return []
-
     @staticmethod
     def _get_email_body(message_parts: dict[str, Any]) -> str:
         if "body" in message_parts and "data" in message_parts["body"]:
@@ -140,16 +320,73 @@ class Message(AbstractMessage):
         else:
             return ""
 
-    @staticmethod
-    def _strip_tags(html: str) -> str:
-        s = MLStripper()
-        s.feed(html)
-        return s.get_data()
+    @classmethod
+    def _strip_tags(cls, html: str) -> str:
+        return html_to_text(
+            html=html,
+            max_html_length=cls.max_html_length,
+            max_text_length=cls.max_text_length,
+        )
 
-    @staticmethod
-    def _get_email_address(email: str) -> str:
-        email_split = email.split("<")
-        if len(email_split) == 1:
-            return email.lower()
+
+class RawMessage(GmailMessageBase):
+    __slots__ = ("_email_message",)
+
+    def __init__(
+        self,
+        message_dict: dict[str, Any],
+        email_message: EmailMessage | None = None,
+    ) -> None:
+        """
+        Message downloaded in the raw format of the Gmail API, the base64url encoded RFC 822 message is parsed with the
+        email package of the standard library on the first access to a header or the content.
+
+        Args:
+            message_dict (dict): Gmail API message with the keys id, threadId, labelIds and raw
+            email_message (email.message.EmailMessage): already parsed message, for messages from offline sources the
+                                                        raw key of the message_dict is not required
+        """
+        super().__init__(message_dict=message_dict)
+        self._email_message = email_message
+
+    @_cached_field
+    def get_content(self) -> str | None:
+        part = self._get_email_message().get_body(preferencelist=("plain", "html"))
+        if part is None:
+            return None
+        try:
+            content = part.get_content()
+        except (LookupError, UnicodeDecodeError):
+            # Unknown or wrong charset in the Content-Type header
+            content = part.get_payload(decode=True).decode("UTF-8", errors="replace")
+        if part.get_content_subtype() == "html":
+            return html_to_text(
+                html=content,
+                max_html_length=self.max_html_length,
+                max_text_length=self.max_text_length,
+            )
         else:
-            return email_split[1].split(">")[0].lower()
+            return content
+
+    def get_header_field_from_message(self, field: str) -> str | None:
+        """
+        Get the decoded value of a header field, the header names are matched case-insensitive.
+
+        Args:
+            field (str): name of the header field
+
+        Returns:
+            str: value of the first header with this name or None
+        """
+        value = self._get_email_message().get(field)
+        if value is None:
+            return None
+        else:
+            return str(value)
+
+    def _get_email_message(self) -> EmailMessage:
+        if self._email_message is None:
+            self._email_message = BytesParser(policy=policy.default).parsebytes(
+                base64.urlsafe_b64decode(self._message_dict["raw"].encode("UTF-8"))
+            )
+        return self._email_message
@@ -0,0 +1,325 @@
+import random
+import threading
+import time
+from collections.abc import Callable
+from http import HTTPStatus
+from typing import Any
+
+from googleapiclient.errors import HttpError
+from googleapiclient.http import BatchHttpRequest, HttpRequest
+from sqlalchemy import Engine, Float, bindparam, case, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from gmailsorter.google.database import GoogleQuota
+
+# Quota units of the Gmail API methods, https://developers.google.com/gmail/api/reference/quota
+QUOTA_UNIT_DICT = {
+    "gmail.users.getProfile": 1,
+    "gmail.users.history.list": 2,
+    "gmail.users.labels.create": 5,
+    "gmail.users.labels.list": 1,
+    "gmail.users.messages.batchModify": 50,
+    "gmail.users.messages.get": 5,
+    "gmail.users.messages.list": 5,
+    "gmail.users.messages.modify": 5,
+    "gmail.users.settings.filters.create": 5,
+    "gmail.users.settings.filters.list": 1,
+}
+_DEFAULT_QUOTA_UNITS = 5
+# The Gmail API allows 250 quota units per user per second and 1,200,000 quota units per minute for the project.
+_USER_QUOTA_UNITS_PER_SECOND = 250.0
+PROJECT_QUOTA_UNITS_PER_SECOND = 20000.0
+_MAX_CONCURRENCY = 100
+
+
+def get_quota_units(request: HttpRequest) -> int:
+    """
+    Get the quota units of a Gmail API request
+
+    Args:
+        request (googleapiclient.http.HttpRequest): API request
+
+    Returns:
+        int: quota units of the API method, methods which are not listed cost 5 quota units
+    """
+    return QUOTA_UNIT_DICT.get(getattr(request, "methodId", None), _DEFAULT_QUOTA_UNITS)
+
+
+def is_rate_limit_error(exception: Exception | None) -> bool:
+    """
+    Check if an exception of the Gmail API is a throttling signal, which is worth retrying after a delay. These are
+    the HTTP status codes 429 and 5xx as well as 403 with the reason rateLimitExceeded or userRateLimitExceeded.
+
+    Args:
+        exception (Exception/None): exception raised by the API request
+
+    Returns:
+        bool: True if the request was throttled
+    """
+    if not isinstance(exception, HttpError):
+        return False
+    status = exception.resp.status
+    return (
+        status == HTTPStatus.TOO_MANY_REQUESTS
+        or status >= HTTPStatus.INTERNAL_SERVER_ERROR
+        or (
+            status == HTTPStatus.FORBIDDEN
+            and b"ratelimitexceeded" in (exception.content or b"").lower()
+        )
+    )
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        """
+        Token bucket which is refilled with rate tokens per second up to capacity. Requests larger than the remaining
+        tokens are not rejected but wait until the tokens are refilled, so large batch requests are accepted as well.
+
+        Args:
+            rate (float): tokens per second
+            capacity (float/None): maximum number of tokens - by default the tokens of one second
+        """
+        self._rate = rate
+        self._capacity = capacity if capacity is not None else rate
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float) -> float:
+        """
+        Take tokens from the bucket, waiting until they are available
+
+        Args:
+            tokens (float): number of tokens
+
+        Returns:
+            float: time waited in seconds
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self._capacity, self._tokens + (now - self._updated) * self._rate
+            )
+            self._updated = now
+            self._tokens -= tokens
+            wait = -self._tokens / self._rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class SharedTokenBucket:
+    def __init__(
+        self,
+        engine: Engine,
+        rate: float = PROJECT_QUOTA_UNITS_PER_SECOND,
+        capacity: float | None = None,
+        name: str = "gmail",
+        block: float = _USER_QUOTA_UNITS_PER_SECOND,
+    ) -> None:
+        """
+        Token bucket shared by all processes using the same database, like the workers of the daemon. The state of the
+        bucket is stored in the google_quota table and the tokens are refilled and taken in a single UPDATE statement,
+        so concurrent processes never take the same tokens. To limit the round trips to the database the tokens are
+        reserved in blocks, by default one second of the quota of a single user, and handed out locally.
+
+        Args:
+            engine (sqlalchemy.Engine): database engine shared by the processes
+            rate (float): tokens per second, by default the quota units per second of the Google Cloud project
+            capacity (float/None): maximum number of tokens - by default the tokens of one second
+            name (str): name of the bucket in the google_quota table
+            block (float): minimum number of tokens reserved from the database at once
+        """
+        GoogleQuota.__table__.create(bind=engine, checkfirst=True)
+        self._engine = engine
+        self._rate = rate
+        self._capacity = capacity if capacity is not None else rate
+        self._name = name
+        self._block = block
+        self._reserve = 0.0
+        self._lock = threading.Lock()
+        now = bindparam("now", type_=Float)
+        refill = case(
+            (GoogleQuota.updated < now, (now - GoogleQuota.updated) * rate),
+            else_=0.0,
+        )
+        self._update = (
+            update(GoogleQuota)
+            .where(GoogleQuota.name == name)
+            .values(
+                tokens=case(
+                    (
+                        GoogleQuota.tokens + refill > self._capacity,
+                        self._capacity,
+                    ),
+                    else_=GoogleQuota.tokens + refill,
+                )
+                - bindparam("tokens", type_=Float),
+                updated=case(
+                    (GoogleQuota.updated < now, now), else_=GoogleQuota.updated
+                ),
+            )
+        )
+        self._select = select(GoogleQuota.tokens).where(GoogleQuota.name == name)
+
+    def acquire(self, tokens: float) -> float:
+        """
+        Take tokens from the bucket, waiting until they are available
+
+        Args:
+            tokens (float): number of tokens
+
+        Returns:
+            float: time waited in seconds
+        """
+        with self._lock:
+            if self._reserve >= tokens:
+                self._reserve -= tokens
+                return 0.0
+            reserved = max(tokens - self._reserve, self._block)
+            wait = self._reserve_tokens(tokens=reserved)
+            self._reserve += reserved - tokens
+            if wait > 0:
+                time.sleep(wait)
+            return wait
+
+    def _reserve_tokens(self, tokens: float) -> float:
+        while True:
+            try:
+                with self._engine.begin() as connection:
+                    now = time.time()
+                    result = connection.execute(
+                        self._update, {"now": now, "tokens": tokens}
+                    )
+                    if result.rowcount == 0:
+                        connection.execute(
+                            insert(GoogleQuota).values(
+                                name=self._name,
+                                tokens=self._capacity - tokens,
+                                updated=now,
+                            )
+                        )
+                    tokens_left = connection.execute(self._select).scalar_one()
+            except IntegrityError:
+                # Another process created the bucket at the same time.
+                continue
+            return -tokens_left / self._rate if tokens_left < 0 else 0.0
+
+
+class QuotaExecutor:
+    def __init__(
+        self,
+        quota_units_per_second: float = _USER_QUOTA_UNITS_PER_SECOND,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 64.0,
+        max_concurrency: int = _MAX_CONCURRENCY,
+        project_bucket: TokenBucket | SharedTokenBucket | None = None,
+    ) -> None:
+        """
+        Execute the Gmail API requests of one user within the per user quota. The quota units of every request are
+        taken from a token bucket, throttled requests are retried with jittered exponential backoff and the number of
+        requests sent at once in HTTP batch requests is adapted to the throttling signals, it is halved for every
+        throttled request and increased by one for every successful request.
+
+        Args:
+            quota_units_per_second (float): quota units per second available for the user
+            max_retries (int): maximum number of retries of a throttled request
+            backoff_base (float): delay in seconds of the first retry, doubled for every following retry
+            backoff_max (float): maximum delay in seconds between two retries
+            max_concurrency (int): maximum number of requests sent at once
+            project_bucket (TokenBucket/SharedTokenBucket/None): optional token bucket for the quota of the Google Cloud
+                                                                 project, which is shared by all users
+        """
+        self._bucket = TokenBucket(rate=quota_units_per_second)
+        self._project_bucket = project_bucket
+        self._max_retries = max_retries
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+        self._max_concurrency = max_concurrency
+        self._concurrency = max_concurrency
+
+    @property
+    def concurrency(self) -> int:
+        return self._concurrency
+
+    def get_batch_size(self, max_batch_size: int) -> int:
+        """
+        Get the number of requests for the next HTTP batch request
+
+        Args:
+            max_batch_size (int): maximum number of requests in the batch request
+
+        Returns:
+            int: number of requests limited by the current concurrency
+        """
+        return max(1, min(max_batch_size, self._concurrency))
+
+    def record_result(self, exception: Exception | None = None) -> None:
+        """
+        Adapt the concurrency to the result of a request, this is also used for the requests of a batch request.
+
+        Args:
+            exception (Exception/None): exception of the request or None when the request was successful
+        """
+        if is_rate_limit_error(exception=exception):
+            self._concurrency = max(1, self._concurrency // 2)
+        elif exception is None:
+            self._concurrency = min(self._max_concurrency, self._concurrency + 1)
+
+    def execute(self, request: HttpRequest) -> Any:
+        """
+        Execute a Gmail API request within the quota
+
+        Args:
+            request (googleapiclient.http.HttpRequest): API request
+
+        Returns:
+            dict: response of the API request
+        """
+        return self._execute(
+            function=request.execute, quota_units=get_quota_units(request=request)
+        )
+
+    def execute_batch(
+        self, batch: BatchHttpRequest, request_lst: list[HttpRequest]
+    ) -> None:
+        """
+        Execute an HTTP batch request within the quota, the results are returned by the callbacks of the batch request.
+
+        Args:
+            batch (googleapiclient.http.BatchHttpRequest): HTTP batch request
+            request_lst (list): API requests added to the batch request
+        """
+        self._execute(
+            function=batch.execute,
+            quota_units=sum(get_quota_units(request=r) for r in request_lst),
+        )
+
+    def _execute(self, function: Callable[[], Any], quota_units: int) -> Any:
+        attempt = 0
+        while True:
+            self._bucket.acquire(tokens=quota_units)
+            if self._project_bucket is not None:
+                self._project_bucket.acquire(tokens=quota_units)
+            try:
+                result = function()
+            except HttpError as e:
+                self.record_result(exception=e)
+                if not is_rate_limit_error(exception=e) or attempt >= self._max_retries:
+                    raise
+                time.sleep(self._get_backoff(attempt=attempt, exception=e))
+                attempt += 1
+            else:
+                self.record_result(exception=None)
+                return result
+
+    def _get_backoff(self, attempt: int, exception: HttpError) -> float:
+        # Full jitter, so the retries of multiple workers are spread out.
+        delay = random.uniform(
+            0, min(self._backoff_max, self._backoff_base * 2**attempt)
+        )
+        retry_after = exception.resp.get("retry-after")
+        if retry_after is not None and str(retry_after).isdigit():
+            delay = max(delay, float(retry_after))
+        return delay
@@ -0,0 +1,222 @@
+import csv
+import hashlib
+import mailbox
+import os
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from email import policy
+from email.parser import BytesParser
+from itertools import islice
+from typing import Any
+
+import pandas
+from tqdm import tqdm
+
+from gmailsorter.base.database import DatabaseInterface
+from gmailsorter.base.message import PROFILE_FULL
+from gmailsorter.google.message import RawMessage
+
+# Google Takeout stores the names of the labels in the X-Gmail-Labels header, the system labels are translated to the
+# label IDs used by the Gmail API. Opened and Archived are not labels in the Gmail API, so they are skipped.
+_SYSTEM_LABEL_DICT = {
+    "Inbox": "INBOX",
+    "Sent": "SENT",
+    "Important": "IMPORTANT",
+    "Starred": "STARRED",
+    "Spam": "SPAM",
+    "Trash": "TRASH",
+    "Drafts": "DRAFT",
+    "Unread": "UNREAD",
+    "Chat": "CHAT",
+    "Category Personal": "CATEGORY_PERSONAL",
+    "Category Social": "CATEGORY_SOCIAL",
+    "Category Promotions": "CATEGORY_PROMOTIONS",
+    "Category Updates": "CATEGORY_UPDATES",
+    "Category Forums": "CATEGORY_FORUMS",
+}
+_SKIPPED_LABEL_LST = ["Opened", "Archived"]
+
+
+def import_archive(
+    path: str,
+    database: DatabaseInterface,
+    user_id: int = 1,
+    archive_format: str | None = None,
+    label_dict: dict[str, str] | None = None,
+    profile: str = PROFILE_FULL,
+    max_workers: int | None = None,
+    chunk_size: int = 1000,
+) -> int:
+    """
+    Import an offline email archive like a Google Takeout export into the email database. The messages are streamed
+    from the archive, parsed in a process pool and stored in chunks, emails which are already stored in the database
+    are skipped. For Google Takeout exports the email IDs, thread IDs and labels match the ones of the Gmail API, so
+    a following update of the database only has to reconcile the email IDs and labels.
+
+    Args:
+        path (str): path to the mbox file or Maildir directory
+        database (gmailsorter.base.database.DatabaseInterface): SQLalchemy interface for email database
+        user_id (int): database user id
+        archive_format (str/None): archive format [mbox, maildir] - by default derived from the path
+        label_dict (dict/None): dictionary to translate the names of user labels to the label IDs of the Gmail API,
+                                labels without translation are stored by name
+        profile (str): parsing profile [full, metadata]
+        max_workers (int/None): maximum number of processes to parse the messages
+        chunk_size (int): number of messages per chunk sent to the process pool and stored in the database
+
+    Returns:
+        int: number of imported emails
+    """
+    if label_dict is None:
+        label_dict = {}
+    email_in_db_id = set(database.list_email_ids(user_id=user_id))
+    number_of_emails = 0
+    # Limit the number of pending chunks, so the archive is not loaded into memory at once.
+    max_pending = 2 * (max_workers if max_workers is not None else os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers) as exe:
+        future_queue: deque[Future] = deque()
+        for data_lst in _get_chunks(
+            iterator=_iterate_archive(path=path, archive_format=archive_format),
+            chunk_size=chunk_size,
+        ):
+            future_queue.append(
+                exe.submit(
+                    _parse_archive_chunk,
+                    data_lst=data_lst,
+                    label_dict=label_dict,
+                    profile=profile,
+                )
+            )
+            if len(future_queue) > max_pending:
+                number_of_emails += _store_records(
+                    database=database,
+                    record_lst=future_queue.popleft().result(),
+                    email_in_db_id=email_in_db_id,
+                    user_id=user_id,
+                )
+        while len(future_queue) > 0:
+            number_of_emails += _store_records(
+                database=database,
+                record_lst=future_queue.popleft().result(),
+                email_in_db_id=email_in_db_id,
+                user_id=user_id,
+            )
+    return number_of_emails
+
+
+def _iterate_archive(path: str, archive_format: str | None = None) -> Iterator[bytes]:
+    if archive_format is None:
+        archive_format = "maildir" if os.path.isdir(path) else "mbox"
+    if archive_format == "mbox":
+        archive = mailbox.mbox(path, create=False)
+        for key in tqdm(iterable=archive.iterkeys(), desc="Import messages"):
+            # The From line of a Google Takeout export contains the email ID.
+            yield archive.get_bytes(key, from_=True)
+    elif archive_format == "maildir":
+        archive = mailbox.Maildir(path, factory=None, create=False)
+        for key in tqdm(iterable=archive.iterkeys(), desc="Import messages"):
+            yield archive.get_bytes(key)
+    else:
+        raise ValueError("Unknown archive format: " + str(archive_format))
+
+
+def _get_chunks(iterator: Iterator[bytes], chunk_size: int) -> Iterator[list[bytes]]:
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if len(chunk) == 0:
+            return
+        yield chunk
+
+
+def _store_records(
+    database: DatabaseInterface,
+    record_lst: list[dict[str, Any]],
+    email_in_db_id: set[str],
+    user_id: int,
+) -> int:
+    record_new_lst = []
+    for record in record_lst:
+        if record["id"] not in email_in_db_id:
+            email_in_db_id.add(record["id"])
+            record_new_lst.append(record)
+    if len(record_new_lst) > 0:
+        database.store_dataframe(df=pandas.DataFrame(record_new_lst), user_id=user_id)
+    return len(record_new_lst)
+
+
+def _parse_archive_chunk(
+    data_lst: list[bytes], label_dict: dict[str, str], profile: str
+) -> list[dict[str, Any]]:
+    return [
+        record
+        for record in [
+            _parse_archive_message(data=data, label_dict=label_dict, profile=profile)
+            for data in data_lst
+        ]
+        if record is not None
+    ]
+
+
+def _parse_archive_message(
+    data: bytes, label_dict: dict[str, str], profile: str
+) -> dict[str, Any] | None:
+    if data.startswith(b"From "):
+        from_line, _, data = data.partition(b"\n")
+    else:
+        from_line = b""
+    email_message = BytesParser(policy=policy.default).parsebytes(data)
+    email_id = _get_email_id(from_line=from_line, email_message=email_message)
+    if email_id is None:
+        email_id = hashlib.sha256(data).hexdigest()[:16]
+    thread_id = _convert_gmail_id(value=email_message.get("X-GM-THRID"))
+    message_dict = {
+        "id": email_id,
+        "threadId": thread_id if thread_id is not None else email_id,
+        "labelIds": _get_label_ids(
+            header_value=email_message.get("X-Gmail-Labels"), label_dict=label_dict
+        ),
+    }
+    try:
+        return RawMessage(
+            message_dict=message_dict, email_message=email_message
+        ).to_dict(profile=profile)
+    except ValueError as e:
+        print(email_id, str(e))
+        return None
+
+
+def _get_email_id(from_line: bytes, email_message: Any) -> str | None:
+    # Google Takeout: "From 1234567890123456789@xxx Mon Jan 01 00:00:00 +0000 2024", the number is the decimal
+    # representation of the hexadecimal email ID of the Gmail API.
+    from_line_lst = from_line.decode("ascii", errors="replace").split()
+    if len(from_line_lst) > 1:
+        email_id = _convert_gmail_id(value=from_line_lst[1].split("@")[0])
+        if email_id is not None:
+            return email_id
+    message_id = email_message.get("Message-ID")
+    if message_id is not None and len(str(message_id).strip("<> \t")) > 0:
+        return str(message_id).strip("<> \t")
+    else:
+        return None
+
+
+def _convert_gmail_id(value: Any) -> str | None:
+    if value is not None and str(value).strip().isdigit():
+        return format(int(str(value).strip()), "x")
+    else:
+        return None
+
+
+def _get_label_ids(header_value: Any, label_dict: dict[str, str]) -> list[str]:
+    if header_value is None or len(str(header_value).strip()) == 0:
+        return []
+    label_id_lst = []
+    for label_raw in next(csv.reader([str(header_value)], skipinitialspace=True)):
+        label = label_raw.strip()
+        if len(label) == 0 or label in _SKIPPED_LABEL_LST:
+            continue
+        label_id = _SYSTEM_LABEL_DICT.get(label, label_dict.get(label, label))
+        if label_id not in label_id_lst:
+            label_id_lst.append(label_id)
+    return label_id_lst
@@ -13,6 +13,11 @@ class Gmail(GoogleMailBase):
         db_user_id: int = 1,
         port: int = 8080,
         email_download_format: str = "metadata",
+        replica_connection_str: str | None = None,
+        max_replica_staleness: float | None = None,
+        parse_workers: int | None = None,
+        download_batch_size: int = 50,
+        list_partition: str | None = None,
     ) -> None:
         """
         Gmail class to manage Emails via the Gmail API directly from Python
@@ -23,7 +28,12 @@ class Gmail(GoogleMailBase):
             user_id (str): in most cases this should be simply "me"
             db_user_id (int): Default 1 - set a user id when sharing a database with multiple users
             port (int): system communication port to start authentication webserver
-            email_download_format (str): API response format [full, metadata]
+            email_download_format (str): API response format [full, metadata, raw]
+            replica_connection_str (str): optional connection string of a read replica for the training queries
+            max_replica_staleness (float): maximum replication lag in seconds before falling back to the primary
+            parse_workers (int): number of processes to parse the downloaded messages
+            download_batch_size (int): number of messages downloaded per HTTP batch request
+            list_partition (str): partition the listing of the mailbox [label, date] to list it concurrently
         """
         connect_dict = {
             "api_name": "gmail",
@@ -37,7 +47,9 @@ class Gmail(GoogleMailBase):
 
         # Initialize database
         database_email, database_ml, database_token = self._create_databases(
-            connection_str=self._connection_str
+            connection_str=self._connection_str,
+            replica_connection_str=replica_connection_str,
+            max_replica_staleness=max_replica_staleness,
         )
 
         # Initialise service
@@ -59,6 +71,9 @@ class Gmail(GoogleMailBase):
             user_id=user_id,
             db_user_id=db_user_id,
             email_download_format=email_download_format,
+            parse_workers=parse_workers,
+            download_batch_size=download_batch_size,
+            list_partition=list_partition,
         )
 
 
@@ -2,9 +2,9 @@ import pickle
 
 from sklearn.ensemble import RandomForestClassifier
 from sqlalchemy import Column, Engine, Integer, String
-from sqlalchemy.orm import Session, declarative_base
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
 
-from gmailsorter.base.database import DatabaseTemplate
+from gmailsorter.base.database import DatabaseTemplate, ReadReplica
 
 Base = declarative_base()
 
@@ -41,69 +41,72 @@ class MachineLearningDatabase(DatabaseTemplate):
             user_id (int): database user id
             commit (boolean): boolean flag to write to the database
         """
-        feature_filtered_lst = [
-            feature for feature in feature_lst if feature != "email_id"
-        ]
-        label_stored_lst = self._get_labels(user_id=user_id)
-        feature_stored_lst = self.get_features(user_id=user_id)
-        model_dict_new = {
-            k: v for k, v in model_dict.items() if k not in label_stored_lst
-        }
-        model_dict_update = {
-            k: v for k, v in model_dict.items() if k in label_stored_lst
-        }
-        model_delete_lst = [
-            label for label in label_stored_lst if label not in model_dict
-        ]
-        feature_new_lst = [
-            feature
-            for feature in feature_filtered_lst
-            if feature not in feature_stored_lst
-        ]
-        feature_remove_lst = [
-            feature
-            for feature in feature_stored_lst
-            if feature not in feature_filtered_lst
-        ]
-        if len(model_dict_new) > 0:
-            self._session.add_all(
-                [
-                    MachineLearningLabels(
-                        label_id=k, random_forest=pickle.dumps(v), user_id=user_id
-                    )
-                    for k, v in model_dict_new.items()
-                ]
-            )
-        if len(feature_new_lst) > 0:
-            self._session.add_all(
-                [
-                    MachineLearningFeatures(feature=feature, user_id=user_id)
-                    for feature in feature_new_lst
-                ]
-            )
-        if len(model_dict_update) > 0:
-            label_obj_lst = (
-                self._session.query(MachineLearningLabels)
-                .filter(MachineLearningLabels.user_id == user_id)
-                .filter(
-                    MachineLearningLabels.label_id.in_(list(model_dict_update.keys()))
+        with self._session_scope(commit=commit) as session:
+            feature_filtered_lst = [
+                feature for feature in feature_lst if feature != "email_id"
+            ]
+            label_stored_lst = self._query_labels(session=session, user_id=user_id)
+            feature_stored_lst = self._query_features(session=session, user_id=user_id)
+            model_dict_new = {
+                k: v for k, v in model_dict.items() if k not in label_stored_lst
+            }
+            model_dict_update = {
+                k: v for k, v in model_dict.items() if k in label_stored_lst
+            }
+            model_delete_lst = [
+                label for label in label_stored_lst if label not in model_dict
+            ]
+            feature_new_lst = [
+                feature
+                for feature in feature_filtered_lst
+                if feature not in feature_stored_lst
+            ]
+            feature_remove_lst = [
+                feature
+                for feature in feature_stored_lst
+                if feature not in feature_filtered_lst
+            ]
+            if len(model_dict_new) > 0:
+                session.add_all(
+                    [
+                        MachineLearningLabels(
+                            label_id=k, random_forest=pickle.dumps(v), user_id=user_id
+                        )
+                        for k, v in model_dict_new.items()
+                    ]
                 )
-                .all()
-            )
-            for label_obj in label_obj_lst:
-                label_obj.random_forest = pickle.dumps(
-                    model_dict_update[label_obj.label_id]
+            if len(feature_new_lst) > 0:
+                session.add_all(
+                    [
+                        MachineLearningFeatures(feature=feature, user_id=user_id)
+                        for feature in feature_new_lst
+                    ]
+                )
+            if len(model_dict_update) > 0:
+                label_obj_lst = (
+                    session.query(MachineLearningLabels)
+                    .filter(MachineLearningLabels.user_id == user_id)
+                    .filter(
+                        MachineLearningLabels.label_id.in_(
+                            list(model_dict_update.keys())
+                        )
+                    )
+                    .all()
                 )
-        if len(model_delete_lst) > 0:
-            self._session.query(MachineLearningLabels).filter(
-                MachineLearningLabels.user_id == user_id
-            ).filter(MachineLearningLabels.label_id.in_(model_delete_lst)).delete()
-        if len(feature_remove_lst) > 0:
-            self._session.query(MachineLearningFeatures).filter(
-                MachineLearningFeatures.user_id == user_id
-            ).filter(MachineLearningFeatures.feature.in_(feature_remove_lst)).delete()
-        if commit:
-            self._session.commit()
+                for label_obj in label_obj_lst:
+                    label_obj.random_forest = pickle.dumps(
+                        model_dict_update[label_obj.label_id]
+                    )
+            if len(model_delete_lst) > 0:
+                session.query(MachineLearningLabels).filter(
+                    MachineLearningLabels.user_id == user_id
+                ).filter(MachineLearningLabels.label_id.in_(model_delete_lst)).delete()
+            if len(feature_remove_lst) > 0:
+                session.query(MachineLearningFeatures).filter(
+                    MachineLearningFeatures.user_id == user_id
+                ).filter(
+                    MachineLearningFeatures.feature.in_(feature_remove_lst)
+                ).delete()
 
     def load_models(
         self, user_id: int = 1
@@ -117,30 +120,41 @@ class MachineLearningDatabase(DatabaseTemplate):
         Returns:
             dict, list: machine learning model dictionary and feature list
         """
-        label_obj_lst = (
-            self._session.query(MachineLearningLabels)
-            .filter(MachineLearningLabels.user_id == user_id)
-            .all()
-        )
-        feature_lst = self.get_features(user_id=user_id)
-        return {
-            label_obj.label_id: pickle.loads(label_obj.random_forest)
-            for label_obj in label_obj_lst
-        }, feature_lst
+        with self._read_session_scope() as session:
+            label_obj_lst = (
+                session.query(MachineLearningLabels)
+                .filter(MachineLearningLabels.user_id == user_id)
+                .all()
+            )
+            feature_lst = self._query_features(session=session, user_id=user_id)
+            return {
+                label_obj.label_id: pickle.loads(label_obj.random_forest)
+                for label_obj in label_obj_lst
+            }, feature_lst
+
+    def get_features(self, user_id: int = 1) -> list[str]:
+        with self._read_session_scope() as session:
+            return self._query_features(session=session, user_id=user_id)
 
     def _get_labels(self, user_id: int = 1) -> list[str]:
+        with self._session_scope(commit=False) as session:
+            return self._query_labels(session=session, user_id=user_id)
+
+    @staticmethod
+    def _query_labels(session: Session, user_id: int = 1) -> list[str]:
         return [
             label[0]
-            for label in self._session.query(MachineLearningLabels.label_id)
+            for label in session.query(MachineLearningLabels.label_id)
             .filter(MachineLearningLabels.user_id == user_id)
             .all()
         ]
 
-    def get_features(self, user_id: int = 1) -> list[str]:
+    @staticmethod
+    def _query_features(session: Session, user_id: int = 1) -> list[str]:
         return [
             feature_obj.feature
             for feature_obj in (
-                self._session.query(MachineLearningFeatures)
+                session.query(MachineLearningFeatures)
                 .filter(MachineLearningFeatures.user_id == user_id)
                 .all()
             )
@@ -148,7 +162,12 @@ class MachineLearningDatabase(DatabaseTemplate):
 
 
 def get_machine_learning_database(
-    engine: Engine, session: Session
+    engine: Engine,
+    session: Session | None = None,
+    session_factory: sessionmaker | None = None,
+    read_replica: ReadReplica | None = None,
 ) -> MachineLearningDatabase:
     Base.metadata.create_all(engine)
-    return MachineLearningDatabase(session=session)
+    return MachineLearningDatabase(
+        session=session, session_factory=session_factory, read_replica=read_replica
+    )
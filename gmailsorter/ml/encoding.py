@@ -9,6 +9,7 @@ def encode_df_for_machine_learning(
     feature_lst: list[str] | np.ndarray | None = None,
     label_lst: list[str] | np.ndarray | None = None,
     return_labels: bool = False,
+    vocabulary: dict[str, dict[str, int]] | None = None,
 ) -> pandas.DataFrame | tuple[pandas.DataFrame, pandas.DataFrame]:
     """
     Encode a given dataframe for machine learning. Either based on a list of existing features and labels or by
@@ -21,6 +22,9 @@ def encode_df_for_machine_learning(
                             Dataframe
         label_lst (list): list of labels to encode, if no list is provided the labels are generated from the Dataframe
         return_labels (boolean): optional flag to return the dataframe with labels
+        vocabulary (dict): precomputed vocabulary with the distinct values of each column, for example from
+                           DatabaseInterface.get_feature_vocabulary(), if no vocabulary is provided it is generated
+                           from the Dataframe
 
     Returns:
         pandas.DataFrame/ list: Dataframe with features and optionally also the dataframe with labels
@@ -36,7 +40,9 @@ def encode_df_for_machine_learning(
     combined_lst = [
         feature for feature in feature_lst + label_lst if feature != "email_id"
     ]
-    df_all_encode = one_hot_encoding(df=df, feature_lst=combined_lst)
+    df_all_encode = one_hot_encoding(
+        df=df, feature_lst=combined_lst, vocabulary=vocabulary
+    )
     if len(feature_lst) == 0:
         feature_lst = [
             feature
@@ -58,7 +64,9 @@ def encode_df_for_machine_learning(
 
 
 def one_hot_encoding(
-    df: pandas.DataFrame, feature_lst: list[str] | None = None
+    df: pandas.DataFrame,
+    feature_lst: list[str] | None = None,
+    vocabulary: dict[str, dict[str, int]] | None = None,
 ) -> pandas.DataFrame:
     """
     Binary one hot encoding of features in a pandas DataFrame
@@ -66,23 +74,33 @@ def one_hot_encoding(
     Args:
         df (pandas.DataFrame): DataFrame with emails
         feature_lst (list): list of features to encode
+        vocabulary (dict): precomputed vocabulary with the distinct values of each column
 
     Returns:
         pandas.DataFrame: hot encoding of features in a pandas DataFrame
     """
     if feature_lst is None:
         feature_lst = []
-    labels_red_lst = _build_red_lst(df_column=df.labels.values)
-    cc_red_lst = _build_red_lst(df_column=df.cc.values)
-    thread_red_lst = df["threads"].unique()
-    to_red_lst = _build_red_lst(df_column=df.to.values)
-    from_red_lst = [email for email in df["from"].unique() if email is not None] + list(
-        {
-            "@" + email.split("@")[-1]
-            for email in df["from"].unique()
-            if email is not None and isinstance(email, str) and "@" in email
-        }
-    )
+    if vocabulary is not None:
+        labels_red_lst = sorted(vocabulary["labels"])
+        cc_red_lst = sorted(vocabulary["cc"])
+        thread_red_lst = sorted(vocabulary["threads"])
+        to_red_lst = sorted(vocabulary["to"])
+        from_red_lst = sorted(vocabulary["from"])
+    else:
+        labels_red_lst = _build_red_lst(df_column=df.labels.values)
+        cc_red_lst = _build_red_lst(df_column=df.cc.values)
+        thread_red_lst = df["threads"].unique()
+        to_red_lst = _build_red_lst(df_column=df.to.values)
+        from_red_lst = [
+            email for email in df["from"].unique() if email is not None
+        ] + list(
+            {
+                "@" + email.split("@")[-1]
+                for email in df["from"].unique()
+                if email is not None and isinstance(email, str) and "@" in email
+            }
+        )
     dict_labels_lst = _list_entry_df(
         red_lst=labels_red_lst, value_lst=df["labels"].values
     )
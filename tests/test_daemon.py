@@ -5,7 +5,9 @@ from unittest.mock import MagicMock, patch
 
 from google.auth.exceptions import RefreshError
 from googleapiclient.errors import HttpError
+from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
 from gmailsorter.daemon.__main__ import _get_execution_mode, command_line_parser
 from gmailsorter.daemon.daemon import (
@@ -19,6 +21,7 @@ from gmailsorter.daemon.shared import (
     JOB_STATUS_PROGRESS,
     JOB_STATUS_SUCCESS,
     JOB_STATUS_WAIT,
+    Base,
     GoogleMail,
     GoogleToken,
     Task,
@@ -33,6 +36,7 @@ from gmailsorter.daemon.tasks import (
     get_all_tasks_to_execute,
     update_task_status,
 )
+from gmailsorter.google.quota import QuotaExecutor, SharedTokenBucket
 
 
 def _make_mock_service(labels=None):
@@ -573,6 +577,51 @@ class TestDaemon(unittest.TestCase):
                 filter_messages=False,
             )
 
+    @patch("gmailsorter.daemon.daemon.GoogleMail")
+    def test_update_with_buffered_writes(self, mail_cls):
+        mail_instance = MagicMock()
+        mail_cls.return_value = mail_instance
+        # The background thread of the writer requires a database shared between threads
+        engine = create_engine(
+            "sqlite://",
+            poolclass=StaticPool,
+            connect_args={"check_same_thread": False},
+        )
+        Base.metadata.create_all(engine)
+        self.session.close()
+        self.session = sessionmaker(bind=engine)()
+        self.session.add_all(
+            [
+                GoogleToken(user_id=1, token="tok", expiry=datetime.now(timezone.utc)),
+                Task(task_name="update", status=JOB_STATUS_INIT, user_id=1),
+                Task(task_name="fetch", status=JOB_STATUS_WAIT, user_id=1),
+            ]
+        )
+        self.session.commit()
+        update(
+            engine=engine,
+            client_secrets_config={"web": {"client_id": "cid", "client_secret": "sec"}},
+            mode="update",
+            buffered_writes=True,
+        )
+        self.assertIsNotNone(mail_cls.call_args.kwargs["database_writer"])
+        self.assertIsInstance(
+            mail_cls.call_args.kwargs["quota_executor"], QuotaExecutor
+        )
+        self.session.expire_all()
+        self.assertEqual(
+            get_task_status_for_user(
+                session=self.session, user_id=1, task_name="update"
+            ),
+            JOB_STATUS_SUCCESS,
+        )
+        self.assertEqual(
+            get_task_status_for_user(
+                session=self.session, user_id=1, task_name="fetch"
+            ),
+            JOB_STATUS_INIT,
+        )
+
     @patch("gmailsorter.daemon.daemon.iterate_over_users")
     def test_update_dispatches_per_mode(self, iterate_mock):
         update(
@@ -585,6 +634,18 @@ class TestDaemon(unittest.TestCase):
         self.assertEqual(kwargs["user_id_lst"], [1])
         self.assertTrue(kwargs["database_update"])
         self.assertFalse(kwargs["filter_messages"])
+        self.assertIsNone(kwargs["project_bucket"])
+
+    @patch("gmailsorter.daemon.daemon.iterate_over_users")
+    def test_update_shares_project_quota(self, iterate_mock):
+        update(
+            engine=self.engine,
+            client_secrets_config={"web": {"client_id": "cid", "client_secret": "sec"}},
+            mode="update",
+            project_quota_units_per_second=100.0,
+        )
+        _, kwargs = iterate_mock.call_args
+        self.assertIsInstance(kwargs["project_bucket"], SharedTokenBucket)
 
 
 class TestDaemonMain(unittest.TestCase):
@@ -712,12 +773,15 @@ class TestDaemonMain(unittest.TestCase):
                 "-u",
                 "-t",
                 "4",
+                "-q",
+                "100",
             ],
         ):
             command_line_parser()
 
         _, kwargs = update_mock.call_args
         self.assertEqual(kwargs["max_workers"], 4)
+        self.assertEqual(kwargs["project_quota_units_per_second"], 100.0)
 
     @patch("gmailsorter.daemon.__main__.update")
     @patch("gmailsorter.daemon.__main__.get_database_engine", return_value="ENGINE")
@@ -740,6 +804,7 @@ class TestDaemonMain(unittest.TestCase):
 
         _, kwargs = update_mock.call_args
         self.assertIsNone(kwargs["max_workers"])
+        self.assertIsNone(kwargs["project_quota_units_per_second"])
 
 
 if __name__ == "__main__":
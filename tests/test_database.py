@@ -1,10 +1,24 @@
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from unittest import TestCase
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 from datetime import datetime
 import pandas
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from gmailsorter.base.database import get_email_database, EmailContent, EmailFrom
+from gmailsorter.base.database import (
+    get_email_database,
+    session_scope,
+    get_read_replica,
+    migrate_to_clustered_layout,
+    migrate_to_body_store,
+    EmailBody,
+    EmailContent,
+    EmailFrom,
+    Labels,
+)
+from gmailsorter.base.writer import BufferedWriter
 
 
 class DatabaseTest(TestCase):
@@ -38,6 +52,32 @@ class DatabaseTest(TestCase):
     def test_get_all_emails(self):
         self.assertEqual(len(self.database.get_all_emails()), 1)
 
+    def test_history_id(self):
+        self.assertIsNone(self.database.get_history_id(user_id=5))
+        self.database.update_history_id(history_id="100", user_id=5)
+        self.database.update_history_id(history_id="200", user_id=5)
+        self.database.update_history_id(history_id="300", user_id=6)
+        self.assertEqual(self.database.get_history_id(user_id=5), "200")
+        self.assertEqual(self.database.get_history_id(user_id=6), "300")
+
+    def test_get_all_emails_for_users(self):
+        df = self.database.get_all_emails().copy()
+        df["id"] = ["otherid456"]
+        df["labels"] = [["Label_456"]]
+        self.database.store_dataframe(df=df, user_id=2)
+        df_dict = self.database.get_all_emails_for_users(user_id_lst=[1, 2, 3])
+        self.assertEqual(sorted(df_dict.keys()), [1, 2, 3])
+        self.assertEqual(df_dict[1].id.values.tolist(), ["myid123"])
+        self.assertEqual(
+            df_dict[1].labels.values.tolist(), [["important", "Label_123"]]
+        )
+        self.assertEqual(df_dict[2].id.values.tolist(), ["otherid456"])
+        self.assertEqual(df_dict[2].labels.values.tolist(), [["Label_456"]])
+        self.assertEqual(
+            df_dict[2].to.values.tolist(), [["me@mail.com", "friend@provider.org"]]
+        )
+        self.assertEqual(len(df_dict[3]), 0)
+
     def test_get_emails_by_label(self):
         self.assertEqual(
             self.database.get_emails_by_label(label_id="Label_123").id.values.tolist(),
@@ -129,6 +169,28 @@ class DatabaseTest(TestCase):
             [],
         )
 
+    def test_get_feature_vocabulary(self):
+        vocabulary = self.database.get_feature_vocabulary()
+        self.assertEqual(vocabulary["labels"], {"important": 1, "Label_123": 1})
+        self.assertEqual(vocabulary["cc"], {"your@friend.com": 1, "@friend.com": 1})
+        self.assertEqual(vocabulary["from"], {"sender@server.net": 1, "@server.net": 1})
+        self.assertEqual(vocabulary["threads"], {"abc123": 1})
+        self.assertEqual(
+            vocabulary["to"],
+            {
+                "me@mail.com": 1,
+                "@mail.com": 1,
+                "friend@provider.org": 1,
+                "@provider.org": 1,
+            },
+        )
+        self.database.mark_emails_as_deleted(message_id_lst=["myid123"])
+        self.assertEqual(self.database.get_feature_vocabulary()["threads"], {})
+        self.assertEqual(
+            self.database.get_feature_vocabulary(include_deleted=True)["threads"],
+            {"abc123": 1},
+        )
+
     def test_close(self):
         self.database._session.close = MagicMock()
         self.database.close()
@@ -174,3 +236,339 @@ class DatabaseTest(TestCase):
         self.database.session.query(EmailFrom).filter(EmailFrom.id == 1).delete()
         self.database.session.commit()
         self.assertIsNone(self.database.get_all_emails().iloc[0]["from"])
+
+
+def _get_email_df(email_id_lst, content_lst=None, label_lst=None):
+    if content_lst is None:
+        content_lst = [None] * len(email_id_lst)
+    if label_lst is None:
+        label_lst = ["Label_123"]
+    return pandas.DataFrame(
+        [
+            {
+                "content": content,
+                "date": datetime(2022, 2, 11),
+                "from": "sender@server.net",
+                "id": email_id,
+                "cc": [],
+                "labels": list(label_lst),
+                "subject": "Test Email Subject",
+                "threads": "abc123",
+                "to": ["me@mail.com"],
+            }
+            for email_id, content in zip(email_id_lst, content_lst, strict=True)
+        ]
+    )
+
+
+def _write_failing(session):
+    raise ValueError("failing write")
+
+
+class BufferedWriterTest(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine = create_engine(
+            "sqlite:///" + os.path.join(self.directory.name, "email.db")
+        )
+        self.database = get_email_database(
+            engine=self.engine, session=sessionmaker(bind=self.engine)()
+        )
+        self.df = _get_email_df(email_id_lst=["myid123"])
+
+    def tearDown(self) -> None:
+        self.database.close()
+        self.engine.dispose()
+        self.directory.cleanup()
+
+    def test_flush_on_close(self):
+        with BufferedWriter(engine=self.engine, flush_interval=60.0) as writer:
+            writer.store_dataframe(df=self.df, user_id=1)
+            writer.update_labels(
+                message_id_lst=["myid123"], message_meta_lst=[["Label_456"]]
+            )
+            self.assertEqual(self.database.list_email_ids(), [])
+        self.database.session.expire_all()
+        self.assertEqual(self.database.list_email_ids(), ["myid123"])
+        self.assertEqual(
+            self.database.get_all_emails().labels.values.tolist(), [["Label_456"]]
+        )
+
+    def test_flush_on_batch_size(self):
+        writer = BufferedWriter(engine=self.engine, max_batch_size=2)
+        writer.store_dataframe(df=self.df, user_id=1)
+        writer.mark_emails_as_deleted(message_id_lst=["myid123"], user_id=1)
+        writer.flush()
+        self.assertEqual(len(self.database.get_all_emails(include_deleted=True)), 1)
+        self.assertEqual(len(self.database.get_all_emails(include_deleted=False)), 0)
+        writer.close()
+        with self.assertRaises(ValueError):
+            writer.store_dataframe(df=self.df, user_id=1)
+
+    def test_failing_write_is_isolated(self):
+        writer = BufferedWriter(engine=self.engine, flush_interval=60.0)
+        writer.put(_write_failing)
+        writer.store_dataframe(df=self.df, user_id=1)
+        with self.assertRaises(ValueError):
+            writer.flush()
+        self.assertEqual(self.database.list_email_ids(), ["myid123"])
+        writer.close()
+
+
+class SessionFactoryTest(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine = create_engine(
+            "sqlite:///" + os.path.join(self.directory.name, "email.db")
+        )
+        self.database = get_email_database(
+            engine=self.engine,
+            session_factory=sessionmaker(bind=self.engine, expire_on_commit=False),
+        )
+
+    def tearDown(self) -> None:
+        self.database.close()
+        self.engine.dispose()
+        self.directory.cleanup()
+
+    def test_session_required(self):
+        with self.assertRaises(ValueError):
+            get_email_database(engine=self.engine)
+
+    def test_store_from_multiple_threads(self):
+        def store(email_id):
+            self.database.store_dataframe(
+                df=_get_email_df(email_id_lst=[email_id]), user_id=1
+            )
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(store, ["id" + str(i) for i in range(8)]))
+        self.assertEqual(
+            sorted(self.database.list_email_ids()), ["id" + str(i) for i in range(8)]
+        )
+        self.assertEqual(len(self.database.get_all_emails()), 8)
+
+    def test_commit_flag(self):
+        df = _get_email_df(email_id_lst=["discarded"])
+        self.database.store_dataframe(df=df, user_id=1, commit=False)
+        self.assertEqual(self.database.list_email_ids(), [])
+        self.database.store_dataframe(df=df, user_id=1)
+        self.assertEqual(self.database.list_email_ids(), ["discarded"])
+
+    def test_rollback_on_error(self):
+        with (
+            self.assertRaises(ValueError),
+            session_scope(session_factory=sessionmaker(bind=self.engine)) as session,
+        ):
+            session.add(EmailContent(email_id="rolledback", user_id=1))
+            raise ValueError()
+        self.assertEqual(self.database.list_email_ids(), [])
+
+
+class ReadReplicaTest(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.primary_file = os.path.join(self.directory.name, "email.db")
+        self.engine = create_engine("sqlite:///" + self.primary_file)
+        self.replica_engine = create_engine(
+            "sqlite:///" + os.path.join(self.directory.name, "replica.db")
+        )
+        replica_database = get_email_database(
+            engine=self.replica_engine,
+            session_factory=sessionmaker(bind=self.replica_engine),
+        )
+        replica_database.store_dataframe(df=_get_email_df(email_id_lst=["replicaid"]))
+
+    def tearDown(self) -> None:
+        self.engine.dispose()
+        self.replica_engine.dispose()
+        self.directory.cleanup()
+
+    def _get_database(self, max_staleness):
+        return get_email_database(
+            engine=self.engine,
+            session_factory=sessionmaker(bind=self.engine),
+            read_replica=get_read_replica(
+                engine=self.engine,
+                replica_engine=self.replica_engine,
+                max_staleness=max_staleness,
+            ),
+        )
+
+    def test_read_from_replica(self):
+        database = self._get_database(max_staleness=None)
+        self.assertEqual(database.get_all_emails().id.values.tolist(), ["replicaid"])
+        self.assertEqual(database.get_feature_vocabulary()["labels"], {"Label_123": 1})
+        self.assertEqual(database.list_email_ids(), [])
+
+    def test_fall_back_to_primary_when_stale(self):
+        database = self._get_database(max_staleness=60.0)
+        self.assertEqual(database.get_all_emails().id.values.tolist(), ["replicaid"])
+        future = os.path.getmtime(self.primary_file) + 3600
+        os.utime(self.primary_file, (future, future))
+        self.assertEqual(len(database.get_all_emails()), 0)
+
+
+class ClusteredLayoutTest(TestCase):
+    label_lst = ["Label_123", "INBOX"]
+
+    def setUp(self) -> None:
+        self.engine = create_engine("sqlite:///:memory:")
+        self.database = get_email_database(
+            engine=self.engine, session=sessionmaker(bind=self.engine)()
+        )
+        self.database.store_dataframe(
+            df=_get_email_df(email_id_lst=["first"], label_lst=self.label_lst),
+            user_id=2,
+        )
+        self.database.session.close()
+
+    def test_migrate_to_clustered_layout(self):
+        migrate_to_clustered_layout(engine=self.engine)
+        migrate_to_clustered_layout(engine=self.engine)
+        with self.engine.connect() as connection:
+            sql_lst = [
+                sql
+                for (sql,) in connection.exec_driver_sql(
+                    "SELECT sql FROM sqlite_master WHERE type = 'table' AND name NOT IN ('email_body', 'email_history', 'email_id_sequence')"
+                )
+            ]
+        self.assertEqual(len(sql_lst), 6)
+        self.assertTrue(all("WITHOUT ROWID" in sql for sql in sql_lst))
+        self.database.store_dataframe(
+            df=_get_email_df(email_id_lst=["second"], label_lst=self.label_lst),
+            user_id=1,
+        )
+        self.database.store_dataframe(
+            df=_get_email_df(email_id_lst=["third"], label_lst=self.label_lst),
+            user_id=2,
+        )
+        self.assertEqual(self.database.list_email_ids(user_id=2), ["first", "third"])
+        self.assertEqual(
+            self.database.get_all_emails(user_id=1).labels.values.tolist(),
+            [["Label_123", "INBOX"]],
+        )
+        self.assertEqual(
+            sorted(label.id for label in self.database.session.query(Labels).all()),
+            [1, 2, 3, 4, 5, 6],
+        )
+
+    def test_clustered_ids_from_sequence(self):
+        with tempfile.TemporaryDirectory() as directory:
+            connection_str = "sqlite:///" + os.path.join(directory, "email.db")
+            engine = create_engine(connection_str)
+            database = get_email_database(
+                engine=engine,
+                session_factory=sessionmaker(bind=engine),
+                clustered_layout=True,
+            )
+            database.store_dataframe(
+                df=_get_email_df(email_id_lst=["first"], label_lst=self.label_lst),
+                user_id=1,
+            )
+            engine.dispose()
+            # A clustered database opened without the flag continues the id sequence.
+            engine = create_engine(connection_str)
+            database = get_email_database(
+                engine=engine, session_factory=sessionmaker(bind=engine)
+            )
+            database.store_dataframe(
+                df=_get_email_df(email_id_lst=["second"], label_lst=self.label_lst),
+                user_id=2,
+            )
+            with engine.connect() as connection:
+                self.assertEqual(
+                    connection.exec_driver_sql(
+                        "SELECT next_id FROM email_id_sequence WHERE table_name = 'email_labels'"
+                    ).scalar(),
+                    5,
+                )
+            self.assertEqual(database.list_email_ids(user_id=2), ["second"])
+            engine.dispose()
+
+    def test_non_clustered_database_is_not_scanned(self):
+        with patch("gmailsorter.base.database._get_clustered_tables") as scan_mock:
+            self.database.store_dataframe(
+                df=_get_email_df(email_id_lst=["second"], label_lst=self.label_lst),
+                user_id=1,
+            )
+        scan_mock.assert_not_called()
+
+
+class BodyStoreTest(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine = create_engine(
+            "sqlite:///" + os.path.join(self.directory.name, "email.db")
+        )
+
+    def tearDown(self) -> None:
+        self.engine.dispose()
+        self.directory.cleanup()
+
+    def _count(self, cls):
+        with session_scope(sessionmaker(bind=self.engine)) as session:
+            return session.query(cls).count()
+
+    def test_store_deduplicates_bodies(self):
+        database = get_email_database(
+            engine=self.engine, session_factory=sessionmaker(bind=self.engine)
+        )
+        database.store_dataframe(
+            df=_get_email_df(
+                email_id_lst=["a", "b", "c", "d"],
+                content_lst=["Weekly news", "Weekly  news\n", "Other", None],
+            ),
+            user_id=1,
+        )
+        database.store_dataframe(
+            df=_get_email_df(email_id_lst=["e"], content_lst=["Weekly news"]),
+            user_id=1,
+        )
+        database.store_dataframe(
+            df=_get_email_df(email_id_lst=["f"], content_lst=["Weekly news"]),
+            user_id=2,
+        )
+        self.assertEqual(self._count(EmailBody), 3)
+        df = database.get_all_emails(user_id=1)
+        self.assertEqual(
+            df.content.fillna("").tolist(),
+            ["Weekly news", "Weekly news", "Other", "", "Weekly news"],
+        )
+        self.assertEqual(
+            database.get_email_collection(email_id_lst=["c"]).content.tolist(),
+            ["Other"],
+        )
+
+    def test_migrate_existing_database(self):
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql(
+                "CREATE TABLE email_content (id INTEGER PRIMARY KEY, email_id VARCHAR, email_subject VARCHAR, "
+                "email_content VARCHAR, email_deleted BOOLEAN, email_date DATETIME, user_id INTEGER)"
+            )
+            for i, content in enumerate(["Weekly news", "Weekly news", "Other", None]):
+                connection.exec_driver_sql(
+                    "INSERT INTO email_content (email_id, email_subject, email_content, email_deleted, user_id) "
+                    "VALUES (?, 'Newsletter', ?, 0, 1)",
+                    (str(i), content),
+                )
+        database = get_email_database(
+            engine=self.engine, session_factory=sessionmaker(bind=self.engine)
+        )
+        content_lst = ["Weekly news", "Weekly news", "Other", ""]
+        self.assertEqual(
+            database.get_all_emails().content.fillna("").tolist(), content_lst
+        )
+        self.assertEqual(migrate_to_body_store(engine=self.engine, batch_size=2), 3)
+        self.assertEqual(migrate_to_body_store(engine=self.engine), 0)
+        self.assertEqual(self._count(EmailBody), 2)
+        self.assertEqual(
+            database.get_all_emails().content.fillna("").tolist(), content_lst
+        )
+        with session_scope(sessionmaker(bind=self.engine)) as session:
+            self.assertEqual(
+                session.query(EmailContent)
+                .filter(EmailContent.email_content.is_not(None))
+                .count(),
+                0,
+            )
@@ -7,6 +7,9 @@ from unittest.mock import MagicMock, patch
 
 import pandas as pd
 from google.auth.exceptions import RefreshError
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpMockSequence
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
@@ -18,6 +21,7 @@ from gmailsorter.google.database import (
     get_token_database,
 )
 from gmailsorter.google.mail import GoogleMailBase
+from gmailsorter.google.quota import QuotaExecutor
 from gmailsorter.local import Gmail, load_client_secrets_file
 
 
@@ -216,6 +220,82 @@ class TestGoogleMailBase(unittest.TestCase):
         self.assertEqual(full, [{"id": "a"}, {"id": "b"}])
         self.assertEqual(ids, ["a", "b"])
 
+    def test_search_messages_partitioned(self):
+        service = self._create_mock_service_with_labels(
+            labels=[
+                {"name": "INBOX", "id": "INBOX"},
+                {"name": "SPAM", "id": "SPAM"},
+                {"name": "Work", "id": "Label_1"},
+            ]
+        )
+        response_dict = {
+            ("INBOX", None): {
+                "messages": [{"id": "a"}, {"id": "b"}],
+                "nextPageToken": "p2",
+            },
+            ("INBOX", "p2"): {"messages": [{"id": "c"}]},
+            ("Label_1", None): {"messages": [{"id": "b"}, {"id": "d"}]},
+            ("", None): {"messages": [{"id": "e"}]},
+        }
+        request_lst = []
+
+        def list_request(userId, labelIds, q, pageToken, maxResults, fields):
+            self.assertEqual(maxResults, 500)
+            request_lst.append((labelIds, q, pageToken))
+            request = MagicMock()
+            request.response = response_dict[
+                (labelIds[0] if len(labelIds) > 0 else "", pageToken)
+            ]
+            request.execute.return_value = request.response
+            return request
+
+        class FakeBatch:
+            def __init__(self, callback):
+                self._callback = callback
+                self._request_lst = []
+
+            def add(self, request, request_id):
+                self._request_lst.append((request_id, request))
+
+            def execute(self):
+                for request_id, request in self._request_lst:
+                    if request.response == {"messages": [{"id": "e"}]}:
+                        self._callback(request_id, None, Exception("backend error"))
+                    else:
+                        self._callback(request_id, request.response, None)
+
+        service.users.return_value.messages.return_value.list.side_effect = list_request
+        service.new_batch_http_request.side_effect = lambda callback: FakeBatch(
+            callback=callback
+        )
+        mail = GoogleMailBase(google_mail_service=service, list_partition="label")
+        self.assertEqual(
+            mail._search_email_on_server(only_message_ids=True),
+            ["a", "b", "c", "d", "e"],
+        )
+        self.assertEqual(service.new_batch_http_request.call_count, 2)
+        self.assertEqual(
+            request_lst,
+            [
+                (["INBOX"], "", None),
+                (["Label_1"], "", None),
+                ([], "has:nouserlabels", None),
+                ([], "has:nouserlabels", None),
+                (["INBOX"], "", "p2"),
+            ],
+        )
+
+        mail = GoogleMailBase(google_mail_service=service, list_partition="date")
+        partition_lst = mail._get_list_partitions(label_ids=["INBOX"], query_string="x")
+        self.assertEqual(partition_lst[0], (["INBOX"], "x before:1072915200"))
+        self.assertEqual(
+            partition_lst[1], (["INBOX"], "x after:1072915199 before:1104537600")
+        )
+        self.assertTrue(partition_lst[-1][1].startswith("x after:"))
+        self.assertNotIn("before:", partition_lst[-1][1])
+        with self.assertRaises(ValueError):
+            GoogleMailBase(google_mail_service=service, list_partition="size")
+
     def test_get_message_detail_default_arguments(self):
         service = self._create_mock_service_with_labels()
         get_execute = (
@@ -228,7 +308,11 @@ class TestGoogleMailBase(unittest.TestCase):
 
         self.assertEqual(result, {"id": "x"})
         service.users.return_value.messages.return_value.get.assert_called_once_with(
-            userId="me", id="x", format="full", metadataHeaders=[]
+            userId="me",
+            id="x",
+            format="full",
+            metadataHeaders=[],
+            fields="id,threadId,labelIds,payload(mimeType,headers,body/data,parts)",
         )
 
     def test_modify_message_labels_only_when_needed(self):
@@ -247,24 +331,60 @@ class TestGoogleMailBase(unittest.TestCase):
             body={"removeLabelIds": ["old"], "addLabelIds": ["new"]},
         )
 
-    @patch("gmailsorter.google.mail.get_email_dict")
-    def test_download_messages_dataframe_filters_none(self, get_email_dict_mock):
+    def test_modify_messages_labels_batch_modify_with_fallback(self):
+        service = self._create_mock_service_with_labels()
+        batch_modify = service.users.return_value.messages.return_value.batchModify
+        batch_modify.return_value.execute.side_effect = [
+            {},
+            HttpError(resp=MagicMock(status=500), content=b"backend error"),
+        ]
+        mail = GoogleMailBase(
+            google_mail_service=service, quota_executor=QuotaExecutor(max_retries=0)
+        )
+        message_id_lst = ["id" + str(i) for i in range(1500)]
+        with patch.object(
+            mail,
+            "_modify_message_labels",
+            side_effect=[
+                None,
+                HttpError(resp=MagicMock(status=404), content=b"not found"),
+            ]
+            + [None] * 498,
+        ) as modify_mock:
+            failed_lst = mail._modify_messages_labels(
+                message_id_lst=message_id_lst,
+                label_id_remove_lst=["old"],
+                label_id_add_lst=["new"],
+            )
+        self.assertEqual(failed_lst, ["id1001"])
+        self.assertEqual(batch_modify.call_count, 2)
+        self.assertEqual(
+            batch_modify.call_args_list[0].kwargs["body"],
+            {
+                "ids": message_id_lst[:1000],
+                "removeLabelIds": ["old"],
+                "addLabelIds": ["new"],
+            },
+        )
+        self.assertEqual(
+            [c.kwargs["message_id"] for c in modify_mock.call_args_list],
+            message_id_lst[1000:],
+        )
+
+        batch_modify.reset_mock()
+        self.assertEqual(
+            mail._modify_messages_labels(message_id_lst=message_id_lst), []
+        )
+        batch_modify.assert_not_called()
+
+    @patch("gmailsorter.google.mail.get_email_values")
+    def test_download_messages_dataframe_filters_none(self, get_email_values_mock):
         service = self._create_mock_service_with_labels()
         mail = GoogleMailBase(google_mail_service=service)
         message_a = {"id": "a"}
         message_b = {"id": "b"}
-        get_email_dict_mock.side_effect = [
-            {
-                "id": "a",
-                "threads": "t",
-                "labels": [],
-                "to": [],
-                "from": None,
-                "cc": [],
-                "subject": "s",
-                "content": "c",
-                "date": datetime.now(timezone.utc),
-            },
+        get_email_values_mock.side_effect = [
+            ("a", "t", [], [], None, [], "s", "c", datetime.now(timezone.utc)),
             None,
         ]
 
@@ -275,6 +395,166 @@ class TestGoogleMailBase(unittest.TestCase):
 
         self.assertEqual(df["id"].tolist(), ["a"])
 
+    @patch("gmailsorter.google.mail.get_email_values", return_value=None)
+    def test_download_messages_dataframe_selects_profile(self, get_email_dict_mock):
+        service = self._create_mock_service_with_labels()
+        mail = GoogleMailBase(google_mail_service=service)
+        with patch.object(mail, "_get_message_detail", return_value={"id": "a"}):
+            mail._download_messages_to_dataframe(["a"])
+            self.assertEqual(
+                get_email_dict_mock.call_args.kwargs["profile"], "metadata"
+            )
+            mail._download_messages_to_dataframe(["a"], email_format="full")
+            self.assertEqual(get_email_dict_mock.call_args.kwargs["profile"], "full")
+
+    def test_download_messages_dataframe_parse_workers(self):
+        service = self._create_mock_service_with_labels()
+        message_lst = [
+            {
+                "id": "id" + str(i),
+                "threadId": "t" + str(i),
+                "labelIds": ["INBOX"],
+                "payload": {
+                    "headers": [
+                        {"name": "From", "value": "sender@server.net"},
+                        {"name": "Date", "value": "Fri, 11 Feb 2022 18:08:46 +0100"},
+                    ]
+                },
+            }
+            for i in range(250)
+        ]
+        message_lst[10]["payload"]["headers"][1]["value"] = "Zzz, 40 Foo 2022 99:99:99"
+        mail_inline = GoogleMailBase(
+            google_mail_service=service,
+            quota_executor=QuotaExecutor(quota_units_per_second=1e6),
+        )
+        mail_pool = GoogleMailBase(
+            google_mail_service=service,
+            parse_workers=2,
+            quota_executor=QuotaExecutor(quota_units_per_second=1e6),
+        )
+        df_lst = []
+        for mail in [mail_inline, mail_pool]:
+            with patch.object(mail, "_get_message_detail", side_effect=message_lst):
+                df_lst.append(
+                    mail._download_messages_to_dataframe(
+                        ["id" + str(i) for i in range(250)]
+                    )
+                )
+        self.assertEqual(len(df_lst[1]), 249)
+        self.assertEqual(df_lst[1]["id"].tolist()[9:11], ["id9", "id11"])
+        pd.testing.assert_frame_equal(df_lst[0], df_lst[1])
+
+    def test_get_message_details_batch_requests(self):
+        service = self._create_mock_service_with_labels()
+        batch_lst = []
+
+        class FakeBatch:
+            def __init__(self, callback):
+                self._callback = callback
+                self.request_id_lst = []
+
+            def add(self, request, request_id):
+                self.request_id_lst.append(request_id)
+
+            def execute(self):
+                for request_id in self.request_id_lst:
+                    if request_id == "1":
+                        self._callback(request_id, None, Exception("rate limit"))
+                    else:
+                        self._callback(
+                            request_id,
+                            {"batch": len(batch_lst), "index": request_id},
+                            None,
+                        )
+
+        def new_batch_http_request(callback):
+            batch_lst.append(FakeBatch(callback=callback))
+            return batch_lst[-1]
+
+        service.new_batch_http_request.side_effect = new_batch_http_request
+        mail = GoogleMailBase(google_mail_service=service, download_batch_size=2)
+        with patch.object(
+            mail, "_get_message_detail", return_value={"retry": True}
+        ) as detail_mock:
+            result_lst = list(mail._get_message_details(["a", "b", "c"]))
+        self.assertEqual(
+            result_lst,
+            [{"batch": 1, "index": "0"}, {"retry": True}, {"batch": 2, "index": "0"}],
+        )
+        self.assertEqual(
+            [batch.request_id_lst for batch in batch_lst], [["0", "1"], ["0"]]
+        )
+        detail_mock.assert_called_once_with(
+            message_id="b", email_format=None, metadata_headers=None, fields=None
+        )
+        with self.assertRaises(ValueError):
+            GoogleMailBase(google_mail_service=service, download_batch_size=101)
+
+    def test_get_message_request_fields_mask(self):
+        service = self._create_mock_service_with_labels()
+        mail = GoogleMailBase(google_mail_service=service)
+        mail._get_message_request(
+            message_id="x", email_format="minimal", fields="id,labelIds"
+        )
+        service.users.return_value.messages.return_value.get.assert_called_once_with(
+            userId="me",
+            id="x",
+            format="minimal",
+            metadataHeaders=[],
+            fields="id,labelIds",
+        )
+
+    def test_fetch_profiles_and_statistics(self):
+        message_content = json.dumps(
+            {
+                "id": "x",
+                "threadId": "t",
+                "labelIds": ["INBOX"],
+                "payload": {"headers": [{"name": "From", "value": "a@b.c"}]},
+            }
+        ).encode()
+        service = build(
+            "gmail",
+            "v1",
+            http=HttpMockSequence(
+                [
+                    ({"status": "200"}, json.dumps({"labels": []}).encode()),
+                    ({"status": "200"}, message_content),
+                    ({"status": "200"}, message_content),
+                    ({"status": "200"}, b'{"id": "x", "labelIds": []}'),
+                ]
+            ),
+            static_discovery=True,
+        )
+        mail = GoogleMailBase(google_mail_service=service)
+        request = mail._get_message_request(message_id="x")
+        self.assertIn("format=metadata", request.uri)
+        for header in ["From", "To", "Cc", "Subject", "Date"]:
+            self.assertIn("metadataHeaders=" + header, request.uri)
+        self.assertIn(
+            "fields=id%2CthreadId%2ClabelIds%2Cpayload%2Fheaders", request.uri
+        )
+        self.assertIn("gzip", request.headers["accept-encoding"])
+        self.assertEqual(request.execute()["id"], "x")
+        mail._get_message_detail(message_id="x")
+        mail._get_message_detail(message_id="x", email_format="minimal")
+        self.assertEqual(
+            mail.get_fetch_statistics(),
+            {
+                "metadata": {
+                    "messages": 2,
+                    "decoded_bytes": 2 * len(message_content),
+                    "decoded_bytes_per_message": len(message_content),
+                },
+                "minimal": {
+                    "messages": 1,
+                    "decoded_bytes": 27,
+                    "decoded_bytes_per_message": 27,
+                },
+            },
+        )
+
     def test_get_labels_for_email_and_emails(self):
         service = self._create_mock_service_with_labels()
         mail = GoogleMailBase(google_mail_service=service)
@@ -287,22 +567,33 @@ class TestGoogleMailBase(unittest.TestCase):
         with patch.object(mail, "_get_message_detail", return_value={}):
             self.assertEqual(mail._get_labels_for_email("x"), [])
 
-        with patch.object(mail, "_get_labels_for_email", side_effect=[["L1"], []]):
+        with patch.object(
+            mail,
+            "_get_message_details",
+            return_value=iter([{"id": "a", "labelIds": ["L1"]}, {"id": "b"}]),
+        ) as details_mock:
             labels = mail._get_labels_for_emails(["a", "b"])
         self.assertEqual(labels, [["L1"], []])
+        details_mock.assert_called_once_with(
+            message_id_lst=["a", "b"], email_format="minimal", fields="id,labelIds"
+        )
 
     def test_move_emails_and_store_to_database(self):
         service = self._create_mock_service_with_labels()
         db_email = MagicMock()
         mail = GoogleMailBase(google_mail_service=service, database_email=db_email)
 
-        with patch.object(mail, "_modify_message_labels") as modify_mock:
-            mail._move_emails(
-                {"id1": None, "id2": "LBL_INBOX", "id3": "LBL_SPAM"},
+        with patch.object(
+            mail, "_modify_messages_labels", return_value=["id4"]
+        ) as modify_mock:
+            moved_email_dict = mail._move_emails(
+                {"id1": None, "id2": "LBL_INBOX", "id3": "LBL_SPAM", "id4": "LBL_SPAM"},
                 label_to_ignore="Inbox",
             )
+        # Emails which could not be modified are not reported as moved.
+        self.assertEqual(moved_email_dict, {"id3": "LBL_SPAM"})
         modify_mock.assert_called_once_with(
-            message_id="id3",
+            message_id_lst=["id3", "id4"],
             label_id_remove_lst=["LBL_INBOX"],
             label_id_add_lst=["LBL_SPAM"],
         )
@@ -326,6 +617,7 @@ class TestGoogleMailBase(unittest.TestCase):
         service = self._create_mock_service_with_labels()
         db_email = MagicMock()
         db_email.get_labels_to_update.return_value = (["new"], ["update"], ["deleted"])
+        db_email.get_history_id.return_value = None
         mail = GoogleMailBase(google_mail_service=service, database_email=db_email)
 
         with (
@@ -361,6 +653,130 @@ class TestGoogleMailBase(unittest.TestCase):
         db_email.update_labels.assert_not_called()
         store_mock.assert_called_once_with(message_id_lst=["new2"], email_format=None)
 
+    def test_update_database_from_history(self):
+        service = self._create_mock_service_with_labels()
+        history_list = service.users.return_value.history.return_value.list
+        history_list.return_value.execute.side_effect = [
+            {
+                "history": [
+                    {
+                        "messagesAdded": [
+                            {"message": {"id": "new", "labelIds": ["INBOX"]}},
+                            {"message": {"id": "spam", "labelIds": ["SPAM"]}},
+                        ]
+                    },
+                    {
+                        "labelsAdded": [
+                            {
+                                "message": {"id": "known", "labelIds": ["INBOX", "L1"]},
+                                "labelIds": ["L1"],
+                            },
+                            {
+                                "message": {"id": "trashed", "labelIds": ["TRASH"]},
+                                "labelIds": ["TRASH"],
+                            },
+                        ]
+                    },
+                ],
+                "nextPageToken": "page2",
+            },
+            {
+                "history": [{"messagesDeleted": [{"message": {"id": "removed"}}]}],
+                "historyId": "200",
+            },
+        ]
+        db_email = MagicMock()
+        db_email.get_history_id.return_value = "100"
+        db_email.list_email_ids.return_value = ["known", "trashed", "removed"]
+        mail = GoogleMailBase(google_mail_service=service, database_email=db_email)
+
+        with (
+            patch.object(mail, "_search_email_on_server") as search_mock,
+            patch.object(mail, "_store_emails_in_database") as store_mock,
+        ):
+            mail.update_database()
+
+        search_mock.assert_not_called()
+        self.assertEqual(history_list.call_args_list[0].kwargs["startHistoryId"], "100")
+        self.assertEqual(history_list.call_args_list[1].kwargs["pageToken"], "page2")
+        store_mock.assert_called_once_with(message_id_lst=["new"], email_format=None)
+        self.assertEqual(
+            sorted(db_email.mark_emails_as_deleted.call_args.kwargs["message_id_lst"]),
+            ["removed", "trashed"],
+        )
+        db_email.update_labels.assert_called_once_with(
+            message_id_lst=["known"], message_meta_lst=[["INBOX", "L1"]], user_id=1
+        )
+        db_email.update_history_id.assert_called_once_with(history_id="200", user_id=1)
+
+    def test_update_database_quick_history_keeps_label_changes(self):
+        service = self._create_mock_service_with_labels()
+        history_list = service.users.return_value.history.return_value.list
+        history_list.return_value.execute.side_effect = [
+            {
+                "history": [
+                    {
+                        "labelsAdded": [
+                            {
+                                "message": {"id": "known", "labelIds": ["INBOX", "L1"]},
+                                "labelIds": ["L1"],
+                            }
+                        ]
+                    }
+                ],
+                "historyId": "200",
+            },
+            {"history": [], "historyId": "300"},
+        ]
+        db_email = MagicMock()
+        db_email.get_history_id.side_effect = ["100", "200"]
+        db_email.list_email_ids.return_value = ["known"]
+        mail = GoogleMailBase(google_mail_service=service, database_email=db_email)
+
+        with patch.object(mail, "_store_emails_in_database"):
+            mail.update_database(quick=True)
+            mail.update_database(quick=False)
+
+        self.assertEqual(
+            [c.kwargs["startHistoryId"] for c in history_list.call_args_list],
+            ["100", "200"],
+        )
+        self.assertEqual(
+            db_email.update_labels.call_args_list[0].kwargs,
+            {
+                "message_id_lst": ["known"],
+                "message_meta_lst": [["INBOX", "L1"]],
+                "user_id": 1,
+            },
+        )
+        self.assertEqual(
+            [c.kwargs["history_id"] for c in db_email.update_history_id.call_args_list],
+            ["200", "300"],
+        )
+
+    def test_update_database_full_resync_on_expired_history(self):
+        service = self._create_mock_service_with_labels()
+        service.users.return_value.history.return_value.list.return_value.execute.side_effect = HttpError(
+            resp=MagicMock(status=404), content=b"not found"
+        )
+        service.users.return_value.getProfile.return_value.execute.return_value = {
+            "historyId": "300"
+        }
+        db_email = MagicMock()
+        db_email.get_history_id.return_value = "100"
+        db_email.get_labels_to_update.return_value = (["new"], [], [])
+        mail = GoogleMailBase(google_mail_service=service, database_email=db_email)
+
+        with (
+            patch.object(mail, "_search_email_on_server", return_value=["new"]),
+            patch.object(mail, "_get_labels_for_emails", return_value=[]),
+            patch.object(mail, "_store_emails_in_database") as store_mock,
+        ):
+            mail.update_database()
+
+        store_mock.assert_called_once_with(message_id_lst=["new"], email_format=None)
+        db_email.update_history_id.assert_called_once_with(history_id="300", user_id=1)
+
     @patch("gmailsorter.google.mail.get_predictions_from_machine_learning_models")
     @patch("gmailsorter.google.mail.encode_df_for_machine_learning")
     def test_filter_messages_from_server(self, encode_mock, predict_mock):
@@ -534,7 +950,9 @@ class TestLocalHelpers(unittest.TestCase):
         )
 
         create_databases_mock.assert_called_once_with(
-            connection_str="sqlite:///:memory:"
+            connection_str="sqlite:///:memory:",
+            replica_connection_str=None,
+            max_replica_staleness=None,
         )
         create_service_mock.assert_called_once_with(
             client_config={"installed": {}},
@@ -553,6 +971,9 @@ class TestLocalHelpers(unittest.TestCase):
             user_id="me",
             db_user_id=4,
             email_download_format="full",
+            parse_workers=None,
+            download_batch_size=50,
+            list_partition=None,
         )
 
 
@@ -2,7 +2,17 @@ import base64
 from unittest import TestCase
 from datetime import datetime
 from datetime import datetime, timezone, timedelta
-from gmailsorter.google.message import Message, MLStripper, get_email_dict
+from email.message import EmailMessage
+from unittest.mock import patch
+from gmailsorter.base.message import email_date_converter_batch
+from gmailsorter.google.message import (
+    Message,
+    MLStripper,
+    RawMessage,
+    get_email_dict,
+    get_email_records,
+    html_to_text,
+)
 
 
 class MessageTest(TestCase):
@@ -53,6 +63,29 @@ class MessageTest(TestCase):
     def test_get_content(self):
         self.assertEqual(self.message.get_content(), None)
 
+    def test_header_index_case_insensitive_and_cached(self):
+        message = Message(
+            message_dict={
+                "threadId": "t",
+                "id": "i",
+                "payload": {
+                    "headers": [
+                        {"name": "SUBJECT", "value": "first"},
+                        {"name": "subject", "value": "second"},
+                        {"name": "CC", "value": "a@test.com"},
+                    ]
+                },
+            }
+        )
+        self.assertEqual(
+            message.get_header_field_from_message(field="Subject"), "first"
+        )
+        self.assertEqual(message.get_cc(), ["a@test.com"])
+        message._message_dict["payload"]["headers"] = []
+        self.assertEqual(message.get_subject(), "first")
+        self.assertIs(message.get_cc(), message.get_cc())
+        self.assertFalse(hasattr(message, "__dict__"))
+
     def test_get_from_multiple_addresses_returns_none(self):
         message = Message(
             message_dict={
@@ -81,6 +114,25 @@ class MessageTest(TestCase):
         )
         self.assertEqual(message.get_from(), "jane.doe@test.com")
 
+    def test_get_to_with_quoted_display_name_containing_comma(self):
+        message = Message(
+            message_dict={
+                "threadId": "t",
+                "id": "i",
+                "payload": {
+                    "headers": [
+                        {
+                            "name": "To",
+                            "value": '"Doe, Jane" <Jane.Doe@Test.com>, other@test.com',
+                        },
+                        {"name": "From", "value": '"Doe, John" <john@test.com>'},
+                    ]
+                },
+            }
+        )
+        self.assertEqual(message.get_to(), ["jane.doe@test.com", "other@test.com"])
+        self.assertEqual(message.get_from(), "john@test.com")
+
     def test_get_cc_none_header_returns_empty_list(self):
         message = Message(
             message_dict={
@@ -202,6 +254,36 @@ class MessageTest(TestCase):
         stripper.feed("<div>Hello <span>World</span></div>")
         self.assertEqual(stripper.get_data(), "Hello World")
 
+    def test_html_to_text(self):
+        self.assertEqual(
+            html_to_text("<div>Hello <span>World</span></div>"), "Hello World"
+        )
+        self.assertEqual(
+            html_to_text("a < b &amp; c<!-- <b>comment</b> -->"), "a < b & c"
+        )
+        self.assertEqual(
+            html_to_text(
+                '<STYLE type="text/css">p { color: red; }</STYLE><p>Text</p>'
+                '<script>var s = "<b>bold</b>";</script><p>!</p>'
+            ),
+            "Text!",
+        )
+        self.assertEqual(
+            html_to_text("<p>Hello</p><p>World</p>", max_text_length=7), "HelloWo"
+        )
+        self.assertEqual(
+            html_to_text("<p>Hello</p><a href='link'>World</a>", max_html_length=20),
+            "Hello",
+        )
+
+    def test_strip_tags_uses_class_limits(self):
+        class ShortMessage(Message):
+            __slots__ = ()
+            max_text_length = 5
+
+        self.assertEqual(Message._strip_tags(html="<p>Hello World</p>"), "Hello World")
+        self.assertEqual(ShortMessage._strip_tags(html="<p>Hello World</p>"), "Hello")
+
     def test_get_email_dict_catches_value_error_and_returns_none(self):
         message_dict = {
             "threadId": "t",
@@ -214,6 +296,38 @@ class MessageTest(TestCase):
         }
         self.assertIsNone(get_email_dict(message_dict))
 
+    def test_get_email_records_converts_dates_at_once(self):
+        def get_message_dict(email_id, date):
+            header_lst = [] if date is None else [{"name": "Date", "value": date}]
+            return {"threadId": "t", "id": email_id, "payload": {"headers": header_lst}}
+
+        date = "Fri, 11 Feb 2022 18:08:46 +0100"
+        message_lst = [
+            get_message_dict(email_id="a", date=date),
+            get_message_dict(email_id="b", date="Zzz, 40 Foo 2022 99:99:99 +0100"),
+            get_message_dict(email_id="c", date=None),
+            get_message_dict(email_id="d", date=date),
+        ]
+        with patch(
+            "gmailsorter.google.message.email_date_converter_batch",
+            wraps=email_date_converter_batch,
+        ) as batch_mock:
+            records = get_email_records(message_lst=message_lst, profile="metadata")
+        batch_mock.assert_called_once_with(
+            email_date_lst=[date, "Zzz, 40 Foo 2022 99:99:99 +0100", None, date]
+        )
+        # The message with the invalid date is skipped, like in get_email_dict().
+        record_dict = records.to_dict()
+        self.assertEqual(record_dict["id"], ["a", "c", "d"])
+        self.assertEqual(
+            record_dict["date"],
+            [
+                datetime.strptime(date, "%a, %d %b %Y %H:%M:%S %z"),
+                None,
+                datetime.strptime(date, "%a, %d %b %Y %H:%M:%S %z"),
+            ],
+        )
+
     def test_get_email_dict(self):
         self.assertEqual(
             get_email_dict(self._message_dict),
@@ -231,3 +345,83 @@ class MessageTest(TestCase):
                 "to": ["me@mail.com", "friend@provider.org"],
             },
         )
+
+    def test_get_email_dict_metadata_profile_skips_content(self):
+        message_dict = {
+            "threadId": "t",
+            "id": "i",
+            "labelIds": ["INBOX"],
+            "payload": {
+                "headers": [
+                    {"name": "From", "value": "sender@server.net"},
+                    {"name": "Date", "value": "Fri, 11 Feb 2022 18:08:46 +0100"},
+                ],
+                "mimeType": "text/plain",
+                "body": {"data": base64.urlsafe_b64encode(b"Body").decode("utf-8")},
+            },
+        }
+        self.assertEqual(get_email_dict(message_dict)["content"], "Body")
+        email_dict = get_email_dict(message_dict, profile="metadata")
+        self.assertIsNone(email_dict["content"])
+        self.assertEqual(email_dict["from"], "sender@server.net")
+        self.assertEqual(email_dict["labels"], ["INBOX"])
+        with self.assertRaises(ValueError):
+            Message(message_dict=message_dict).to_dict(profile="unknown")
+
+
+class RawMessageTest(TestCase):
+    @staticmethod
+    def _get_raw_message_dict(email_message):
+        return {
+            "threadId": "abc123",
+            "id": "myid123",
+            "labelIds": ["INBOX"],
+            "raw": base64.urlsafe_b64encode(email_message.as_bytes()).decode("utf-8"),
+        }
+
+    def test_multipart_alternative(self):
+        email_message = EmailMessage()
+        email_message["From"] = "=?utf-8?q?J=C3=B6rg?= <Sender@Server.net>"
+        email_message["To"] = '"Doe, John" <me@mail.com>, friend@provider.org'
+        email_message["Subject"] = "=?utf-8?q?Gr=C3=BC=C3=9Fe?="
+        email_message["Date"] = "Fri, 11 Feb 2022 18:08:46 +0100"
+        email_message.set_content("Grüße aus Köln", charset="iso-8859-1")
+        email_message.add_alternative("<p>Grüße <b>aus</b> Köln</p>", subtype="html")
+        message = RawMessage(message_dict=self._get_raw_message_dict(email_message))
+        self.assertEqual(message.get_from(), "sender@server.net")
+        self.assertEqual(message.get_to(), ["me@mail.com", "friend@provider.org"])
+        self.assertEqual(message.get_cc(), [])
+        self.assertEqual(message.get_subject(), "Grüße")
+        self.assertEqual(message.get_content().strip(), "Grüße aus Köln")
+        self.assertEqual(
+            message.get_date(),
+            datetime(2022, 2, 11, 17, 8, 46, tzinfo=timezone.utc),
+        )
+        self.assertEqual(message.get_label_ids(), ["INBOX"])
+        self.assertEqual(message.get_thread_id(), "abc123")
+        self.assertEqual(message.get_email_id(), "myid123")
+
+    def test_html_only(self):
+        email_message = EmailMessage()
+        email_message["From"] = "sender@server.net"
+        email_message.set_content(
+            "<style>p { color: red; }</style><p>Hello &amp; welcome</p>",
+            subtype="html",
+        )
+        message = RawMessage(message_dict=self._get_raw_message_dict(email_message))
+        self.assertEqual(message.get_content().strip(), "Hello & welcome")
+        self.assertIsNone(message.get_date())
+
+    def test_get_email_dict_dispatches_raw_format(self):
+        email_message = EmailMessage()
+        email_message["From"] = "sender@server.net"
+        email_message["Date"] = "Fri, 11 Feb 2022 18:08:46 +0100"
+        email_message.set_content("Body")
+        email_dict = get_email_dict(self._get_raw_message_dict(email_message))
+        self.assertEqual(email_dict["from"], "sender@server.net")
+        self.assertEqual(email_dict["content"].strip(), "Body")
+        self.assertIsNone(
+            get_email_dict(
+                self._get_raw_message_dict(email_message), profile="metadata"
+            )["content"]
+        )
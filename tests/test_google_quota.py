@@ -0,0 +1,153 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import httplib2
+from googleapiclient.errors import HttpError
+from sqlalchemy import create_engine, select
+
+from gmailsorter.google.database import GoogleQuota
+from gmailsorter.google.quota import (
+    QuotaExecutor,
+    SharedTokenBucket,
+    TokenBucket,
+    get_quota_units,
+    is_rate_limit_error,
+)
+
+
+def _http_error(status, content=b"", headers=None):
+    resp = httplib2.Response({"status": status, **(headers or {})})
+    return HttpError(resp=resp, content=content)
+
+
+class TestQuota(unittest.TestCase):
+    def test_get_quota_units(self):
+        self.assertEqual(
+            get_quota_units(MagicMock(methodId="gmail.users.messages.get")), 5
+        )
+        self.assertEqual(
+            get_quota_units(MagicMock(methodId="gmail.users.messages.batchModify")), 50
+        )
+        self.assertEqual(
+            get_quota_units(MagicMock(methodId="gmail.users.labels.list")), 1
+        )
+        self.assertEqual(get_quota_units(MagicMock(methodId="gmail.users.unknown")), 5)
+
+    def test_is_rate_limit_error(self):
+        self.assertTrue(is_rate_limit_error(_http_error(429)))
+        self.assertTrue(is_rate_limit_error(_http_error(503)))
+        self.assertTrue(
+            is_rate_limit_error(
+                _http_error(403, content=b'{"reason": "userRateLimitExceeded"}')
+            )
+        )
+        self.assertFalse(is_rate_limit_error(_http_error(403, content=b"forbidden")))
+        self.assertFalse(is_rate_limit_error(_http_error(404)))
+        self.assertFalse(is_rate_limit_error(ValueError("no http error")))
+        self.assertFalse(is_rate_limit_error(None))
+
+    @patch("gmailsorter.google.quota.time.sleep")
+    @patch("gmailsorter.google.quota.time.monotonic")
+    def test_token_bucket(self, monotonic_mock, sleep_mock):
+        monotonic_mock.return_value = 0.0
+        bucket = TokenBucket(rate=10.0)
+        self.assertEqual(bucket.acquire(tokens=10), 0.0)
+        self.assertEqual(bucket.acquire(tokens=5), 0.5)
+        sleep_mock.assert_called_once_with(0.5)
+        monotonic_mock.return_value = 10.0
+        self.assertEqual(bucket.acquire(tokens=10), 0.0)
+        # Requests larger than the capacity are accepted after waiting for the missing tokens.
+        self.assertEqual(bucket.acquire(tokens=20), 2.0)
+
+    @patch("gmailsorter.google.quota.time.sleep")
+    def test_execute_retries_throttled_requests(self, sleep_mock):
+        executor = QuotaExecutor(backoff_base=1.0, backoff_max=4.0, max_concurrency=10)
+        request = MagicMock(methodId="gmail.users.messages.get")
+        request.execute.side_effect = [
+            _http_error(429),
+            _http_error(500, headers={"retry-after": "30"}),
+            {"id": "a"},
+        ]
+        self.assertEqual(executor.execute(request=request), {"id": "a"})
+        self.assertEqual(request.execute.call_count, 3)
+        delay_lst = [c.args[0] for c in sleep_mock.call_args_list]
+        self.assertTrue(0 <= delay_lst[0] <= 1.0)
+        self.assertEqual(delay_lst[1], 30.0)
+        self.assertEqual(executor.concurrency, 3)
+
+        request.execute.side_effect = _http_error(404)
+        with self.assertRaises(HttpError):
+            executor.execute(request=request)
+
+        executor = QuotaExecutor(max_retries=2)
+        request.execute.side_effect = _http_error(503)
+        request.execute.reset_mock()
+        with self.assertRaises(HttpError):
+            executor.execute(request=request)
+        self.assertEqual(request.execute.call_count, 3)
+
+    def test_adaptive_concurrency(self):
+        executor = QuotaExecutor(max_concurrency=50)
+        self.assertEqual(executor.get_batch_size(max_batch_size=20), 20)
+        executor.record_result(exception=_http_error(429))
+        executor.record_result(exception=_http_error(429))
+        self.assertEqual(executor.get_batch_size(max_batch_size=20), 12)
+        executor.record_result(exception=_http_error(400))
+        self.assertEqual(executor.concurrency, 12)
+        for _ in range(100):
+            executor.record_result(exception=None)
+        self.assertEqual(executor.concurrency, 50)
+        for _ in range(10):
+            executor.record_result(exception=_http_error(503))
+        self.assertEqual(executor.get_batch_size(max_batch_size=20), 1)
+
+    def test_execute_batch_quota_units(self):
+        executor = QuotaExecutor()
+        batch = MagicMock()
+        with patch.object(executor._bucket, "acquire") as acquire_mock:
+            executor.execute_batch(
+                batch=batch,
+                request_lst=[MagicMock(methodId="gmail.users.messages.get")] * 3,
+            )
+        acquire_mock.assert_called_once_with(tokens=15)
+        batch.execute.assert_called_once_with()
+
+    @patch("gmailsorter.google.quota.time.sleep")
+    @patch("gmailsorter.google.quota.time.time")
+    def test_shared_token_bucket(self, time_mock, sleep_mock):
+        time_mock.return_value = 1000.0
+        with tempfile.TemporaryDirectory() as directory:
+            connection_str = "sqlite:///" + os.path.join(directory, "quota.db")
+            engine_lst = [create_engine(connection_str) for _ in range(2)]
+            bucket_lst = [
+                SharedTokenBucket(engine=e, rate=10.0, block=4.0) for e in engine_lst
+            ]
+            self.assertEqual(bucket_lst[0].acquire(tokens=6), 0.0)
+            # Small requests reserve a block of tokens, the remainder is handed out without a database round trip.
+            self.assertEqual(bucket_lst[0].acquire(tokens=1), 0.0)
+            with engine_lst[0].connect() as connection:
+                tokens_before = connection.execute(
+                    select(GoogleQuota.tokens)
+                ).scalar_one()
+            self.assertEqual(bucket_lst[0].acquire(tokens=2), 0.0)
+            with engine_lst[0].connect() as connection:
+                tokens_after = connection.execute(
+                    select(GoogleQuota.tokens)
+                ).scalar_one()
+            self.assertEqual(tokens_before, 0.0)
+            self.assertEqual(tokens_after, 0.0)
+            # The second process draws from the same bucket.
+            self.assertAlmostEqual(bucket_lst[1].acquire(tokens=6), 0.6)
+            sleep_mock.assert_called_once()
+            time_mock.return_value = 1010.0
+            self.assertEqual(bucket_lst[1].acquire(tokens=10), 0.0)
+            executor = QuotaExecutor(project_bucket=bucket_lst[0])
+            request = MagicMock(methodId="gmail.users.messages.batchModify")
+            request.execute.return_value = {}
+            executor.execute(request=request)
+            # The last local token of the first process is used before reserving the missing 49 tokens.
+            self.assertAlmostEqual(sleep_mock.call_args.args[0], 4.9)
+            for engine in engine_lst:
+                engine.dispose()
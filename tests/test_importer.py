@@ -0,0 +1,105 @@
+import mailbox
+import os
+import tempfile
+from email.message import EmailMessage
+from unittest import TestCase
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from gmailsorter.base.database import get_email_database
+from gmailsorter.importer import _get_label_ids, import_archive
+
+
+def _get_email_message(i, labels):
+    email_message = EmailMessage()
+    email_message["From"] = "Sender <sender" + str(i) + "@server.net>"
+    email_message["To"] = "me@mail.com"
+    email_message["Subject"] = "Subject " + str(i)
+    email_message["Date"] = "Fri, 11 Feb 2022 18:08:46 +0100"
+    email_message["Message-ID"] = "<message" + str(i) + "@server.net>"
+    email_message["X-GM-THRID"] = str(1000 + i // 2)
+    email_message["X-Gmail-Labels"] = labels
+    email_message.set_content("Body " + str(i))
+    return email_message
+
+
+class ImporterTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        engine = create_engine(
+            "sqlite:///" + os.path.join(self.directory.name, "email.db")
+        )
+        self.database = get_email_database(
+            engine=engine, session_factory=sessionmaker(bind=engine)
+        )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_import_mbox(self):
+        path = os.path.join(self.directory.name, "takeout.mbox")
+        archive = mailbox.mbox(path)
+        for i, labels in enumerate(["Inbox,Opened,Work", 'Sent,"Project, Alpha"']):
+            message = mailbox.mboxMessage(_get_email_message(i=i, labels=labels))
+            message.set_from(str(255 + i) + "@xxx Fri Feb 11 17:08:46 2022")
+            archive.add(message)
+        archive.close()
+
+        self.assertEqual(
+            import_archive(
+                path=path,
+                database=self.database,
+                label_dict={"Work": "Label_1"},
+                max_workers=1,
+                chunk_size=1,
+            ),
+            2,
+        )
+        df = self.database.get_all_emails().set_index("id")
+        self.assertEqual(sorted(df.index), ["100", "ff"])
+        self.assertEqual(df.loc["ff", "threads"], "3e8")
+        self.assertEqual(df.loc["ff", "from"], "sender0@server.net")
+        self.assertEqual(df.loc["ff", "content"].strip(), "Body 0")
+        self.assertEqual(sorted(df.loc["ff", "labels"]), ["INBOX", "Label_1"])
+        self.assertEqual(df.loc["100", "threads"], "3e8")
+        self.assertEqual(sorted(df.loc["100", "labels"]), ["Project, Alpha", "SENT"])
+        self.assertEqual(
+            import_archive(path=path, database=self.database, max_workers=1), 0
+        )
+
+    def test_import_maildir(self):
+        path = os.path.join(self.directory.name, "maildir")
+        archive = mailbox.Maildir(path)
+        archive.add(_get_email_message(i=0, labels="Inbox"))
+        archive.close()
+
+        self.assertEqual(
+            import_archive(
+                path=path, database=self.database, profile="metadata", max_workers=1
+            ),
+            1,
+        )
+        df = self.database.get_all_emails()
+        self.assertEqual(df["id"].tolist(), ["message0@server.net"])
+        self.assertEqual(df["threads"].tolist(), ["3e8"])
+        self.assertIsNone(df["content"].tolist()[0])
+
+    def test_get_label_ids(self):
+        self.assertEqual(_get_label_ids(header_value=None, label_dict={}), [])
+        self.assertEqual(
+            _get_label_ids(
+                header_value="Inbox, Archived, Category Updates, Unknown, Inbox",
+                label_dict={},
+            ),
+            ["INBOX", "CATEGORY_UPDATES", "Unknown"],
+        )
+
+    def test_unknown_archive_format(self):
+        with self.assertRaises(ValueError):
+            import_archive(
+                path=self.directory.name,
+                database=self.database,
+                archive_format="pst",
+                max_workers=1,
+            )
@@ -155,6 +155,31 @@ class TestMainCommandLineParser(unittest.TestCase):
             finally:
                 os.chdir(cwd)
 
+    @patch("gmailsorter.__main__.import_archive", return_value=2)
+    @patch("gmailsorter.__main__.Gmail")
+    def test_import_command(self, gmail_cls, import_archive_mock):
+        with patch(
+            "sys.argv",
+            [
+                "gmailsorter",
+                "-d",
+                "sqlite:///:memory:",
+                "import",
+                "takeout.mbox",
+                "-i",
+                "2",
+                "-t",
+                "3",
+            ],
+        ):
+            command_line_parser()
+        gmail_cls.assert_not_called()
+        import_archive_mock.assert_called_once()
+        kwargs = import_archive_mock.call_args.kwargs
+        self.assertEqual(kwargs["path"], "takeout.mbox")
+        self.assertEqual(kwargs["user_id"], 2)
+        self.assertEqual(kwargs["max_workers"], 3)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,6 +1,14 @@
 from unittest import TestCase
-from datetime import datetime
-from gmailsorter.base.message import email_date_converter, AbstractMessage
+from datetime import datetime, timedelta
+import pandas
+from gmailsorter.base.message import (
+    EMAIL_COLUMN_LST,
+    EmailRecordBuilder,
+    email_date_converter,
+    email_date_converter_batch,
+    split_email_addresses,
+    AbstractMessage,
+)
 
 
 class MessageTest(TestCase):
@@ -76,3 +84,98 @@ class MessageTest(TestCase):
             datetime.strptime("24-01-2022", "%d-%m-%Y"),
         )
         self.assertEqual(email_date_converter(None), None)
+
+    def test_email_date_converter_cached_shapes(self):
+        for _ in range(2):
+            self.assertEqual(
+                email_date_converter("Sat, 12 Feb 2022 18:08:46 -0500"),
+                datetime.strptime(
+                    "Sat, 12 Feb 2022 18:08:46 -0500", "%a, %d %b %Y %H:%M:%S %z"
+                ),
+            )
+            self.assertEqual(
+                email_date_converter("Sat, 12 Feb 2022 18:08:46 -0000").utcoffset(),
+                timedelta(0),
+            )
+            self.assertIsNone(
+                email_date_converter("Sat, 12 Feb 2022 18:08:46 GMT").tzinfo
+            )
+            self.assertEqual(
+                email_date_converter("12-02-2022"),
+                datetime.strptime("12-02-2022", "%d-%m-%Y"),
+            )
+        with self.assertRaises(ValueError):
+            email_date_converter("Zzz, 40 Foo 2022 99:99:99 -0500")
+
+    def test_email_date_converter_batch(self):
+        self.assertEqual(
+            email_date_converter_batch(
+                [
+                    "Fri, 11 Feb 2022 18:08:46 +0100",
+                    None,
+                    "Zzz, 40 Foo 2022 99:99:99 +0100",
+                    "Fri, 11 Feb 2022 18:08:46 +0100",
+                ]
+            ),
+            [
+                datetime.strptime(
+                    "Fri, 11 Feb 2022 18:08:46 +0100", "%a, %d %b %Y %H:%M:%S %z"
+                ),
+                None,
+                None,
+                datetime.strptime(
+                    "Fri, 11 Feb 2022 18:08:46 +0100", "%a, %d %b %Y %H:%M:%S %z"
+                ),
+            ],
+        )
+
+    def test_split_email_addresses(self):
+        self.assertEqual(split_email_addresses(None), ())
+        self.assertEqual(split_email_addresses("undisclosed-recipients:;"), ())
+        self.assertEqual(
+            split_email_addresses('"Doe, Jane" <Jane@Test.com>, Bob <bob@test.com>'),
+            ("jane@test.com", "bob@test.com"),
+        )
+        hits = split_email_addresses.cache_info().hits
+        split_email_addresses('"Doe, Jane" <Jane@Test.com>, Bob <bob@test.com>')
+        self.assertEqual(split_email_addresses.cache_info().hits, hits + 1)
+
+    def test_email_record_builder(self):
+        values_lst = [
+            (
+                "a",
+                "t1",
+                ["INBOX"],
+                ["me@mail.com"],
+                "s@server.net",
+                [],
+                "s1",
+                None,
+                datetime(2022, 2, 11),
+            ),
+            ("b", "t1", [], [], None, ["cc@mail.com"], None, "c", None),
+        ]
+        records = EmailRecordBuilder()
+        records.append(values=values_lst[0])
+        chunk = EmailRecordBuilder()
+        chunk.append(values=values_lst[1])
+        records.extend(other=chunk)
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records.to_dict()["labels"], [["INBOX"], []])
+        pandas.testing.assert_frame_equal(
+            records.to_dataframe(),
+            pandas.DataFrame(
+                [
+                    dict(zip(EMAIL_COLUMN_LST, values, strict=True))
+                    for values in values_lst
+                ]
+            ),
+        )
+        self.assertEqual(
+            records.to_dataframe(column_lst=["id", "from"]).columns.tolist(),
+            ["id", "from"],
+        )
+        self.assertEqual(len(EmailRecordBuilder().to_dataframe()), 0)
+        with self.assertRaises(ValueError):
+            records.append(values=("c", "t2"))
+        self.assertEqual(len(records.to_dict()["id"]), len(records.to_dict()["date"]))
@@ -209,6 +209,30 @@ class TestMlEncoding(unittest.TestCase):
         self.assertEqual(df_encoded["labels_Label_1"].tolist(), [1, 0])
         self.assertEqual(df_encoded["from_@test.com"].tolist(), [1, 0])
 
+    def test_one_hot_encoding_with_vocabulary(self):
+        vocabulary = {
+            "labels": {"Label_1": 1, "Label_2": 2, "Label_3": 1},
+            "cc": {
+                "cc1@test.com": 1,
+                "cc2@test.com": 1,
+                "cc3@another.com": 1,
+                "@test.com": 2,
+                "@another.com": 1,
+            },
+            "threads": {"thread1": 1, "thread2": 1},
+            "to": {"to1@test.com": 1, "to2@test.com": 1, "@test.com": 2},
+            "from": {
+                "from1@test.com": 1,
+                "from2@another.com": 1,
+                "@test.com": 1,
+                "@another.com": 1,
+            },
+        }
+        pd.testing.assert_frame_equal(
+            one_hot_encoding(self.df, vocabulary=vocabulary),
+            one_hot_encoding(self.df),
+        )
+
     def test_build_red_lst(self):
         test_col = [["a@b.c", "d"], ["e@f.g", "d"]]
         red_lst = _build_red_lst(test_col)